@@ -0,0 +1,133 @@
+# benchmarks/ann_benchmark.py
+"""
+Бенчмарк приближенного поиска соседей по векторам Word2Vec.
+
+Для каждой конфигурации RandomProjectionIndex (таблицы x биты, multiprobe)
+измеряет время построения, полноту recall@k относительно точного
+KeyedVectors.most_similar и задержку поиска на один термин.
+
+Запуск из каталога Lab1:
+    python benchmarks/ann_benchmark.py --model models/glove-wiki-gigaword-200.bin --configs 4x16,8x16,16x16
+    python benchmarks/ann_benchmark.py --synthetic 200000 --dimensions 100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gensim.models import KeyedVectors
+from document_selector.ann_index import RandomProjectionIndex
+from document_selector.semantic_enhancer import SemanticEnhancer
+from benchmarks.search_benchmark import git_revision, latency_summary
+
+
+def load_vectors(args) -> KeyedVectors:
+    """Модель word2vec (предпочтительно сконвертированная) или синтетические векторы"""
+    if args.synthetic:
+        # Кластеры векторов: у каждого слова есть действительно близкие соседи
+        rng = np.random.default_rng(args.seed)
+        centers = rng.standard_normal((max(args.synthetic // 50, 1), args.dimensions)).astype(np.float32)
+        vectors = centers[rng.integers(0, len(centers), args.synthetic)]
+        vectors += 0.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+        word_vectors = KeyedVectors(args.dimensions)
+        word_vectors.add_vectors([f"word{i}" for i in range(args.synthetic)], vectors)
+        return word_vectors
+
+    native_path = SemanticEnhancer.native_model_path(args.model)
+    if os.path.exists(native_path):
+        return KeyedVectors.load(native_path, mmap='r')
+    return KeyedVectors.load_word2vec_format(args.model, binary=True)
+
+
+def evaluate(word_vectors: KeyedVectors, index: RandomProjectionIndex, query_words: List[str],
+             exact: Dict[str, List[str]], top_n: int) -> Dict:
+    latencies = []
+    candidates = []
+    hits = 0
+    for word in query_words:
+        word_index = word_vectors.key_to_index[word]
+        started = time.perf_counter()
+        neighbors = index.query(word_vectors.vectors[word_index], top_n, exclude=word_index)
+        latencies.append(time.perf_counter() - started)
+        candidates.append(index.last_query_stats['candidates'])
+        found = {word_vectors.index_to_key[i] for i, _ in neighbors}
+        hits += len(found & set(exact[word]))
+
+    summary = latency_summary(latencies)
+    summary[f'recall_at_{top_n}'] = hits / float(top_n * len(query_words)) if query_words else 0.0
+    summary['avg_candidates'] = float(np.mean(candidates)) if candidates else 0.0
+    summary['candidate_fraction'] = summary['avg_candidates'] / len(word_vectors.index_to_key)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк приближенного поиска соседей по векторам слов')
+    parser.add_argument('--model', default='models/glove-wiki-gigaword-200.bin', help='Путь к модели word2vec')
+    parser.add_argument('--synthetic', type=int, default=0, help='Вместо модели: количество синтетических векторов')
+    parser.add_argument('--dimensions', type=int, default=100, help='Размерность синтетических векторов')
+    parser.add_argument('--configs', default='4x16,8x16,16x16,8x12', help='Конфигурации ТАБЛИЦЫxБИТЫ через запятую')
+    parser.add_argument('--no-multiprobe', action='store_true', help='Искать только в корзине запроса')
+    parser.add_argument('--queries', type=int, default=200, help='Количество терминов-запросов')
+    parser.add_argument('--top-n', type=int, default=10, help='Количество соседей')
+    parser.add_argument('--seed', type=int, default=42, help='Seed выбора запросов')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    args = parser.parse_args()
+
+    word_vectors = load_vectors(args)
+    vocabulary_size = len(word_vectors.index_to_key)
+    print(f"Векторов: {vocabulary_size}, размерность: {word_vectors.vector_size}")
+
+    rng = np.random.default_rng(args.seed)
+    # Запросы из первой половины словаря: частые слова, как в реальных запросах
+    query_indices = rng.choice(max(vocabulary_size // 2, 1), size=min(args.queries, vocabulary_size), replace=False)
+    query_words = [word_vectors.index_to_key[i] for i in query_indices.tolist()]
+
+    # Точный поиск: то, что заменяет индекс
+    word_vectors.fill_norms()
+    exact = {}
+    latencies = []
+    for word in query_words:
+        started = time.perf_counter()
+        exact[word] = [neighbor for neighbor, _ in word_vectors.most_similar(word, topn=args.top_n)]
+        latencies.append(time.perf_counter() - started)
+
+    results = {
+        'git_revision': git_revision(),
+        'parameters': vars(args),
+        'vectors': vocabulary_size,
+        'dimensions': word_vectors.vector_size,
+        'exact': latency_summary(latencies),
+        'ann': {}
+    }
+    print(f"exact: p50 {results['exact']['p50_ms']:.2f} мс, p95 {results['exact']['p95_ms']:.2f} мс")
+
+    for config in args.configs.split(','):
+        num_tables, num_bits = (int(value) for value in config.lower().split('x'))
+        index = RandomProjectionIndex(num_tables, num_bits, multiprobe=not args.no_multiprobe)
+
+        started = time.perf_counter()
+        index.build(word_vectors.vectors)
+        build_seconds = time.perf_counter() - started
+
+        summary = evaluate(word_vectors, index, query_words, exact, args.top_n)
+        summary['build_seconds'] = build_seconds
+        summary['index_bytes'] = int(index.planes.nbytes + index.sorted_codes.nbytes + index.order.nbytes)
+        results['ann'][config] = summary
+        print(f"{config}: recall@{args.top_n} {summary[f'recall_at_{args.top_n}']:.3f}, "
+              f"p50 {summary['p50_ms']:.2f} мс, p95 {summary['p95_ms']:.2f} мс, "
+              f"кандидатов {summary['avg_candidates']:.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/preprocessing_benchmark.py
+"""
+Сравнение скорости предобработки: по одному документу (pos_tag на каждый
+документ) и пачками (один pos_tag_sents на пачку).
+
+Коллекция из docs/ размножается до нужного размера, кэш лемм для каждого
+прогона создается заново, чтобы режимы были в равных условиях.
+
+Запуск из каталога Lab1:
+    python benchmarks/preprocessing_benchmark.py --docs docs --scale 50 --output preprocessing_benchmark.json
+
+Результаты (docs/: 10 документов x 50 = 500 документов, 584650 символов;
+--chunk-size 64, --workers 1, --repeat 5; Python 3.11.7, одно ядро; по два
+запуска, док/с):
+
+    NLTK 3.10.3   по одному: 143.2 / 130.9   пачками: 158.8 / 156.5   1.11x / 1.20x
+    NLTK 3.8.1    по одному: 121.7 / 105.1   пачками: 120.5 / 117.7   0.99x / 1.12x
+
+Официальные данные NLTK при замере были недоступны. WordNet 3.0 взят из
+словарей пакета pattern3 (без файлов исключений *.exc), punkt без обученных
+параметров, а averaged perceptron обучен на тех же тегах Penn Treebank
+(42 тега, 149 тыс. признаков, модель 8.7 МБ против 6 МБ у стандартной).
+Абсолютные значения поэтому ориентировочные.
+
+Выигрыш от pos_tag_sents небольшой и сравним с разбросом между запусками
+(около 20% на этой машине). Теггер не загружается заново на каждый вызов
+pos_tag: в NLTK 3.9+ его кэширует _get_tagger, а в 3.8.1 модель берется
+из кэша nltk.data.load. Почти все время тегирования уходит на
+PerceptronTagger.predict, то есть на работу с каждым токеном, а не на
+накладные расходы вызова (1-2 мс на документ под профилировщиком). Замеры
+чувствительны к дрейфу скорости машины, поэтому режимы чередуются внутри
+каждого повтора.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from copy import copy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from documents_processing.collector import DocumentCollector
+from text_preprocessing.preprocessor_factory import PreprocessorFactory
+from text_preprocessing.batching import BatchTextPreprocessor
+
+
+def scale_documents(documents, scale):
+    """Размножает коллекцию: scale копий каждого документа с новыми id"""
+    scaled = []
+    for copy_index in range(scale):
+        for doc in documents:
+            clone = copy(doc)
+            clone.doc_id = copy_index * len(documents) + doc.doc_id
+            clone.processed_content = ""
+            scaled.append(clone)
+    return scaled
+
+
+def run_per_document(documents):
+    """Прежний путь: preprocess_document для каждого документа"""
+    preprocessor = PreprocessorFactory.create_lemmatization_preprocessor()
+    started = time.perf_counter()
+    for doc in documents:
+        preprocessor.preprocess_document(doc)
+    return time.perf_counter() - started
+
+
+def run_batched(documents, chunk_size, workers):
+    """Пакетный путь BatchTextPreprocessor (pos_tag_sents на пачку)"""
+    preprocessor = PreprocessorFactory.create_lemmatization_preprocessor()
+    batch_processor = BatchTextPreprocessor(preprocessor, workers=workers, chunk_size=chunk_size,
+                                            progress_interval=float('inf'))
+    started = time.perf_counter()
+    batch_processor.preprocess_collection(documents)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк пакетной предобработки')
+    parser.add_argument('--docs', default='docs', help='Каталог с документами')
+    parser.add_argument('--scale', type=int, default=50, help='Во сколько раз размножить коллекцию')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Размер пачки для pos_tag_sents')
+    parser.add_argument('--workers', type=int, default=1, help='Процессов для пакетного режима')
+    parser.add_argument('--repeat', type=int, default=3, help='Число повторов (берется лучший)')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    args = parser.parse_args()
+
+    collector = DocumentCollector()
+    base_documents = collector.collect_documents(args.docs)
+    if not base_documents:
+        print("Документы не найдены")
+        return
+
+    documents = scale_documents(base_documents, args.scale)
+    total_chars = sum(len(doc.content) for doc in documents)
+    print(f"Коллекция: {len(base_documents)} x {args.scale} = {len(documents)} документов, {total_chars} символов")
+
+    # Режимы чередуются в каждом повторе, чтобы дрейф скорости машины
+    # не доставался целиком одному из них
+    per_document_runs, batched_runs = [], []
+    for _ in range(args.repeat):
+        per_document_runs.append(run_per_document(scale_documents(documents, 1)))
+        batched_runs.append(run_batched(scale_documents(documents, 1), args.chunk_size, args.workers))
+    per_document = min(per_document_runs)
+    batched = min(batched_runs)
+
+    results = {
+        'documents': len(documents),
+        'characters': total_chars,
+        'chunk_size': args.chunk_size,
+        'workers': args.workers,
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'per_document': {
+            'seconds': per_document,
+            'docs_per_second': len(documents) / per_document if per_document else 0.0
+        },
+        'batched': {
+            'seconds': batched,
+            'docs_per_second': len(documents) / batched if batched else 0.0
+        }
+    }
+    results['speedup'] = per_document / batched if batched else 0.0
+
+    print(f"По одному документу: {results['per_document']['docs_per_second']:.1f} док/с")
+    print(f"Пачками по {args.chunk_size}: {results['batched']['docs_per_second']:.1f} док/с")
+    print(f"Ускорение: {results['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# benchmarks/search_benchmark.py
+"""
+Бенчмарк поиска на синтетической коллекции.
+
+Измеряет время построения индекса, пиковый RSS процесса, размер индекса
+на диске и задержку IndexBuilder.search (p50/p95/p99) для полного гибридного
+конвейера и с отключением каждого этапа по отдельности. Результаты пишутся
+в JSON, чтобы сравнивать коммиты между собой.
+
+Запуск из каталога Lab1:
+    python benchmarks/search_benchmark.py --documents 10000 --queries 200 --output search_benchmark.json
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from contextlib import redirect_stdout
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexing.index_builder import IndexBuilder
+from benchmarks.synthetic_corpus import SyntheticCorpus, SimplePreprocessor
+
+
+# Конфигурации гибридного конвейера: имя -> флаги HybridDocumentSelector
+STAGE_CONFIGURATIONS = {
+    'full': {},
+    'no_semantic': {'use_semantic_search': False},
+    'no_pre_selection': {'use_pre_selection': False},
+    'no_ranking_enhancement': {'use_ranking_enhancement': False},
+    'no_dense_retrieval': {'use_dense_retrieval': False},
+    'exact_only': {'use_semantic_search': False, 'use_pre_selection': False, 'use_ranking_enhancement': False,
+                   'use_dense_retrieval': False},
+}
+
+
+def peak_rss_bytes() -> int:
+    """Пиковый RSS процесса (ru_maxrss: килобайты в Linux, байты в macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def latency_summary(latencies: List[float]) -> Dict:
+    values = np.asarray(latencies) * 1000.0
+    return {
+        'queries': len(latencies),
+        'mean_ms': float(values.mean()) if len(values) else 0.0,
+        'p50_ms': float(np.percentile(values, 50)) if len(values) else 0.0,
+        'p95_ms': float(np.percentile(values, 95)) if len(values) else 0.0,
+        'p99_ms': float(np.percentile(values, 99)) if len(values) else 0.0,
+        'qps': len(latencies) / float(sum(latencies)) if latencies else 0.0
+    }
+
+
+def measure_search(index_builder: IndexBuilder, queries: List[str], top_k: int, warmup: int) -> Dict:
+    """Задержка поиска по каждому запросу (вывод поискового конвейера подавляется)"""
+    preprocessor = SimplePreprocessor()
+    latencies = []
+    found = 0
+    with redirect_stdout(io.StringIO()) as sink:
+        for query in queries[:warmup]:
+            index_builder.search(query, preprocessor, top_k)
+        for query in queries:
+            started = time.perf_counter()
+            results = index_builder.search(query, preprocessor, top_k)
+            latencies.append(time.perf_counter() - started)
+            found += len(results)
+            sink.seek(0)
+            sink.truncate()
+
+    summary = latency_summary(latencies)
+    summary['avg_results'] = found / len(queries) if queries else 0.0
+    return summary
+
+
+def run_benchmark(args) -> Dict:
+    corpus = SyntheticCorpus(
+        num_documents=args.documents,
+        vocabulary_size=args.vocabulary,
+        zipf_exponent=args.zipf,
+        mean_length=args.mean_length,
+        seed=args.seed
+    )
+    queries = corpus.queries(args.queries)
+    work_dir = tempfile.mkdtemp(prefix='search_benchmark_')
+
+    results = {
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+    }
+
+    try:
+        # 1. Построение индекса
+        with redirect_stdout(io.StringIO()):
+            index_builder = IndexBuilder(
+                use_vector_db=args.vector_db,
+                use_document_selector=True,
+                use_semantic_search=True,
+                word2vec_model_path=args.word2vec,
+                query_cache_size=0
+            )
+            if args.vector_db:
+                from vector_storage.chroma_storage import ChromaStorage
+                index_builder.vector_storage = ChromaStorage(persist_directory=os.path.join(work_dir, 'chroma'))
+
+            started = time.perf_counter()
+            if args.stream:
+                index_builder.build_index_from_stream(_batches(corpus.iter_documents(), args.batch_size))
+            else:
+                index_builder.build_index(corpus.documents())
+            build_seconds = time.perf_counter() - started
+
+            index_dir = os.path.join(work_dir, 'index')
+            index_builder.save_index(index_dir)
+
+        stats = index_builder.get_index_statistics()
+        results['build'] = {
+            'documents': args.documents,
+            'seconds': build_seconds,
+            'documents_per_second': args.documents / build_seconds if build_seconds else 0.0,
+            'vocabulary_size': stats['vocabulary_size'],
+            'tfidf_matrix_nnz': stats['tfidf_matrix_nnz'],
+            'index_size_bytes': directory_size(index_dir),
+            'vector_db_size_bytes': directory_size(os.path.join(work_dir, 'chroma')) if args.vector_db else 0,
+            'peak_rss_bytes': peak_rss_bytes()
+        }
+        print(f"Индекс построен за {build_seconds:.2f} с, размер на диске "
+              f"{results['build']['index_size_bytes'] / 2 ** 20:.1f} МБ")
+
+        # 2. Задержка поиска по конфигурациям конвейера
+        selector = index_builder.document_selector
+        semantic_loaded = bool(selector.semantic_enhancer and selector.semantic_enhancer.word_vectors)
+        results['semantic_model_loaded'] = semantic_loaded
+        original_flags = {
+            'use_semantic_search': selector.use_semantic_search,
+            'use_pre_selection': selector.use_pre_selection,
+            'use_ranking_enhancement': selector.use_ranking_enhancement,
+            'use_dense_retrieval': selector.use_dense_retrieval
+        }
+
+        results['search'] = {}
+        if index_builder.all_documents:
+            for name, overrides in STAGE_CONFIGURATIONS.items():
+                for flag, value in {**original_flags, **overrides}.items():
+                    setattr(selector, flag, value)
+                results['search'][name] = measure_search(index_builder, queries, args.top_k, args.warmup)
+                print(f"{name}: p50 {results['search'][name]['p50_ms']:.2f} мс, "
+                      f"p99 {results['search'][name]['p99_ms']:.2f} мс")
+            for flag, value in original_flags.items():
+                setattr(selector, flag, value)
+
+        # Стандартный поиск без селектора (единственный режим для потокового индекса)
+        index_builder.all_documents = []
+        results['search']['standard'] = measure_search(index_builder, queries, args.top_k, args.warmup)
+        print(f"standard: p50 {results['search']['standard']['p50_ms']:.2f} мс, "
+              f"p99 {results['search']['standard']['p99_ms']:.2f} мс")
+
+        results['peak_rss_bytes'] = peak_rss_bytes()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+
+def _batches(documents, batch_size: int):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк поиска на синтетической коллекции')
+    parser.add_argument('--documents', type=int, default=1000, help='Количество документов (1k - 1M)')
+    parser.add_argument('--vocabulary', type=int, default=50000, help='Размер словаря')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Показатель распределения Ципфа')
+    parser.add_argument('--mean-length', type=int, default=300, help='Средняя длина документа в терминах')
+    parser.add_argument('--queries', type=int, default=200, help='Количество запросов')
+    parser.add_argument('--warmup', type=int, default=10, help='Запросов для прогрева')
+    parser.add_argument('--top-k', type=int, default=10, help='Количество результатов')
+    parser.add_argument('--seed', type=int, default=42, help='Seed генератора коллекции')
+    parser.add_argument('--vector-db', action='store_true', help='Сохранять векторы в ChromaDB')
+    parser.add_argument('--stream', action='store_true', help='Потоковое построение индекса')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки для потокового построения')
+    parser.add_argument('--word2vec', default='models/glove-wiki-gigaword-200.bin', help='Путь к модели Word2Vec')
+    parser.add_argument('--output', help='Файл для результатов в формате JSON')
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/synthetic_corpus.py
+"""
+Генератор синтетических англоязычных коллекций для бенчмарков.
+
+Словарь - псевдоанглийские слова из слогов, частоты терминов подчиняются
+закону Ципфа (вероятность слова ранга r пропорциональна 1 / r^s), длины
+документов - логнормальному распределению. Генерация детерминирована seed.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Iterator, List
+
+import numpy as np
+
+from documents_processing.document import Document
+
+
+_ONSETS = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w',
+           'br', 'cl', 'cr', 'dr', 'fl', 'gr', 'pl', 'pr', 'sh', 'sl', 'sp', 'st', 'th', 'tr', 'wh']
+_VOWELS = ['a', 'e', 'i', 'o', 'u', 'ea', 'ee', 'io', 'ou', 'ai']
+_CODAS = ['', 'n', 'r', 's', 't', 'l', 'm', 'nd', 'ng', 'st', 'rk', 'ck']
+
+
+class SyntheticCorpus:
+    """
+    Синтетическая коллекция документов с Ципфовским распределением терминов
+    """
+
+    def __init__(self, num_documents: int = 1000, vocabulary_size: int = 50000,
+                 zipf_exponent: float = 1.1, mean_length: int = 300, seed: int = 42):
+        self.num_documents = num_documents
+        self.vocabulary_size = vocabulary_size
+        self.zipf_exponent = zipf_exponent
+        self.mean_length = mean_length
+        self.seed = seed
+
+        self.words = self._generate_words(vocabulary_size, seed)
+        ranks = np.arange(1, vocabulary_size + 1, dtype=np.float64)
+        weights = 1.0 / np.power(ranks, zipf_exponent)
+        self.probabilities = weights / weights.sum()
+        self._cumulative = np.cumsum(self.probabilities)
+
+    @staticmethod
+    def _generate_words(count: int, seed: int) -> List[str]:
+        """Уникальные псевдоанглийские слова из 2-4 слогов"""
+        rng = np.random.default_rng(seed)
+        words = []
+        seen = set()
+        while len(words) < count:
+            syllables = rng.integers(2, 5)
+            word = ''.join(
+                _ONSETS[rng.integers(len(_ONSETS))] + _VOWELS[rng.integers(len(_VOWELS))]
+                + _CODAS[rng.integers(len(_CODAS))]
+                for _ in range(syllables)
+            )
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        return words
+
+    def sample_terms(self, rng: np.random.Generator, count: int) -> List[str]:
+        """Термины, выбранные по Ципфовскому распределению"""
+        indices = np.searchsorted(self._cumulative, rng.random(count), side='right')
+        indices = np.minimum(indices, self.vocabulary_size - 1)
+        return [self.words[i] for i in indices.tolist()]
+
+    def iter_documents(self) -> Iterator[Document]:
+        """
+        Генератор документов. processed_content заполнен сразу (текст уже
+        состоит из нормализованных терминов), так что коллекцию можно
+        индексировать без NLTK
+        """
+        rng = np.random.default_rng(self.seed + 1)
+        base_date = datetime(2020, 1, 1)
+        sigma = 0.6
+        mu = np.log(self.mean_length) - sigma ** 2 / 2
+
+        for doc_id in range(1, self.num_documents + 1):
+            length = max(5, int(rng.lognormal(mu, sigma)))
+            terms = self.sample_terms(rng, length)
+            content = ' '.join(terms)
+            date = (base_date + timedelta(days=int(rng.integers(0, 2000)))).strftime("%Y-%m-%d %H:%M:%S")
+
+            document = Document(
+                doc_id=doc_id,
+                title=' '.join(terms[:4]).title(),
+                content=content,
+                file_path=f"synthetic/doc_{doc_id:07d}.txt",
+                file_type='.PDF' if doc_id % 10 == 0 else '.TXT',
+                file_size=len(content),
+                date_created=date,
+                date_modified=date
+            )
+            document.processed_content = content
+            yield document
+
+    def documents(self) -> List[Document]:
+        """Вся коллекция списком"""
+        return list(self.iter_documents())
+
+    def queries(self, count: int = 200, min_terms: int = 1, max_terms: int = 4, seed: int = None) -> List[str]:
+        """
+        Запросы из терминов словаря. Термины берутся из "головы" и "середины"
+        распределения, чтобы запросы находили документы, но не все подряд
+        """
+        rng = np.random.default_rng(self.seed + 2 if seed is None else seed)
+        head = min(self.vocabulary_size, 5000)
+        queries = []
+        for _ in range(count):
+            size = int(rng.integers(min_terms, max_terms + 1))
+            indices = rng.integers(10, max(head, 11), size=size)
+            queries.append(' '.join(self.words[i] for i in indices.tolist()))
+        return queries
+
+    def write_to_directory(self, directory: str) -> int:
+        """Записывает коллекцию текстовыми файлами (для бенчмарка сбора документов)"""
+        os.makedirs(directory, exist_ok=True)
+        count = 0
+        for document in self.iter_documents():
+            path = os.path.join(directory, os.path.basename(document.file_path))
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(document.content)
+            count += 1
+        return count
+
+
+class SimplePreprocessor:
+    """
+    Препроцессор для синтетических коллекций: термины уже нормализованы,
+    поэтому достаточно разбиения по пробелам (NLTK в бенчмарке не нужен)
+    """
+
+    def preprocess_text(self, text: str, return_string: bool = True, debug: bool = True):
+        tokens = [token for token in text.lower().split() if len(token) > 2]
+        return ' '.join(tokens) if return_string else tokens
+
+    def get_signature(self) -> str:
+        return "synthetic"
@@ -0,0 +1,147 @@
+# document_selector/ann_index.py
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+
+
+class RandomProjectionIndex:
+    """
+    Приближенный поиск ближайших соседей по косинусной близости
+    (LSH на случайных гиперплоскостях).
+
+    В каждой из num_tables таблиц вектор получает код из num_bits битов -
+    знаков его проекций на случайные гиперплоскости; близкие по углу векторы
+    с большой вероятностью получают одинаковый код. Кандидаты - векторы из
+    корзин запроса во всех таблицах (и, при multiprobe, из корзин с кодом,
+    отличающимся одним битом); среди них близость считается точно.
+
+    Полнота регулируется числом таблиц и multiprobe (больше - выше полнота
+    и больше кандидатов), избирательность корзин - числом битов.
+    Корзины хранятся как отсортированные коды и порядок векторов,
+    поиск корзины - бинарный поиск.
+    """
+
+    DEFAULT_TABLES = 16
+    DEFAULT_BITS = 16
+    FILE_SUFFIX = '.ann.npz'
+
+    def __init__(self, num_tables: int = DEFAULT_TABLES, num_bits: int = DEFAULT_BITS,
+                 multiprobe: bool = True, seed: int = 0):
+        if not 0 < num_bits <= 32:
+            raise ValueError("num_bits должен быть от 1 до 32")
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.multiprobe = multiprobe
+        self.seed = seed
+
+        self.planes = None         # (размерность, num_tables * num_bits)
+        self.sorted_codes = None   # (num_tables, число векторов), коды по возрастанию
+        self.order = None          # (num_tables, число векторов), номера векторов в порядке кодов
+        self.vectors = None
+        self.norms = None
+        self.last_query_stats: Dict = {}
+
+    @classmethod
+    def index_path(cls, model_path: str) -> str:
+        """Путь к файлу индекса рядом с моделью"""
+        return os.path.splitext(model_path)[0] + cls.FILE_SUFFIX
+
+    def build(self, vectors: np.ndarray, batch_size: int = 100000) -> 'RandomProjectionIndex':
+        """Строит таблицы по матрице векторов (векторы не копируются)"""
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((vectors.shape[1], self.num_tables * self.num_bits)).astype(np.float32)
+        self._attach_vectors(vectors)
+
+        codes = np.empty((self.num_tables, len(vectors)), dtype=np.uint32)
+        for start in range(0, len(vectors), batch_size):
+            end = min(start + batch_size, len(vectors))
+            codes[:, start:end] = self._hash(np.asarray(vectors[start:end], dtype=np.float32)).T
+
+        self.order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+        self.sorted_codes = np.take_along_axis(codes, self.order, axis=1)
+        return self
+
+    def _attach_vectors(self, vectors: np.ndarray) -> None:
+        self.vectors = vectors
+        self.norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Коды векторов: (число векторов, num_tables)"""
+        bits = (vectors @ self.planes) > 0
+        bits = bits.reshape(len(vectors), self.num_tables, self.num_bits)
+        weights = (1 << np.arange(self.num_bits, dtype=np.uint64)).astype(np.uint32)
+        return (bits * weights).sum(axis=2, dtype=np.uint64).astype(np.uint32)
+
+    def _probe_codes(self, code: int) -> np.ndarray:
+        if not self.multiprobe:
+            return np.array([code], dtype=np.uint32)
+        flips = (1 << np.arange(self.num_bits, dtype=np.uint64)).astype(np.uint32)
+        return np.concatenate([[code], np.bitwise_xor(np.uint32(code), flips)]).astype(np.uint32)
+
+    def candidates(self, vector: np.ndarray) -> np.ndarray:
+        """Номера векторов из корзин запроса во всех таблицах"""
+        query_codes = self._hash(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        found = []
+        for table, code in enumerate(query_codes.tolist()):
+            probes = self._probe_codes(code)
+            starts = np.searchsorted(self.sorted_codes[table], probes, side='left')
+            ends = np.searchsorted(self.sorted_codes[table], probes, side='right')
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if end > start:
+                    found.append(self.order[table, start:end])
+        if not found:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def query(self, vector: np.ndarray, top_n: int = 10, exclude: int = -1) -> List[Tuple[int, float]]:
+        """top_n пар (номер вектора, косинусная близость) по убыванию близости"""
+        candidates = self.candidates(vector)
+        if exclude >= 0:
+            candidates = candidates[candidates != exclude]
+        self.last_query_stats = {'candidates': int(candidates.size)}
+        if candidates.size == 0 or top_n <= 0:
+            return []
+
+        vector = np.asarray(vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(vector)) or 1.0
+        norms = self.norms[candidates]
+        similarities = np.asarray(self.vectors[candidates], dtype=np.float32) @ vector
+        similarities = np.divide(similarities, norms * query_norm, out=np.zeros_like(similarities), where=norms > 0)
+
+        if candidates.size > top_n:
+            top = np.argpartition(-similarities, top_n - 1)[:top_n]
+        else:
+            top = np.arange(candidates.size)
+        top = top[np.argsort(-similarities[top], kind='stable')]
+        return [(int(candidates[i]), float(similarities[i])) for i in top]
+
+    def save(self, filepath: str) -> None:
+        np.savez(
+            filepath,
+            planes=self.planes,
+            sorted_codes=self.sorted_codes,
+            order=self.order,
+            params=np.array([self.num_tables, self.num_bits, int(self.multiprobe), self.seed, len(self.vectors)])
+        )
+
+    @classmethod
+    def load(cls, filepath: str, vectors: np.ndarray) -> 'RandomProjectionIndex':
+        """Загружает таблицы; vectors - матрица модели, по которой строился индекс"""
+        with np.load(filepath) as data:
+            num_tables, num_bits, multiprobe, seed, size = data['params'].tolist()
+            if size != len(vectors) or data['planes'].shape[0] != vectors.shape[1]:
+                raise ValueError(f"Индекс {filepath} построен для другой модели")
+            index = cls(num_tables, num_bits, bool(multiprobe), seed)
+            index.planes = data['planes']
+            index.sorted_codes = data['sorted_codes']
+            index.order = data['order']
+        index._attach_vectors(vectors)
+        return index
+
+    def get_statistics(self) -> Dict:
+        return {
+            'num_tables': self.num_tables,
+            'num_bits': self.num_bits,
+            'multiprobe': self.multiprobe,
+            'vectors': len(self.vectors) if self.vectors is not None else 0
+        }
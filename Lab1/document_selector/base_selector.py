@@ -2,6 +2,7 @@
 from abc import ABC, abstractmethod
 from typing import List, Dict
 from datetime import datetime
+import numpy as np
 
 
 class BaseDocumentSelector(ABC):
@@ -12,6 +13,7 @@ class BaseDocumentSelector(ABC):
     def __init__(self, name: str = "BaseSelector"):
         self.name = name
         self.stats = {}
+        self.feature_store = None  # Признаки документов (DocumentFeatureStore), подключаются IndexBuilder
 
     @abstractmethod
     def select_documents(self, query: str, documents: List, top_k: int = 10) -> List:
@@ -30,9 +32,19 @@ class BaseDocumentSelector(ABC):
 
         print(f"Термины запроса: {query_terms}")
 
-        for doc in documents:
+        # Документы с посчитанными признаками проверяются по счетчикам терминов
+        # (те же токены processed_content, что и при разборе текста ниже)
+        rows = self._feature_rows(documents)
+        matching_ids, has_content = set(), None
+        if self.feature_store is not None:
+            matching_ids = self.feature_store.documents_containing_any(query_terms)
+            has_content = self.feature_store.has_processed_content
+        for doc, row in zip(documents, rows.tolist()):
+            if row >= 0 and has_content[row]:
+                if doc.doc_id in matching_ids:
+                    filtered_docs.append(doc)
             # Проверяем наличие хотя бы одного термина запроса
-            if hasattr(doc, 'processed_content'):
+            elif hasattr(doc, 'processed_content'):
                 doc_terms = set(doc.processed_content.split())
                 print(f" Термины из {doc.title}: {doc_terms}")
                 if query_terms & doc_terms:  # Есть пересечение
@@ -45,39 +57,100 @@ class BaseDocumentSelector(ABC):
 
         return filtered_docs
 
+    def _feature_rows(self, documents: List) -> np.ndarray:
+        """
+        Строки документов в хранилище признаков
+        (-1 - признаков нет, документ оценивается по тексту)
+        """
+        if self.feature_store is None:
+            return np.full(len(documents), -1, dtype=np.int64)
+        return self.feature_store.rows(documents)
+
+    # Формат дат документов и начало отсчета временных меток (даты без часового пояса)
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+    EPOCH = datetime(1970, 1, 1)
+
+    @classmethod
+    def parse_timestamp(cls, value) -> float:
+        """Дата документа в секундах от EPOCH (nan, если дата не разбирается)"""
+        try:
+            return (datetime.strptime(value, cls.DATE_FORMAT) - cls.EPOCH).total_seconds()
+        except (TypeError, ValueError):
+            return float('nan')
+
+    @classmethod
+    def current_timestamp(cls) -> float:
+        return (datetime.now() - cls.EPOCH).total_seconds()
+
+    @staticmethod
+    def freshness_scores(created_timestamps: np.ndarray, now_timestamp: float) -> np.ndarray:
+        """
+        Оценки свежести по датам создания (новые документы получают бонус)
+        """
+        days_old = np.floor((now_timestamp - created_timestamps) / 86400.0)
+        scores = np.select(
+            [days_old < 7, days_old < 30, days_old < 365],  # Неделя, месяц, год
+            [2.0, 1.5, 1.0],
+            default=0.5  # Старые документы
+        )
+        # Документы с неизвестной датой считаются старыми
+        return np.where(np.isnan(created_timestamps), 0.5, scores)
+
+    @staticmethod
+    def length_scores(content_lengths: np.ndarray) -> np.ndarray:
+        """
+        Оценки длины документов (средние документы получают бонус)
+        """
+        return np.select(
+            [(content_lengths >= 500) & (content_lengths <= 5000),  # Идеальная длина
+             (content_lengths >= 100) & (content_lengths < 500),  # Немного короткий
+             content_lengths > 5000],  # Слишком длинный
+            [1.5, 1.0, 0.8],
+            default=0.5  # Очень короткий
+        )
+
+    @staticmethod
+    def file_type_scores(is_pdf: np.ndarray) -> np.ndarray:
+        """
+        Бонус за тип файла (PDF обычно более структурированные)
+        """
+        return np.where(is_pdf, 1.2, 1.0)
+
     def calculate_freshness_score(self, document) -> float:
         """
         Оценка свежести документа (новые документы получают бонус)
         """
-        try:
-            doc_date = datetime.strptime(document.date_created, "%Y-%m-%d %H:%M:%S")
-            days_old = (datetime.now() - doc_date).days
-
-            if days_old < 7:  # Последняя неделя
-                return 2.0
-            elif days_old < 30:  # Последний месяц
-                return 1.5
-            elif days_old < 365:  # Последний год
-                return 1.0
-            else:  # Старые документы
-                return 0.5
-        except:
-            return 0.5
+        created = np.array([self.parse_timestamp(document.date_created)])
+        return float(self.freshness_scores(created, self.current_timestamp())[0])
 
     def calculate_length_score(self, document) -> float:
         """
         Оценка длины документа (средние документы получают бонус)
         """
-        content_length = len(document.content)
+        return float(self.length_scores(np.array([len(document.content)]))[0])
 
-        if 500 <= content_length <= 5000:  # Идеальная длина
-            return 1.5
-        elif 100 <= content_length < 500:  # Немного короткий
-            return 1.0
-        elif content_length > 5000:  # Слишком длинный
-            return 0.8
-        else:  # Очень короткий
-            return 0.5
+    def calculate_file_type_score(self, document) -> float:
+        """
+        Бонус за тип файла
+        """
+        return float(self.file_type_scores(np.array([document.file_type.upper() == 'PDF']))[0])
+
+    def static_scores(self, documents: List) -> np.ndarray:
+        """
+        Не зависящие от запроса оценки документов: столбцы - свежесть, длина, тип файла.
+        Для документов из хранилища признаков берутся из посчитанного заранее
+        столбца, для остальных считаются по полям документа
+        """
+        scores = np.zeros((len(documents), 3))
+        rows = self._feature_rows(documents)
+        stored = rows >= 0
+        if stored.any():
+            scores[stored] = self.feature_store.static_scores(rows[stored])
+        for i in np.flatnonzero(~stored).tolist():
+            document = documents[i]
+            scores[i] = (self.calculate_freshness_score(document), self.calculate_length_score(document),
+                         self.calculate_file_type_score(document))
+        return scores
 
     def get_selection_stats(self) -> Dict:
         """
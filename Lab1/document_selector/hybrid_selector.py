@@ -1,7 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from .rule_based_selector import RuleBasedSelector
 from .ranking_enhancer import RankingEnhancer
 from .semantic_enhancer import SemanticEnhancer
+from .query_context import QueryContext
+from monitoring.metrics import track_stage, observe_items
 
 
 class HybridDocumentSelector:
@@ -12,10 +14,12 @@ class HybridDocumentSelector:
     def __init__(self, use_pre_selection: bool = False, 
                  use_ranking_enhancement: bool = False,
                  use_semantic_search: bool = True,
-                 word2vec_model_path: str = 'models/glove-wiki-gigaword-200.bin'):
+                 word2vec_model_path: str = 'models/glove-wiki-gigaword-200.bin',
+                 use_dense_retrieval: bool = True):
         self.use_pre_selection = use_pre_selection
         self.use_ranking_enhancement = use_ranking_enhancement
         self.use_semantic_search = use_semantic_search
+        self.use_dense_retrieval = use_dense_retrieval
 
         self.rule_selector = RuleBasedSelector() if use_pre_selection else None
         self.ranking_enhancer = RankingEnhancer() if use_ranking_enhancement else None
@@ -24,15 +28,30 @@ class HybridDocumentSelector:
         self.selection_stats = {}
         self.last_expansion_result = None  # Сохраняем результат расширения
 
+    def create_context(self, query: str, preprocessor=None, tfidf_calculator=None) -> QueryContext:
+        """
+        Контекст запроса, общий для всех этапов поиска
+        """
+        semantic_enhancer = self.semantic_enhancer if self.use_semantic_search else None
+        return QueryContext(query, preprocessor, tfidf_calculator, semantic_enhancer)
+
     def process_search(self, query: str, all_documents: List,
-                       search_function, top_k: int = 10) -> List[Dict]:
+                       search_function, top_k: int = 10, context: QueryContext = None,
+                       dense_search_function=None) -> List[Dict]:
         """
-        Полный процесс поиска с интеллектуальным отбором
+        Полный процесс поиска с интеллектуальным отбором.
+        Расширение запроса берется из context (или вычисляется один раз здесь).
+        dense_search_function(context, results, k) сливает результаты точного
+        поиска с поиском по плотным векторам документов
         """
         print("=== ГИБРИДНЫЙ ОТБОР ДОКУМЕНТОВ ===")
 
+        if context is None:
+            context = self.create_context(query)
+
         # Сохраняем оригинальный запрос
         original_query = query
+        expansion_result = None
         
         # 0. Семантическое расширение запроса (если включено)
 
@@ -40,11 +59,11 @@ class HybridDocumentSelector:
 
         if self.use_semantic_search and self.semantic_enhancer:
             print("Этап 0: Семантическое расширение запроса")
-            expansion_result = self.semantic_enhancer.expand_query_with_similar_words(query)
+            expansion_result = context.expansion_result
             self.last_expansion_result = expansion_result
             
             # Создаем расширенный запрос для поиска
-            expanded_query = " ".join(expansion_result['all_terms'])
+            expanded_query = context.search_text
             print(f"Оригинальный запрос: '{query}'")
             print(f"Расширенный запрос: '{expanded_query}'")
             
@@ -54,9 +73,11 @@ class HybridDocumentSelector:
         # 1. Предварительный отбор кандидатов
         if self.use_pre_selection and self.rule_selector:
             print("Этап 1: Предварительный отбор кандидатов")
-            candidate_documents = self.rule_selector.select_documents(
-                query, all_documents, top_k * 3
-            )
+            with track_stage('pre_selection'):
+                candidate_documents = self.rule_selector.select_documents(
+                    query, all_documents, top_k * 3
+                )
+            observe_items('pre_selection', len(candidate_documents))
             self.selection_stats['pre_selection'] = self.rule_selector.get_selection_stats()
         else:
             candidate_documents = all_documents
@@ -66,14 +87,30 @@ class HybridDocumentSelector:
 
         # 2. Точный поиск среди кандидатов
         print("Этап 2: Точный поиск среди кандидатов")
-        search_results = search_function(query, candidate_documents, top_k * 2)
+        with track_stage('exact_search'):
+            search_results = search_function(query, candidate_documents, top_k * 2)
+        observe_items('exact_search', len(search_results))
+
+        # 2.1 Поиск по плотным векторам документов и слияние с результатами точного поиска
+        if self.use_dense_retrieval and dense_search_function:
+            print("Этап 2.1: Поиск по векторам документов")
+            with track_stage('dense_retrieval'):
+                search_results = dense_search_function(context, search_results, top_k * 2)
+            observe_items('dense_retrieval', len(search_results))
+            self.selection_stats['dense_retrieval'] = {
+                'results': len(search_results),
+                'dense_only': sum(1 for result in search_results if result.get('sparse_score') == 0.0)
+            }
+        else:
+            self.selection_stats['dense_retrieval'] = {'skipped': True}
 
         # 3. Улучшение ранжирования
         if self.use_ranking_enhancement and self.ranking_enhancer:
             print("Этап 3: Улучшение ранжирования результатов")
-            enhanced_results = self.ranking_enhancer.enhance_ranking(
-                query, search_results, all_documents
-            )
+            with track_stage('ranking_enhancement'):
+                enhanced_results = self.ranking_enhancer.enhance_ranking(
+                    query, search_results, all_documents
+                )
             self.selection_stats['ranking_enhancement'] = self.ranking_enhancer.get_selection_stats()
         else:
             enhanced_results = search_results
@@ -83,9 +120,10 @@ class HybridDocumentSelector:
         if self.use_semantic_search and self.semantic_enhancer:
             print("Этап 4: Семантическое улучшение результатов")
             # Используем оригинальный запрос для подсветки
-            final_results = self.semantic_enhancer.enhance_search_with_semantics(
-                original_query, enhanced_results, all_documents
-            )
+            with track_stage('semantic_enhancement'):
+                final_results = self.semantic_enhancer.enhance_search_with_semantics(
+                    original_query, enhanced_results, all_documents, expansion_result
+                )
             self.selection_stats['semantic_enhancement'] = self.semantic_enhancer.get_selection_stats()
         else:
             final_results = enhanced_results
@@ -95,6 +133,48 @@ class HybridDocumentSelector:
         print(f"Финальных результатов: {len(final_results)}")
         return final_results
 
+    def attach_feature_store(self, feature_store) -> None:
+        """
+        Подключает признаки документов, посчитанные при индексации
+        """
+        for selector in (self.rule_selector, self.ranking_enhancer):
+            if selector:
+                selector.feature_store = feature_store
+
+    def build_neighbor_table(self, terms):
+        """
+        Строит таблицу семантических соседей для терминов словаря коллекции
+        """
+        if self.semantic_enhancer:
+            return self.semantic_enhancer.build_neighbor_table(terms)
+        return None
+
+    def index_documents(self, documents: List) -> None:
+        """
+        Готовит данные документов для семантической оценки
+        """
+        if self.semantic_enhancer:
+            self.semantic_enhancer.index_documents(documents)
+
+    def attach_neighbor_table(self, neighbor_table) -> None:
+        """
+        Подключает таблицу соседей, загруженную вместе с индексом
+        """
+        if self.semantic_enhancer:
+            self.semantic_enhancer.attach_neighbor_table(neighbor_table)
+
+    def get_word_vectors(self):
+        """
+        Векторы Word2Vec семантического модуля (None, если модель не загружена)
+        """
+        return self.semantic_enhancer.word_vectors if self.semantic_enhancer else None
+
+    def get_neighbor_table(self):
+        """
+        Текущая таблица соседей (None, если она не построена)
+        """
+        return self.semantic_enhancer.neighbor_table if self.semantic_enhancer else None
+
     def semantic_query_expansion(self, query: str) -> Dict:
         """
         Расширение запроса семантически похожими словами
@@ -108,13 +188,30 @@ class HybridDocumentSelector:
             'all_terms': query.split()
         }
 
+    def highlight_snippet(self, text: str, expansion_result: Dict) -> str:
+        """
+        Сниппет с подсветкой терминов расширенного запроса (как на этапе 4)
+        """
+        if self.semantic_enhancer:
+            return self.semantic_enhancer.highlighted_snippet(text, expansion_result)
+        return text
+
+    def expansion_stamp(self) -> Tuple:
+        """
+        Отметка настроек расширения запроса: при том же тексте запроса
+        расширение (а значит, и отбор) не меняется, пока не изменилась отметка
+        """
+        if not (self.use_semantic_search and self.semantic_enhancer):
+            return (False,)
+        return True, self.semantic_enhancer.expansion_version, self.semantic_enhancer.similarity_threshold
+
     def get_last_expansion_result(self) -> Dict:
         """
         Возвращает результат последнего расширения запроса
         """
         return self.last_expansion_result
 
-    def get_detailed_explanation(self, query: str, document) -> Dict:
+    def get_detailed_explanation(self, query: str, document, context: QueryContext = None) -> Dict:
         """
         Детальное объяснение отбора конкретного документа
         """
@@ -133,7 +230,8 @@ class HybridDocumentSelector:
             })
 
         if self.use_semantic_search and self.semantic_enhancer:
-            semantic_analysis = self.semantic_enhancer.get_semantic_analysis(query, document)
+            expansion_result = context.expansion_result if context is not None else None
+            semantic_analysis = self.semantic_enhancer.get_semantic_analysis(query, document, expansion_result)
             explanation['selection_stages'].append({
                 'stage': 'semantic_enhancement',
                 'explanation': semantic_analysis
@@ -0,0 +1,81 @@
+# document_selector/query_context.py
+from typing import Dict, List
+from monitoring.metrics import track_stage
+
+
+class QueryContext:
+    """
+    Данные одного поискового запроса, общие для всех этапов гибридного
+    конвейера: результат семантического расширения, термины после
+    предобработки и TF-IDF векторы исходного и расширенного запросов.
+
+    Каждое значение вычисляется при первом обращении и запоминается,
+    поэтому за один поиск расширение, предобработка и векторизация
+    выполняются по одному разу. Контекст живет только в пределах запроса
+    """
+
+    def __init__(self, query_text: str, preprocessor=None, tfidf_calculator=None, semantic_enhancer=None):
+        self.query_text = query_text
+        self.preprocessor = preprocessor
+        self.tfidf_calculator = tfidf_calculator
+        self.semantic_enhancer = semantic_enhancer
+
+        self._expansion_result = None
+        self._terms: Dict[str, List[str]] = {}
+        self._vectors: Dict[str, object] = {}
+
+    @property
+    def expansion_result(self) -> Dict:
+        """Семантическое расширение исходного запроса"""
+        if self._expansion_result is None:
+            if self.semantic_enhancer:
+                with track_stage('semantic_expansion'):
+                    self._expansion_result = self.semantic_enhancer.expand_query_with_similar_words(self.query_text)
+            else:
+                terms = self.query_text.split()
+                self._expansion_result = {
+                    'original_terms': terms,
+                    'expanded_terms': terms,
+                    'similar_terms': {},
+                    'all_terms': terms,
+                    'expansion_ratio': 1.0
+                }
+        return self._expansion_result
+
+    @property
+    def search_text(self) -> str:
+        """Текст запроса для отбора и точного поиска (расширенный, если есть расширение)"""
+        if self.semantic_enhancer:
+            return " ".join(self.expansion_result['all_terms'])
+        return self.query_text
+
+    @property
+    def processed_terms(self) -> List[str]:
+        """Термины исходного запроса после предобработки"""
+        return self.terms(self.query_text)
+
+    @property
+    def query_vector(self):
+        """TF-IDF вектор исходного запроса"""
+        return self.vector(self.query_text)
+
+    @property
+    def search_vector(self):
+        """TF-IDF вектор текста для точного поиска"""
+        return self.vector(self.search_text)
+
+    def terms(self, text: str) -> List[str]:
+        """Предобработанные термины текста (один раз на текст)"""
+        if text not in self._terms:
+            with track_stage('query_preprocessing'):
+                self._terms[text] = self.preprocessor.preprocess_text(text, return_string=False, debug=False)
+            print(f"Термины после предобработки: {self._terms[text]}")
+        return self._terms[text]
+
+    def vector(self, text: str):
+        """TF-IDF вектор текста (один раз на текст)"""
+        if text not in self._vectors:
+            terms = self.terms(text)
+            with track_stage('query_vectorization'):
+                self._vectors[text] = self.tfidf_calculator.query_to_tfidf_vector(terms)
+        return self._vectors[text]
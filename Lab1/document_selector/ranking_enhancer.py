@@ -1,5 +1,6 @@
 # document_selector/ranking_enhancer.py
 from typing import List, Dict
+import numpy as np
 from .base_selector import BaseDocumentSelector
 
 
@@ -23,18 +24,18 @@ class RankingEnhancer(BaseDocumentSelector):
         # Создаем маппинг doc_id -> документ
         doc_map = {doc.doc_id: doc for doc in original_documents}
 
-        enhanced_results = []
-        for result in search_results:
-            doc_id = result['metadata']['doc_id']
-            document = doc_map.get(doc_id)
-
-            if document:
-                # Рассчитываем дополнительные метрики
-                enhancement_score = self._calculate_enhancement_score(query, document)
+        # Дополнительные метрики и итоговые скоры считаются сразу для всех найденных документов
+        documents = [doc_map.get(result['metadata']['doc_id']) for result in search_results]
+        found = [i for i, document in enumerate(documents) if document]
+        enhancement_scores = self._enhancement_scores(query, [documents[i] for i in found])
+        original_scores = np.array([search_results[i]['similarity_score'] for i in found])
+        combined = dict(zip(found, zip(original_scores.tolist(), enhancement_scores.tolist(),
+                                       self._combine_scores(original_scores, enhancement_scores).tolist())))
 
-                # Комбинируем с оригинальным score
-                original_score = result['similarity_score']
-                enhanced_score = self._combine_scores(original_score, enhancement_score)
+        enhanced_results = []
+        for i, result in enumerate(search_results):
+            if i in combined:
+                original_score, enhancement_score, enhanced_score = combined[i]
 
                 # Создаем улучшенный результат
                 enhanced_result = result.copy()
@@ -64,28 +65,46 @@ class RankingEnhancer(BaseDocumentSelector):
         """
         Расчет скора улучшения на основе дополнительных факторов
         """
-        score = 0.0
+        return float(self._enhancement_scores(query, [document])[0])
+
+    def _enhancement_scores(self, query: str, documents: List) -> np.ndarray:
+        """
+        Скоры улучшения для пачки документов
+        """
         query_terms = set(query.lower().split())
 
         # 1. Плотность терминов (сколько % документа покрыто терминами запроса)
-        if hasattr(document, 'processed_content'):
-            content_terms = set(document.processed_content.split())
-            coverage = len(query_terms & content_terms) / len(query_terms) if query_terms else 0
-            score += coverage * 0.3
-
-        # 2. Свежесть документа
-        freshness = self.calculate_freshness_score(document)
-        score += freshness * 0.3
+        coverage = self._coverage_scores(query_terms, documents)
 
-        # 3. Качество документа (длина + структура)
-        length_score = self.calculate_length_score(document)
-        score += length_score * 0.2
+        # 2-4. Свежесть, качество (длина) и репутация типа файла - статические оценки
+        static = self.static_scores(documents)
+        freshness, length_score, file_type_bonus = static[:, 0], static[:, 1], static[:, 2]
 
-        # 4. Репутация типа файла
-        file_type_bonus = 1.2 if document.file_type.upper() == 'PDF' else 1.0
-        score += (file_type_bonus - 1.0) * 0.2
+        score = coverage * 0.3 + freshness * 0.3 + length_score * 0.2 + (file_type_bonus - 1.0) * 0.2
+        return np.minimum(score, 1.0)  # Нормализуем до [0, 1]
 
-        return min(score, 1.0)  # Нормализуем до [0, 1]
+    def _coverage_scores(self, query_terms: set, documents: List) -> np.ndarray:
+        """
+        Доля терминов запроса, встречающихся в документе
+        (0 для документов без обработанного текста)
+        """
+        coverages = np.zeros(len(documents))
+        if not query_terms:
+            return coverages
+
+        rows = self._feature_rows(documents)
+        stored = rows >= 0
+        if stored.any():
+            matched = self.feature_store.query_term_coverage(query_terms, rows[stored])
+            has_content = self.feature_store.has_processed_content[rows[stored]]
+            coverages[stored] = np.where(has_content, matched / len(query_terms), 0.0)
+
+        for i in np.flatnonzero(~stored).tolist():
+            document = documents[i]
+            if hasattr(document, 'processed_content'):
+                content_terms = set(document.processed_content.split())
+                coverages[i] = len(query_terms & content_terms) / len(query_terms)
+        return coverages
 
     def _combine_scores(self, original_score: float, enhancement_score: float) -> float:
         """
@@ -1,6 +1,7 @@
 # document_selector/rule_based_selector.py
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from collections import defaultdict
+import numpy as np
 from .base_selector import BaseDocumentSelector
 
 
@@ -32,26 +33,22 @@ class RuleBasedSelector(BaseDocumentSelector):
         filtered_docs = self.pre_filter(query, documents)
         print(f"После предфильтрации: {len(filtered_docs)} документов")
 
-        # Оцениваем каждый документ
-        scored_docs = []
-        for doc in filtered_docs:
-            score = self._calculate_document_score(query, doc)
-            scored_docs.append((score, doc))
+        # Оцениваем все документы сразу (признаки и статические оценки посчитаны при индексации)
+        scores = self._score_documents(set(query.lower().split()), filtered_docs)
 
-        # Сортируем по убыванию скора
-        scored_docs.sort(key=lambda x: x[0], reverse=True)
+        # Сортируем по убыванию скора (при равенстве сохраняется исходный порядок)
+        order = np.argsort(-scores, kind='stable')[:top_k]
 
         # Выбираем топ-K
-        selected_docs = [doc for score, doc in scored_docs[:top_k]]
+        selected_docs = [filtered_docs[i] for i in order.tolist()]
 
         # Сохраняем статистику
         self.stats = {
             'initial_documents': len(documents),
             'after_filtering': len(filtered_docs),
             'selected_documents': len(selected_docs),
-            'average_score': sum(score for score, _ in scored_docs[:top_k]) / len(
-                selected_docs) if selected_docs else 0,
-            'max_score': scored_docs[0][0] if scored_docs else 0
+            'average_score': float(scores[order].mean()) if selected_docs else 0,
+            'max_score': float(scores[order[0]]) if selected_docs else 0
         }
 
         print(f"Отобрано документов: {len(selected_docs)}")
@@ -61,30 +58,56 @@ class RuleBasedSelector(BaseDocumentSelector):
         """
         Расчет комплексной оценки документа для запроса
         """
-        score = 0.0
-        query_terms = set(query.lower().split())
-
-        # 1. Совпадение в заголовке
-        title_score = self._calculate_title_score(query_terms, document)
-        score += title_score * self.rule_weights['title_match']
-
-        # 2. Частота терминов в контенте
-        term_freq_score = self._calculate_term_frequency_score(query_terms, document)
-        score += term_freq_score * self.rule_weights['term_frequency']
-
-        # 3. Свежесть документа
-        freshness_score = self.calculate_freshness_score(document)
-        score += freshness_score * self.rule_weights['freshness']
-
-        # 4. Оптимальная длина
-        length_score = self.calculate_length_score(document)
-        score += length_score * self.rule_weights['optimal_length']
-
-        # 5. Бонус за тип файла (PDF обычно более структурированные)
-        file_type_score = 1.2 if document.file_type.upper() == 'PDF' else 1.0
-        score += file_type_score * self.rule_weights['file_type']
+        return float(self._score_documents(set(query.lower().split()), [document])[0])
 
-        return score
+    def _score_documents(self, query_terms: set, documents: List) -> np.ndarray:
+        """
+        Взвешенная сумма оценок правил для пачки документов
+        """
+        # 1-2. Совпадение в заголовке и частота терминов в контенте
+        title_scores, term_freq_scores = self._term_scores(query_terms, documents)
+
+        # 3-5. Свежесть, оптимальная длина и тип файла - статические оценки
+        static_weights = np.array([
+            self.rule_weights['freshness'],
+            self.rule_weights['optimal_length'],
+            self.rule_weights['file_type']
+        ])
+        static_prior = self.static_scores(documents) @ static_weights
+
+        return (title_scores * self.rule_weights['title_match']
+                + term_freq_scores * self.rule_weights['term_frequency']
+                + static_prior)
+
+    def _term_scores(self, query_terms: set, documents: List) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Оценки совпадения в заголовке и частоты терминов для пачки документов.
+        Документы из хранилища признаков оцениваются по счетчикам токенов,
+        остальные - разбором текста
+        """
+        title_scores = np.zeros(len(documents))
+        term_freq_scores = np.zeros(len(documents))
+
+        rows = self._feature_rows(documents)
+        stored = rows >= 0
+        if stored.any():
+            stored_rows = rows[stored]
+            overlap = self.feature_store.title_overlap(query_terms, stored_rows)
+            title_scores[stored] = np.where(
+                overlap == len(query_terms), 3.0,
+                np.where(overlap > 0, overlap / max(len(query_terms), 1) * 2.0, 0.0)
+            )
+
+            total_terms = self.feature_store.token_counts[stored_rows]
+            term_count = self.feature_store.query_term_counts(query_terms, stored_rows)
+            normalized_freq = term_count / np.maximum(total_terms, 1)
+            term_freq_scores[stored] = np.where(total_terms > 0, np.minimum(normalized_freq * 10, 2.0), 0.0)
+
+        for i in np.flatnonzero(~stored).tolist():
+            title_scores[i] = self._calculate_title_score(query_terms, documents[i])
+            term_freq_scores[i] = self._calculate_term_frequency_score(query_terms, documents[i])
+
+        return title_scores, term_freq_scores
 
     def _calculate_title_score(self, query_terms: set, document) -> float:
         """
@@ -137,8 +160,10 @@ class RuleBasedSelector(BaseDocumentSelector):
             'factors': []
         }
 
+        title_scores, term_freq_scores = self._term_scores(query_terms, [document])
+
         # Title match
-        title_score = self._calculate_title_score(query_terms, document)
+        title_score = float(title_scores[0])
         if title_score > 0:
             explanation['factors'].append({
                 'factor': 'title_match',
@@ -148,7 +173,7 @@ class RuleBasedSelector(BaseDocumentSelector):
             })
 
         # Term frequency
-        term_freq_score = self._calculate_term_frequency_score(query_terms, document)
+        term_freq_score = float(term_freq_scores[0])
         if term_freq_score > 0:
             explanation['factors'].append({
                 'factor': 'term_frequency',
@@ -157,8 +182,9 @@ class RuleBasedSelector(BaseDocumentSelector):
                 'description': 'Высокая частота терминов запроса в документе'
             })
 
+        freshness_score, length_score, _ = self.static_scores([document])[0].tolist()
+
         # Freshness
-        freshness_score = self.calculate_freshness_score(document)
         explanation['factors'].append({
             'factor': 'freshness',
             'score': freshness_score,
@@ -167,7 +193,6 @@ class RuleBasedSelector(BaseDocumentSelector):
         })
 
         # Length
-        length_score = self.calculate_length_score(document)
         explanation['factors'].append({
             'factor': 'optimal_length',
             'score': length_score,
@@ -1,33 +1,163 @@
-from typing import List, Dict
+import os
+from typing import List, Dict, Tuple
 import numpy as np
 from gensim.models import Word2Vec
 from gensim.models import KeyedVectors
 from .base_selector import BaseDocumentSelector
+from .term_embeddings import TermEmbeddings, TermNeighborTable
+from .ann_index import RandomProjectionIndex
 
 
 class SemanticEnhancer(BaseDocumentSelector):
     """
     Улучшение поиска с использованием семантической схожести Word2Vec
     с расширением запроса и подсветкой терминов
+
+    Если рядом с моделью есть ее копия в формате KeyedVectors (.kv, см.
+    scripts/convert_word2vec.py), векторы открываются через mmap только для
+    чтения: загрузка не разбирает бинарный файл, а процессы веб-сервера
+    разделяют страницы памяти.
+
+    Соседи терминов коллекции берутся из таблицы, построенной при индексации
+    (TermNeighborTable). Для терминов, которых в таблице нет, соседи ищутся
+    по всему словарю модели: через приближенный индекс RandomProjectionIndex,
+    если он построен рядом с моделью, иначе точным перебором most_similar.
+
+    Для семантической близости документ хранит номера строк своих терминов
+    в общей матрице нормированных векторов (TermEmbeddings), так что лучшие
+    совпадения терминов запроса - одно матричное произведение и максимум
+    по строкам вместо попарных вызовов similarity
     """
 
-    def __init__(self, word2vec_model_path: str = None, similarity_threshold: float = 0.6):
+    NATIVE_SUFFIX = '.kv'
+
+    def __init__(self, word2vec_model_path: str = None, similarity_threshold: float = 0.6,
+                 use_ann_index: bool = True):
         super().__init__("SemanticEnhancer")
         self.similarity_threshold = float(similarity_threshold)  # Гарантируем float
+        self.use_ann_index = use_ann_index
         self.word_vectors = None
-        self.vocabulary = set()
+        self.ann_index = None
+        self.neighbor_table = None
+        self.term_embeddings = None
+        # doc_id -> (хэш текста, строки терминов в term_embeddings, термины вне модели)
+        self._document_terms: Dict[int, Tuple] = {}
+        # Повышается при смене модели или таблицы соседей: расширение запросов могло измениться
+        self.expansion_version = 0
         
         self.load_word2vec_model(word2vec_model_path)
 
+    @property
+    def vocabulary(self) -> Dict[str, int]:
+        """Словарь модели (слово -> индекс вектора) без копирования ключей"""
+        return self.word_vectors.key_to_index if self.word_vectors is not None else {}
+
+    @classmethod
+    def native_model_path(cls, model_path: str) -> str:
+        """Путь к копии модели в формате KeyedVectors"""
+        return os.path.splitext(model_path)[0] + cls.NATIVE_SUFFIX
+
     def load_word2vec_model(self, model_path: str):
         """Загрузка предобученной модели Word2Vec"""
         try:
-            print(f"Загрузка Word2Vec модели из {model_path}...")
-            self.word_vectors = KeyedVectors.load_word2vec_format(model_path, binary=True)
-            self.vocabulary = set(self.word_vectors.key_to_index.keys())
+            native_path = model_path if model_path.endswith(self.NATIVE_SUFFIX) else self.native_model_path(model_path)
+            if os.path.exists(native_path):
+                print(f"Загрузка Word2Vec модели из {native_path} (mmap)...")
+                self.word_vectors = KeyedVectors.load(native_path, mmap='r')
+            else:
+                print(f"Загрузка Word2Vec модели из {model_path}...")
+                self.word_vectors = KeyedVectors.load_word2vec_format(model_path, binary=True)
+                print(f"Для быстрой загрузки сконвертируйте модель: python scripts/convert_word2vec.py {model_path}")
             print(f"Word2Vec модель загружена. Размер словаря: {len(self.vocabulary)}")
+            self.expansion_version += 1
         except Exception as e:
             print(f"Ошибка загрузки Word2Vec модели: {e}")
+            return
+
+        ann_path = RandomProjectionIndex.index_path(model_path)
+        if self.use_ann_index and os.path.exists(ann_path):
+            try:
+                self.ann_index = RandomProjectionIndex.load(ann_path, self.word_vectors.vectors)
+                print(f"Загружен приближенный индекс соседей: {ann_path}")
+            except Exception as e:
+                print(f"Ошибка загрузки приближенного индекса соседей: {e}")
+
+    def build_neighbor_table(self, terms, top_n: int = TermNeighborTable.DEFAULT_TOP_N):
+        """Строит таблицу соседей для терминов словаря коллекции"""
+        if not self.word_vectors:
+            return None
+        self.term_embeddings = TermEmbeddings(self.word_vectors, terms)
+        self._document_terms = {}
+        self.neighbor_table = TermNeighborTable.build(self.term_embeddings, top_n, self.similarity_threshold)
+        self.expansion_version += 1
+        return self.neighbor_table
+
+    def attach_neighbor_table(self, neighbor_table) -> None:
+        """Подключает таблицу соседей, загруженную вместе с индексом"""
+        self.neighbor_table = neighbor_table
+        self.expansion_version += 1
+        if self.word_vectors:
+            # Векторы терминов коллекции восстанавливаются из модели по списку терминов таблицы
+            self.term_embeddings = TermEmbeddings(self.word_vectors, neighbor_table.terms)
+            self._document_terms = {}
+
+    def index_documents(self, documents: List) -> None:
+        """
+        Заранее сопоставляет документам строки их терминов в матрице векторов
+        (иначе это делается при первой оценке документа)
+        """
+        if not self.word_vectors:
+            return
+        embeddings = self._get_term_embeddings()
+        # Все новые термины добавляются в матрицу за один раз
+        embeddings.add_terms({term for doc in documents for term in (doc.processed_content or '').split()})
+        for doc in documents:
+            self._get_document_terms(doc)
+
+    def _get_term_embeddings(self) -> TermEmbeddings:
+        if self.term_embeddings is None:
+            self.term_embeddings = TermEmbeddings(self.word_vectors)
+        return self.term_embeddings
+
+    def _get_document_terms(self, document) -> Tuple:
+        """Строки терминов документа в матрице векторов (с кэшированием по doc_id)"""
+        content = document.processed_content or ''
+        content_hash = hash(content)
+        cached = self._document_terms.get(document.doc_id)
+        if cached is not None and cached[0] == content_hash:
+            return cached
+
+        doc_terms = set(content.split())
+        embeddings = self._get_term_embeddings()
+        embeddings.add_terms(doc_terms)
+        entry = (
+            content_hash,
+            embeddings.rows(doc_terms),
+            frozenset(term for term in doc_terms if term not in embeddings)
+        )
+        self._document_terms[document.doc_id] = entry
+        return entry
+
+    def _similar_words(self, term: str, top_n: int) -> List:
+        """
+        Похожие слова с близостью не ниже порога: из таблицы соседей,
+        а для терминов вне коллекции - поиском по всему словарю модели
+        """
+        if self.neighbor_table is not None and term in self.neighbor_table:
+            return self.neighbor_table.lookup(term, top_n)
+
+        if self.ann_index is not None:
+            term_index = self.word_vectors.key_to_index[term]
+            neighbors = self.ann_index.query(self.word_vectors.vectors[term_index], top_n, exclude=term_index)
+            similar_words = [(self.word_vectors.index_to_key[index], similarity) for index, similarity in neighbors]
+        else:
+            similar_words = self.word_vectors.most_similar(term, topn=top_n)
+        # Фильтруем по порогу схожести и конвертируем в float
+        return [
+            (similar_word, float(similarity))  # Конвертируем в float
+            for similar_word, similarity in similar_words 
+            if similarity >= self.similarity_threshold and similar_word != term
+        ]
 
     def expand_query_with_similar_words(self, query: str, top_n: int = 5) -> Dict:
         """
@@ -55,13 +185,7 @@ class SemanticEnhancer(BaseDocumentSelector):
         for term in original_terms:
             if term in self.vocabulary:
                 try:
-                    similar_words = self.word_vectors.most_similar(term, topn=top_n)
-                    # Фильтруем по порогу схожести и конвертируем в float
-                    filtered_similar = [
-                        (similar_word, float(similarity))  # Конвертируем в float
-                        for similar_word, similarity in similar_words 
-                        if similarity >= self.similarity_threshold and similar_word != term
-                    ]
+                    filtered_similar = self._similar_words(term, top_n)
                     
                     if filtered_similar:
                         similar_terms[term] = filtered_similar
@@ -133,53 +257,70 @@ class SemanticEnhancer(BaseDocumentSelector):
 
         return highlighted_text
 
-    def calculate_semantic_similarity(self, query: str, document) -> float:
+    def highlighted_snippet(self, text: str, expansion_result: Dict) -> str:
+        """
+        Фрагмент текста вокруг терминов расширенного запроса с подсветкой
+        """
+        return self.highlight_semantic_terms(self._generate_snippet(text, expansion_result['all_terms']),
+                                             expansion_result)
+
+    def calculate_semantic_similarity(self, query: str, document, expansion_result: Dict = None) -> float:
         """
         Вычисляет семантическую схожесть между запросом и документом
+        (расширение запроса можно передать готовым)
         """
         if not self.word_vectors or not hasattr(document, 'processed_content'):
             return 0.0
 
         # Расширяем запрос
-        expansion_result = self.expand_query_with_similar_words(query)
-        all_search_terms = expansion_result['all_terms']
-        
-        if not all_search_terms:
-            return 0.0
+        if expansion_result is None:
+            expansion_result = self.expand_query_with_similar_words(query)
+        return self._semantic_scores(expansion_result['all_terms'], [document])[0]
 
-        # Получаем термины документа
-        doc_terms = set(document.processed_content.split())
-        
-        # Вычисляем семантическое сходство
-        semantic_score = 0.0
-        matched_terms = 0
-
-        for query_term in all_search_terms:
-            if query_term in doc_terms:
-                # Прямое совпадение
-                semantic_score += 1.0
-                matched_terms += 1
-            elif query_term in self.vocabulary:
-                # Ищем семантически похожие слова в документе
-                best_similarity = 0.0
-                for doc_term in doc_terms:
-                    if doc_term in self.vocabulary:
-                        try:
-                            similarity = float(self.word_vectors.similarity(query_term, doc_term))  # Конвертируем
-                            if similarity > best_similarity:
-                                best_similarity = similarity
-                        except KeyError:
-                            continue
-                
-                if best_similarity >= self.similarity_threshold:
-                    semantic_score += best_similarity
-                    matched_terms += 1
+    def _semantic_scores(self, all_search_terms: List[str], documents: List) -> List[float]:
+        """
+        Семантическая схожесть расширенного запроса с каждым документом.
 
-        # Нормализуем скор
-        if matched_terms > 0:
-            semantic_score = semantic_score / len(all_search_terms)
-            
-        return float(min(semantic_score, 1.0))  # Гарантируем float
+        Термин запроса, который есть в документе, дает 1.0; иначе - лучшую
+        близость к терминам документа из модели, если она не ниже порога.
+        Сумма делится на число терминов запроса и ограничивается 1.0
+        """
+        if not self.word_vectors or not all_search_terms:
+            return [0.0] * len(documents)
+
+        # Строки документов - до векторов запроса: матрица терминов может пополниться
+        document_terms = [self._get_document_terms(doc) for doc in documents]
+        embeddings = self._get_term_embeddings()
+
+        query_rows = np.array([embeddings.term_to_row.get(term, -1) for term in all_search_terms], dtype=np.int64)
+        in_model = np.array([term in self.vocabulary for term in all_search_terms])
+        model_terms = [term for term in all_search_terms if term in self.vocabulary]
+        # Близости терминов запроса из модели только к терминам оцениваемых документов
+        # (одно произведение на объединение их строк, а не на весь словарь коллекции)
+        row_sets = [rows for _, rows, _ in document_terms if rows.size]
+        union_rows = np.unique(np.concatenate(row_sets)) if row_sets else np.zeros(0, dtype=np.int32)
+        similarities = (embeddings.vectors(model_terms) @ embeddings.matrix[union_rows].T
+                        if model_terms and union_rows.size else None)
+
+        scores = []
+        for _, rows, other_terms in document_terms:
+            direct = np.isin(query_rows, rows) & (query_rows >= 0)
+            if other_terms:
+                direct |= np.array([term in other_terms for term in all_search_terms])
+
+            best = np.zeros(len(all_search_terms), dtype=np.float64)
+            if similarities is not None and rows.size:
+                columns = np.searchsorted(union_rows, rows)
+                best[in_model] = np.maximum(similarities[:, columns].max(axis=1), 0.0)
+            semantic = ~direct & in_model & (best >= self.similarity_threshold)
+
+            matched_terms = int(direct.sum() + semantic.sum())
+            semantic_score = float(direct.sum() + best[semantic].sum())
+            if matched_terms > 0:
+                semantic_score = semantic_score / len(all_search_terms)
+            scores.append(float(min(semantic_score, 1.0)))
+
+        return scores
 
     def _generate_snippet(self, text: str, query_terms: str):
 
@@ -207,6 +348,10 @@ class SemanticEnhancer(BaseDocumentSelector):
                 print(f'\n{text_lower}\n')
 
 
+        # Документ найден по векторам без общих терминов - фрагмент с начала текста
+        if not positions:
+            return text[:300]
+
         start = max(min(positions) - 30, 0)
         end = max(positions) + 30
 
@@ -224,20 +369,29 @@ class SemanticEnhancer(BaseDocumentSelector):
         return snippet
 
     def enhance_search_with_semantics(self, query: str, search_results: List[Dict], 
-                                    documents: List) -> List[Dict]:
+                                    documents: List, expansion_result: Dict = None) -> List[Dict]:
         """
         Улучшает результаты поиска с учетом семантической схожести
         и добавляет информацию для подсветки
         """
         print("Применение семантического поиска с расширением запроса...")
 
-        # Расширяем запрос
-        expansion_result = self.expand_query_with_similar_words(query)
+        # Расширяем запрос (если расширение не вычислено на этапе 0)
+        if expansion_result is None:
+            expansion_result = self.expand_query_with_similar_words(query)
         
         # Создаем маппинг doc_id -> документ
         doc_map = {doc.doc_id: doc for doc in documents}
         
         enhanced_results = []
+
+        # Семантические скоры всех найденных документов за один проход
+        found_documents = [doc_map[result['metadata']['doc_id']] for result in search_results
+                           if result['metadata']['doc_id'] in doc_map]
+        semantic_scores = dict(zip(
+            [doc.doc_id for doc in found_documents],
+            self._semantic_scores(expansion_result['all_terms'], found_documents)
+        ))
         
         for result in search_results:
             doc_id = result['metadata']['doc_id']
@@ -245,15 +399,14 @@ class SemanticEnhancer(BaseDocumentSelector):
             
             if document:
                 # Вычисляем семантический скор
-                semantic_score = self.calculate_semantic_similarity(query, document)
+                semantic_score = semantic_scores[doc_id]
                 
                 # Комбинируем с оригинальным скором
                 original_score = float(result['similarity_score'])  # Конвертируем
                 combined_score = self._combine_scores(original_score, semantic_score)
                 
                 # Подсвечиваем термины в сниппете
-                original_snippet = self._generate_snippet(result['snippet'], expansion_result['all_terms'])
-                highlighted_snippet = self.highlight_semantic_terms(original_snippet, expansion_result)
+                highlighted_snippet = self.highlighted_snippet(result['snippet'], expansion_result)
                 
                 # Обновляем результат
                 enhanced_result = result.copy()
@@ -290,20 +443,18 @@ class SemanticEnhancer(BaseDocumentSelector):
 
     def select_documents(self, query: str, documents: List, top_k: int = 10) -> List:
         """Реализация абстрактного метода"""
-        scored_docs = []
-        
-        for doc in documents:
-            semantic_score = self.calculate_semantic_similarity(query, doc)
-            scored_docs.append((semantic_score, doc))
+        expansion_result = self.expand_query_with_similar_words(query)
+        scored_docs = list(zip(self._semantic_scores(expansion_result['all_terms'], documents), documents))
         
         scored_docs.sort(key=lambda x: x[0], reverse=True)
         return [doc for score, doc in scored_docs[:top_k]]
 
-    def get_semantic_analysis(self, query: str, document) -> Dict:
+    def get_semantic_analysis(self, query: str, document, expansion_result: Dict = None) -> Dict:
         """
         Детальный анализ семантической схожести
         """
-        expansion_result = self.expand_query_with_similar_words(query)
+        if expansion_result is None:
+            expansion_result = self.expand_query_with_similar_words(query)
         
         analysis = {
             'query': query,
@@ -311,7 +462,7 @@ class SemanticEnhancer(BaseDocumentSelector):
             'expanded_terms': expansion_result['expanded_terms'],
             'similar_terms': expansion_result['similar_terms'],
             'document_terms_count': len(document.processed_content.split()),
-            'semantic_score': self.calculate_semantic_similarity(query, document)
+            'semantic_score': self.calculate_semantic_similarity(query, document, expansion_result)
         }
         
         return analysis
\ No newline at end of file
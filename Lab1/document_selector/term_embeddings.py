@@ -0,0 +1,173 @@
+# document_selector/term_embeddings.py
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+
+
+class TermEmbeddings:
+    """
+    Нормированные векторы Word2Vec терминов коллекции - строки одной матрицы.
+
+    Документы ссылаются на строки этой матрицы (см. SemanticEnhancer), поэтому
+    векторы каждого термина хранятся один раз, а близости запроса к терминам
+    документа считаются матричным произведением. Термины, которых нет
+    в модели, в матрицу не попадают.
+    """
+
+    def __init__(self, word_vectors, terms: Iterable[str] = ()):
+        self.word_vectors = word_vectors
+        self.terms: List[str] = []
+        self.term_to_row: Dict[str, int] = {}
+        self.matrix = np.zeros((0, word_vectors.vector_size), dtype=np.float32)
+        self.add_terms(terms)
+
+    def add_terms(self, terms: Iterable[str]) -> int:
+        """Добавляет строки для новых терминов модели, возвращает их количество"""
+        key_to_index = self.word_vectors.key_to_index
+        new_terms = sorted({term for term in terms if term not in self.term_to_row and term in key_to_index})
+        if not new_terms:
+            return 0
+
+        vectors = self.vectors(new_terms)
+        for term in new_terms:
+            self.term_to_row[term] = len(self.terms)
+            self.terms.append(term)
+        self.matrix = np.vstack([self.matrix, vectors]) if len(self.matrix) else vectors
+        return len(new_terms)
+
+    def vectors(self, terms: List[str]) -> np.ndarray:
+        """Нормированные векторы терминов модели (строки в порядке terms)"""
+        key_to_index = self.word_vectors.key_to_index
+        vectors = np.array(self.word_vectors.vectors[[key_to_index[term] for term in terms]], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def rows(self, terms: Iterable[str]) -> np.ndarray:
+        """Отсортированные номера строк терминов (термины без строки пропускаются)"""
+        rows = [self.term_to_row[term] for term in terms if term in self.term_to_row]
+        return np.array(sorted(rows), dtype=np.int32)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.term_to_row
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+class TermNeighborTable:
+    """
+    Таблица семантических соседей для терминов словаря коллекции.
+
+    Соседи ищутся только среди терминов коллекции, которые есть в модели
+    Word2Vec (строки TermEmbeddings), и считаются один раз при построении
+    индекса: близости пачки терминов ко всем остальным - одно матричное
+    произведение нормированных векторов. При поиске расширение запроса -
+    поиск в словаре.
+
+    Хранится компактно: список терминов и две матрицы (термины x top_n)
+    с номерами соседей (-1 - пусто) и их близостями.
+    """
+
+    DEFAULT_TOP_N = 5
+    # Память на пачку терминов: близости (float32) и номера из argpartition (int64)
+    # к каждому термину коллекции; размер пачки подбирается по числу терминов
+    BATCH_MEMORY_BYTES = 64 * 1024 * 1024
+    MAX_BATCH_SIZE = 256
+
+    def __init__(self, terms: List[str], neighbors: np.ndarray, scores: np.ndarray,
+                 similarity_threshold: float):
+        self.terms = list(terms)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.similarity_threshold = float(similarity_threshold)
+        self.term_to_row: Dict[str, int] = {term: row for row, term in enumerate(self.terms)}
+
+    @property
+    def top_n(self) -> int:
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def build(cls, embeddings: TermEmbeddings, top_n: int = DEFAULT_TOP_N,
+              similarity_threshold: float = 0.6) -> 'TermNeighborTable':
+        """
+        Считает top_n соседей (с близостью не ниже порога) для каждого термина
+        """
+        terms = embeddings.terms
+        vectors = embeddings.matrix
+        print(f"Построение таблицы соседей: {len(terms)} терминов коллекции есть в модели Word2Vec")
+
+        neighbors = np.full((len(terms), top_n), -1, dtype=np.int32)
+        scores = np.zeros((len(terms), top_n), dtype=np.float32)
+        if not terms or top_n <= 0:
+            return cls(terms, neighbors, scores, similarity_threshold)
+
+        k = min(top_n, len(terms) - 1)
+        if k <= 0:
+            return cls(terms, neighbors, scores, similarity_threshold)
+
+        batch_size = cls.batch_size(len(terms))
+        for start in range(0, len(terms), batch_size):
+            end = min(start + batch_size, len(terms))
+            similarities = vectors[start:end] @ vectors.T
+            # Сам термин не может быть своим соседом
+            similarities[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+            # k наибольших - последние k после разбиения (без отрицания копией матрицы)
+            top = np.argpartition(similarities, len(terms) - k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            passed = top_scores >= similarity_threshold
+            neighbors[start:end, :k] = np.where(passed, top, -1)
+            scores[start:end, :k] = np.where(passed, top_scores, 0.0)
+
+        print(f"Таблица соседей построена: {int((neighbors >= 0).sum())} пар")
+        return cls(terms, neighbors, scores, similarity_threshold)
+
+    @classmethod
+    def batch_size(cls, num_terms: int) -> int:
+        """Терминов в одном произведении, чтобы пачка укладывалась в BATCH_MEMORY_BYTES"""
+        bytes_per_row = max(1, num_terms) * (np.dtype(np.float32).itemsize + np.dtype(np.int64).itemsize)
+        return max(1, min(cls.MAX_BATCH_SIZE, cls.BATCH_MEMORY_BYTES // bytes_per_row))
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.term_to_row
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, term: str, top_n: int = None) -> List[Tuple[str, float]]:
+        """Соседи термина по убыванию близости (пустой список, если их нет)"""
+        row = self.term_to_row.get(term)
+        if row is None:
+            return []
+        result = [
+            (self.terms[neighbor], float(score))
+            for neighbor, score in zip(self.neighbors[row].tolist(), self.scores[row].tolist())
+            if neighbor >= 0
+        ]
+        return result[:top_n] if top_n is not None else result
+
+    def save(self, filepath: str) -> None:
+        np.savez_compressed(
+            filepath,
+            terms=np.array(self.terms, dtype=str),
+            neighbors=self.neighbors,
+            scores=self.scores,
+            similarity_threshold=np.array(self.similarity_threshold)
+        )
+
+    @classmethod
+    def load(cls, filepath: str) -> 'TermNeighborTable':
+        with np.load(filepath) as data:
+            return cls(data['terms'].tolist(), data['neighbors'], data['scores'],
+                       float(data['similarity_threshold']))
+
+    def get_statistics(self) -> Dict:
+        return {
+            'terms': len(self.terms),
+            'top_n': self.top_n,
+            'neighbor_pairs': int((self.neighbors >= 0).sum()),
+            'similarity_threshold': self.similarity_threshold
+        }
@@ -1,18 +1,78 @@
 import os
-import glob
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import islice
 from .document import Document
 from .file_reader import FileReader
 from .metadata_collect import MetadataExtractor
+from .fingerprint import FileFingerprint
+from .language_filter import LanguageDetector
 from datetime import datetime
-from langdetect import detect, LangDetectException
+
+
+def _get_file_title(file_path):
+    """Извлекает заголовок из имени файла"""
+    base_name = os.path.basename(file_path)
+    name_without_ext = os.path.splitext(base_name)[0]
+    title = re.sub(r'[_-]', ' ', name_without_ext)
+    return title.title()
+
+
+def _extract_file(task):
+    """
+    Чтение одного файла: текст, язык и метаданные (выполняется в пуле).
+    language - вердикт из кэша языков (None - определить заново).
+    Возвращает (статус, аргументы Document или текст ошибки,
+    новая запись для кэша языков или None)
+    """
+    file_path, reader, use_file_metadata, language = task
+    try:
+        # Файлы не на английском языке из кэша даже не читаем
+        if language is not None and language != 'en':
+            return 'not_english', None, None
+
+        stat_result = os.stat(file_path)
+        content = reader(file_path)
+        if not content or not content.strip():
+            return 'empty', None, None
+
+        language_entry = None
+        if language is None:
+            language = LanguageDetector.detect_language(content)
+            language_entry = FileFingerprint.compute(file_path, stat_result)
+            language_entry['language'] = language
+        if language != 'en':
+            return 'not_english', None, language_entry
+
+        if use_file_metadata:
+            date_created, date_modified = MetadataExtractor.get_file_dates(file_path, stat_result)
+        else:
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            date_created, date_modified = current_time, current_time
+
+        _, ext = os.path.splitext(file_path.lower())
+        return 'ok', {
+            'title': _get_file_title(file_path),
+            'content': content,
+            'file_path': file_path,
+            'file_type': ext.upper(),
+            'file_size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'date_created': date_created,
+            'date_modified': date_modified
+        }, language_entry
+    except Exception as e:
+        return 'error', str(e), None
+
 
 class DocumentCollector:
     """
     Класс для сбора и обработки документов из директории
     """
     
-    def __init__(self, supported_extensions=None):
+    def __init__(self, supported_extensions=None, workers=1, use_processes=False, max_in_flight=None,
+                 language_cache=None):
         if supported_extensions is None:
             self.supported_extensions = {
                 '.txt': FileReader.read_txt,
@@ -25,15 +85,21 @@ class DocumentCollector:
         else:
             self.supported_extensions = supported_extensions
         
+        # Параллельное чтение: потоки (ввод-вывод) или процессы (разбор PDF/DOCX).
+        # Для процессов функции чтения должны быть доступны по имени модуля
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self.max_in_flight = max_in_flight or self.workers * 4
+
+        # LanguageCache: вердикты языка для неизмененных файлов
+        self.language_cache = language_cache
+
         self.documents = []
         self.next_id = 1
     
     def _get_file_title(self, file_path):
         """Извлекает заголовок из имени файла"""
-        base_name = os.path.basename(file_path)
-        name_without_ext = os.path.splitext(base_name)[0]
-        title = re.sub(r'[_-]', ' ', name_without_ext)
-        return title.title()
+        return _get_file_title(file_path)
     
     def _is_text_file(self, file_path):
         """Проверяет, является ли файл текстовым и поддерживаемым"""
@@ -42,75 +108,119 @@ class DocumentCollector:
     
     def _is_english(self, text):
         """Проверяет, написан ли текст на английском языке"""
-        try:
-            if not text.strip():
-                return False
-            lang = detect(text)
-            return lang == 'en'
-        except LangDetectException:
-            return False
-        except Exception as e:
-            print(f"Ошибка определения языка: {e}")
-            return False
-    
+        return LanguageDetector.detect_language(text) == 'en'
+
     def collect_documents(self, directory_path, recursive=True, use_file_metadata=True):
         """
         Собирает все документы из указанной директории
+
+        При workers > 1 файлы читаются в пуле потоков (или процессов при
+        use_processes=True), одновременно в работе не более max_in_flight файлов.
+        doc_id назначаются в порядке обхода (отсортированные имена), поэтому
+        не зависят от порядка завершения чтения.
         """
         if not os.path.exists(directory_path):
             print(f"Директория {directory_path} не существует!")
             return []
-        
+
+        self.documents.extend(self.iter_documents(directory_path, recursive, use_file_metadata))
+        return self.documents
+
+    def iter_documents(self, directory_path, recursive=True, use_file_metadata=True):
+        """
+        Генератор документов: дерево обходится лениво, документы выдаются
+        по одному и не сохраняются в self.documents, поэтому в памяти
+        одновременно находится не больше max_in_flight прочитанных файлов
+        """
+        if not os.path.exists(directory_path):
+            print(f"Директория {directory_path} не существует!")
+            return
+
         print(f"Начинаем сбор документов из: {directory_path}")
-        
-        pattern = os.path.join(directory_path, "**", "*") if recursive else os.path.join(directory_path, "*")
-        all_files = glob.glob(pattern, recursive=recursive)
-        text_files = [f for f in all_files if os.path.isfile(f) and self._is_text_file(f)]
-        
-        print(f"Найдено {len(text_files)} поддерживаемых файлов")
-        
-        for file_path in text_files:
+        yield from self.iter_path_documents(self.iter_file_paths(directory_path, recursive), use_file_metadata)
+
+    def iter_path_documents(self, file_paths, use_file_metadata=True):
+        """
+        Генератор документов по заданным путям (например, только новым
+        и измененным файлам при обновлении индекса)
+        """
+        tasks = (
+            (file_path, self.supported_extensions[os.path.splitext(file_path.lower())[1]], use_file_metadata,
+             self.language_cache.lookup(file_path) if self.language_cache is not None else None)
+            for file_path in file_paths
+        )
+
+        collected = 0
+        for file_path, (status, result, language_entry) in self._extract_all(tasks):
+            if language_entry is not None and self.language_cache is not None:
+                self.language_cache.store(language_entry)
+
+            if status == 'error':
+                print(f"Ошибка обработки файла {file_path}: {result}")
+            elif status == 'empty':
+                print(f"Пропущен пустой файл: {file_path}")
+            elif status == 'not_english':
+                print(f"Пропущен документ не на английском языке: {file_path}")
+            else:
+                result['doc_id'] = self.next_id
+                document = Document(**result)
+                self.next_id += 1
+                collected += 1
+                print(f"Обработан: {document.title} ({document.file_type.lower()}), создан: {document.date_created}")
+                yield document
+
+        if self.language_cache is not None:
+            self.language_cache.save()
+            print(f"Кэш языков: {self.language_cache.get_statistics()['hits']} файлов без повторного определения")
+        print(f"Сбор документов завершен. Обработано: {collected} документов")
+
+    def iter_file_paths(self, directory_path, recursive=True):
+        """
+        Ленивый обход дерева через os.scandir: поддерживаемые файлы
+        в отсортированном порядке, скрытые файлы и папки пропускаются
+        """
+        try:
+            with os.scandir(directory_path) as entries:
+                entries = sorted((entry for entry in entries if not entry.name.startswith('.')),
+                                 key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Ошибка чтения директории {directory_path}: {e}")
+            return
+
+        for entry in entries:
             try:
-                _, ext = os.path.splitext(file_path.lower())
-                content = self.supported_extensions[ext](file_path)
-                
-                if content and content.strip():
-
-                    if not self._is_english(content):
-                        break
-
-                    if use_file_metadata:
-                        date_created, date_modified = MetadataExtractor.get_file_dates(file_path)
-                    else:
-                        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        date_created, date_modified = current_time, current_time
-                    
-                    title = self._get_file_title(file_path)
-                    file_size = os.path.getsize(file_path)
-
-                    document = Document(
-                        doc_id=self.next_id,
-                        title=title,
-                        content=content,
-                        file_path=file_path,
-                        file_type=ext.upper(),
-                        file_size=file_size,
-                        date_created=date_created,
-                        date_modified=date_modified
-                    )
-                    
-                    self.documents.append(document)
-                    self.next_id += 1
-                    print(f"Обработан: {title} ({ext}), создан: {date_created}")
-                else:
-                    print(f"Пропущен пустой файл: {file_path}")
-                    
-            except Exception as e:
-                print(f"Ошибка обработки файла {file_path}: {e}")
-        
-        print(f"Сбор документов завершен. Обработано: {len(self.documents)} документов")
+                if entry.is_dir():
+                    if recursive:
+                        yield from self.iter_file_paths(entry.path, recursive)
+                elif entry.is_file() and self._is_text_file(entry.path):
+                    yield entry.path
+            except OSError as e:
+                print(f"Ошибка доступа к {entry.path}: {e}")
 
-        return self.documents
+    def _extract_all(self, tasks):
+        """
+        Извлекает файлы, выдавая пары (путь, результат) в порядке tasks.
+        Задачи берутся из итератора по мере получения результатов,
+        поэтому в памяти одновременно не больше max_in_flight текстов
+        """
+        if self.workers <= 1:
+            for task in tasks:
+                yield task[0], _extract_file(task)
+            return
+
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=self.workers) as executor:
+            in_flight = deque()
+            remaining = iter(tasks)
+            for task in islice(remaining, self.max_in_flight):
+                in_flight.append((task[0], executor.submit(_extract_file, task)))
+
+            while in_flight:
+                file_path, future = in_flight.popleft()
+                result = future.result()
+                for task in islice(remaining, 1):
+                    in_flight.append((task[0], executor.submit(_extract_file, task)))
+                yield file_path, result
 
     
     def get_documents_stats(self):
@@ -4,13 +4,15 @@ class Document:
     """
     Класс для представления документа в информационно-поисковой системе
     """
-    def __init__(self, doc_id, title, content, file_path, file_type, file_size=0, date_created=None, date_modified=None):
+    def __init__(self, doc_id, title, content, file_path, file_type, file_size=0, date_created=None, date_modified=None,
+                 mtime_ns=0):
         self.doc_id = doc_id
         self.title = title
         self.content = content
         self.file_path = file_path
         self.file_type = file_type
         self.file_size = file_size
+        self.mtime_ns = mtime_ns  # время изменения файла (os.stat), для поиска изменений
         self.date_created = date_created or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.date_modified = date_modified or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.date_added = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
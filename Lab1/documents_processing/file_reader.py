@@ -26,10 +26,8 @@ class FileReader:
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+                pages = [page.extract_text() or "" for page in pdf_reader.pages]
+                return "\n".join(pages).strip()
         except Exception as e:
             print(f"Ошибка чтения PDF файла {file_path}: {e}")
             return ""
@@ -39,10 +37,7 @@ class FileReader:
         """Чтение DOCX файлов"""
         try:
             doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
         except Exception as e:
             print(f"Ошибка чтения DOCX файла {file_path}: {e}")
             return ""
\ No newline at end of file
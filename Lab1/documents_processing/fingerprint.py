@@ -0,0 +1,61 @@
+import os
+import hashlib
+from typing import Dict, Optional
+
+
+class FileFingerprint:
+    """Отпечаток файла для проверки, изменился ли он с прошлой обработки"""
+
+    HASH_CHUNK_SIZE = 1 << 20
+
+    @staticmethod
+    def stat_signature(file_path: str, stat_result: Optional[os.stat_result] = None) -> Dict:
+        """Быстрая часть отпечатка: размер и время изменения"""
+        stat_result = stat_result or os.stat(file_path)
+        return {
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns
+        }
+
+    @staticmethod
+    def content_hash(file_path: str) -> str:
+        """SHA-1 содержимого файла (читается блоками)"""
+        digest = hashlib.sha1()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(FileFingerprint.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def compute(file_path: str, stat_result: Optional[os.stat_result] = None) -> Dict:
+        """Полный отпечаток: путь, размер, время изменения и хэш содержимого"""
+        fingerprint = FileFingerprint.stat_signature(file_path, stat_result)
+        fingerprint['path'] = os.path.abspath(file_path)
+        fingerprint['sha1'] = FileFingerprint.content_hash(file_path)
+        return fingerprint
+
+    @staticmethod
+    def matches(entry: Dict, file_path: str, stat_result: Optional[os.stat_result] = None) -> bool:
+        """
+        Проверяет, что файл не изменился с момента записи entry.
+        Хэш считается только если размер или время изменения отличаются
+        (например, файл был скопирован или "тронут" без изменения содержимого)
+        """
+        try:
+            signature = FileFingerprint.stat_signature(file_path, stat_result)
+        except OSError:
+            return False
+
+        if signature['size'] != entry.get('size'):
+            return False
+        if signature['mtime_ns'] == entry.get('mtime_ns'):
+            return True
+
+        try:
+            if FileFingerprint.content_hash(file_path) != entry.get('sha1'):
+                return False
+        except OSError:
+            return False
+
+        entry['mtime_ns'] = signature['mtime_ns']
+        return True
@@ -0,0 +1,121 @@
+# documents_processing/language_filter.py
+import os
+from typing import Dict, Optional
+from langdetect import DetectorFactory, detect, LangDetectException
+from text_preprocessing.utils import PreprocessingUtils
+from .fingerprint import FileFingerprint
+
+
+class LanguageDetector:
+    """
+    Определение языка по ограниченной выборке текста.
+
+    Из документа берутся SAMPLES фрагментов по SAMPLE_SIZE символов,
+    равномерно распределенных по тексту, поэтому время определения
+    не зависит от длины документа. Детектор инициализируется фиксированным
+    seed, и вердикт для одного и того же текста всегда одинаков.
+    """
+
+    SAMPLE_SIZE = 1000
+    SAMPLES = 3
+    SEED = 0
+
+    @staticmethod
+    def sample_text(text: str, sample_size: int = SAMPLE_SIZE, samples: int = SAMPLES) -> str:
+        """Детерминированная выборка фрагментов: начало, середина, конец"""
+        if len(text) <= sample_size * samples or samples < 2:
+            return text[:sample_size * samples]
+
+        step = (len(text) - sample_size) / (samples - 1)
+        fragments = []
+        for i in range(samples):
+            start = int(i * step)
+            if start:
+                # Начинаем фрагмент с границы слова
+                space = text.find(' ', start, start + 100)
+                if space != -1:
+                    start = space + 1
+            fragments.append(text[start:start + sample_size])
+        return '\n'.join(fragments)
+
+    @staticmethod
+    def detect_language(text: str) -> str:
+        """Код языка текста ('' если язык определить не удалось)"""
+        if not text or not text.strip():
+            return ''
+
+        DetectorFactory.seed = LanguageDetector.SEED
+        try:
+            return detect(LanguageDetector.sample_text(text))
+        except LangDetectException:
+            return ''
+        except Exception as e:
+            print(f"Ошибка определения языка: {e}")
+            return ''
+
+
+class LanguageCache:
+    """
+    Дисковый кэш вердиктов языка, привязанных к отпечатку файла.
+    Для неизмененных файлов язык повторно не определяется, а файлы
+    не на английском языке не нужно даже читать
+    """
+
+    DEFAULT_PATH = "search_index/language_cache.jsonl.gz"
+
+    def __init__(self, cache_path: str = DEFAULT_PATH):
+        self.cache_path = cache_path
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """Загружает кэш с диска (отсутствующий файл - пустой кэш)"""
+        self.entries = {}
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            for entry in PreprocessingUtils.iter_jsonl(self.cache_path):
+                self.entries[entry['path']] = entry
+        except Exception as e:
+            print(f"Ошибка чтения кэша языков {self.cache_path}: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Сохраняет кэш на диск, если он изменился"""
+        if not self._dirty:
+            return
+        PreprocessingUtils.write_jsonl(self.entries.values(), self.cache_path)
+        self._dirty = False
+
+    def lookup(self, file_path: str) -> Optional[str]:
+        """Язык файла из кэша или None, если файл новый или изменился"""
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is not None:
+            mtime_before = entry.get('mtime_ns')
+            if FileFingerprint.matches(entry, file_path):
+                self._dirty = self._dirty or entry.get('mtime_ns') != mtime_before
+                self.hits += 1
+                return entry['language']
+
+        self.misses += 1
+        return None
+
+    def store(self, entry: Dict) -> None:
+        """Сохраняет вердикт: отпечаток файла (FileFingerprint.compute) с полем language"""
+        self.entries[entry['path']] = entry
+        self._dirty = True
+
+    def get_statistics(self) -> Dict:
+        """Статистика использования кэша"""
+        total = self.hits + self.misses
+        return {
+            'cache_path': self.cache_path,
+            'cached_files': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
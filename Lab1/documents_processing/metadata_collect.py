@@ -7,12 +7,13 @@ class MetadataExtractor:
     """Класс для извлечения метаданных из файлов"""
     
     @staticmethod
-    def get_file_dates(file_path):
+    def get_file_dates(file_path, stat_result=None):
         """
         Получает даты создания и изменения файла из файловой системы
+        stat_result - уже полученный os.stat файла (чтобы не вызывать его повторно)
         """
         try:
-            stat = os.stat(file_path)
+            stat = stat_result or os.stat(file_path)
             created_timestamp = stat.st_ctime
             modified_timestamp = stat.st_mtime
             
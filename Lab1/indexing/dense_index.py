@@ -0,0 +1,199 @@
+# indexing/dense_index.py
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+from document_selector.ann_index import RandomProjectionIndex
+
+
+class DenseDocumentIndex:
+    """
+    Плотные векторы документов: среднее векторов Word2Vec терминов документа,
+    взвешенное по TF-IDF, в одной матрице (строки L2-нормализованы).
+
+    Строится одним произведением TF-IDF матрицы (столбцы терминов, которые есть
+    в модели) на матрицу нормированных векторов этих терминов. Находит
+    документы, близкие к запросу по смыслу, даже без общих терминов.
+    Для больших коллекций поиск идет через RandomProjectionIndex: он строится
+    при первом поиске (или загружается вместе с векторами) и сбрасывается
+    при изменении коллекции. При инкрементальных изменениях пересчитываются
+    только векторы новых и измененных документов.
+    """
+
+    # С какого числа документов поиск идет через приближенный индекс
+    ANN_MIN_DOCUMENTS = 100000
+
+    def __init__(self):
+        self.embeddings: Optional[np.ndarray] = None
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.doc_id_to_row: Dict[int, int] = {}
+        self.ann_index = None
+        # Столбцы TF-IDF матрицы с терминами из модели и строки их векторов в модели
+        self._columns: List[int] = []
+        self._model_rows: List[int] = []
+        self._columns_width = 0
+
+    def build(self, doc_matrix: sparse.csr_matrix, doc_ids, vocabulary, word_vectors) -> None:
+        """Считает векторы документов по TF-IDF матрице"""
+        self._columns, self._model_rows, self._columns_width = [], [], 0
+        self._set_embeddings(self._embed(doc_matrix, vocabulary, word_vectors), doc_ids)
+        print(f"Векторы документов построены: {self.embeddings.shape[0]} x {self.embeddings.shape[1]}, "
+              f"терминов из модели: {len(self._columns)}")
+
+    def update(self, doc_matrix: sparse.csr_matrix, doc_ids, changed_ids, vocabulary, word_vectors) -> None:
+        """
+        Приводит векторы к строкам TF-IDF матрицы после инкрементальных изменений:
+        векторы документов, которых не было или которые изменились (changed_ids),
+        считаются по их строкам, остальные переносятся без пересчета.
+        Годится, пока веса старых строк матрицы не пересчитывались (иначе - build)
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        changed = set(changed_ids)
+        old_rows = np.array([-1 if doc_id in changed else self.doc_id_to_row.get(doc_id, -1)
+                             for doc_id in doc_ids.tolist()], dtype=np.int64)
+        kept = old_rows >= 0
+        new_rows = np.flatnonzero(~kept)
+
+        embeddings = np.empty((len(doc_ids), self.embeddings.shape[1]), dtype=np.float32)
+        embeddings[kept] = self.embeddings[old_rows[kept]]
+        if new_rows.size:
+            embeddings[new_rows] = self._embed(doc_matrix[new_rows], vocabulary, word_vectors)
+        self._set_embeddings(embeddings, doc_ids)
+        print(f"Векторы документов обновлены: пересчитано {new_rows.size}, всего {len(doc_ids)}")
+
+    def _embed(self, doc_matrix: sparse.csr_matrix, vocabulary, word_vectors) -> np.ndarray:
+        """Нормированные векторы строк TF-IDF матрицы"""
+        # Столбцы терминов из модели досчитываются только для новых терминов словаря
+        key_to_index = word_vectors.key_to_index
+        for term_idx in range(self._columns_width, doc_matrix.shape[1]):
+            term = vocabulary.get_term_by_index(term_idx)
+            if term is not None and term in key_to_index:
+                self._columns.append(term_idx)
+                self._model_rows.append(key_to_index[term])
+        self._columns_width = max(self._columns_width, doc_matrix.shape[1])
+
+        columns = [column for column in self._columns if column < doc_matrix.shape[1]]
+        model_rows = self._model_rows[:len(columns)]
+        term_vectors = self.normalize(np.array(word_vectors.vectors[model_rows], dtype=np.float32)) if columns \
+            else np.zeros((0, word_vectors.vector_size), dtype=np.float32)
+        weights = sparse.csr_matrix(doc_matrix[:, columns], dtype=np.float32)
+        return self.normalize(np.asarray(weights @ term_vectors, dtype=np.float32))
+
+    def _set_embeddings(self, embeddings: np.ndarray, doc_ids, ann_index=None) -> None:
+        self.embeddings = embeddings
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.doc_id_to_row = {int(doc_id): row for row, doc_id in enumerate(self.doc_ids.tolist())}
+        self.ann_index = ann_index
+
+    def uses_ann(self) -> bool:
+        return len(self.doc_ids) >= self.ANN_MIN_DOCUMENTS
+
+    def _get_ann_index(self):
+        """Приближенный индекс (строится при первом поиске после изменения коллекции)"""
+        if self.ann_index is None and self.uses_ann():
+            self.ann_index = RandomProjectionIndex().build(self.embeddings)
+        return self.ann_index
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    @staticmethod
+    def embed_query(term_weights: Dict[str, float], word_vectors) -> Optional[np.ndarray]:
+        """
+        Вектор запроса: взвешенная сумма нормированных векторов терминов.
+        None, если ни одного термина нет в модели
+        """
+        terms = [term for term in term_weights if term in word_vectors.key_to_index]
+        if not terms:
+            return None
+        vectors = DenseDocumentIndex.normalize(
+            np.array(word_vectors.vectors[[word_vectors.key_to_index[term] for term in terms]], dtype=np.float32)
+        )
+        weights = np.array([term_weights[term] for term in terms], dtype=np.float32)
+        query = weights @ vectors
+        norm = float(np.linalg.norm(query))
+        return query / norm if norm > 0 else None
+
+    def search(self, query: np.ndarray, top_k: int = 10) -> List[Tuple[int, float]]:
+        """top_k пар (doc_id, близость) по убыванию близости"""
+        if self.embeddings is None or top_k <= 0 or not len(self.doc_ids):
+            return []
+
+        ann_index = self._get_ann_index()
+        if ann_index is not None:
+            return [(int(self.doc_ids[row]), score) for row, score in ann_index.query(query, top_k)]
+
+        scores = self.embeddings @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k] if len(scores) > top_k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.doc_ids[row]), float(scores[row])) for row in top]
+
+    def scores(self, query: np.ndarray, doc_ids: List[int]) -> Dict[int, float]:
+        """Близость запроса к заданным документам"""
+        rows = [self.doc_id_to_row[doc_id] for doc_id in doc_ids if doc_id in self.doc_id_to_row]
+        if self.embeddings is None or not rows:
+            return {}
+        values = self.embeddings[rows] @ query
+        return {int(self.doc_ids[row]): float(value) for row, value in zip(rows, values.tolist())}
+
+    @staticmethod
+    def doc_ids_path(filepath: str) -> str:
+        """Файл doc_id строк, сохраняемый рядом с векторами"""
+        return f"{os.path.splitext(filepath)[0]}_doc_ids.npy"
+
+    @classmethod
+    def files(cls, filepath: str) -> List[str]:
+        """Все файлы плотного индекса: векторы, их doc_id и приближенный индекс"""
+        return [filepath, cls.doc_ids_path(filepath), RandomProjectionIndex.index_path(filepath)]
+
+    def save(self, filepath: str) -> None:
+        """
+        Сохраняет векторы, их doc_id и приближенный индекс (если он построен).
+        Пишет во временный файл и заменяет старый: загруженные векторы могут
+        быть отображены (mmap) из того же файла
+        """
+        ann_path = RandomProjectionIndex.index_path(filepath)
+        writers = [(filepath, lambda f: np.save(f, self.embeddings)),
+                   (self.doc_ids_path(filepath), lambda f: np.save(f, self.doc_ids))]
+        if self.ann_index is not None:
+            writers.append((ann_path, self.ann_index.save))
+        elif os.path.exists(ann_path):
+            os.remove(ann_path)
+
+        for path, write in writers:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+
+    def load(self, filepath: str, doc_ids) -> None:
+        """
+        Загружает векторы через mmap. Строки должны идти в порядке doc_ids
+        TF-IDF матрицы: иначе (индекс обновлялся без модели и векторы
+        устарели) - ValueError. Сохраненный приближенный индекс загружается
+        с ними, иначе он будет построен при первом поиске
+        """
+        ids_path = self.doc_ids_path(filepath)
+        if not os.path.exists(ids_path) or not np.array_equal(np.load(ids_path), np.asarray(doc_ids)):
+            raise ValueError(f"Векторы документов {filepath} не соответствуют матрице индекса")
+        embeddings = np.load(filepath, mmap_mode='r')
+        if embeddings.shape[0] != len(doc_ids):
+            raise ValueError(f"Векторы документов {filepath} не соответствуют матрице индекса")
+
+        ann_index = None
+        ann_path = RandomProjectionIndex.index_path(filepath)
+        if len(doc_ids) >= self.ANN_MIN_DOCUMENTS and os.path.exists(ann_path):
+            try:
+                ann_index = RandomProjectionIndex.load(ann_path, embeddings)
+            except ValueError as e:
+                print(f"{e}, приближенный индекс будет построен заново")
+        self._set_embeddings(embeddings, doc_ids, ann_index)
+
+    def get_statistics(self) -> Dict:
+        return {
+            'documents': len(self.doc_ids),
+            'dimensions': int(self.embeddings.shape[1]) if self.embeddings is not None else 0,
+            'approximate': self.uses_ann()
+        }
@@ -0,0 +1,254 @@
+# indexing/feature_store.py
+from typing import Dict, Iterable, List, Set
+from collections import Counter
+import time
+import numpy as np
+from scipy import sparse
+from document_selector.base_selector import BaseDocumentSelector
+
+
+class DocumentFeatureStore:
+    """
+    Признаки документов для селекторов, посчитанные один раз при индексации.
+
+    Для каждого документа (строки) хранятся:
+    - счетчики токенов обработанного текста - разреженная матрица
+      (документы x токены); множество терминов документа - ее ненулевые столбцы;
+    - число токенов обработанного текста и длина исходного текста;
+    - токены заголовка в нижнем регистре - бинарная разреженная матрица;
+    - дата создания и признак PDF, из которых вместе с длиной текста
+      считается статический столбец оценок (свежесть, длина, тип файла).
+
+    Токены - те же, что получают селекторы разбиением строк по пробелам,
+    поэтому оценки не меняются, но при запросе документы не разбираются
+    заново: оценки для пачки документов - срезы строк и столбцов матриц.
+
+    Статические оценки не зависят от запроса и пересчитываются целиком,
+    когда устаревают (STATIC_REFRESH_INTERVAL), чтобы документы вовремя
+    переходили между интервалами свежести.
+    """
+
+    # Период пересчета статических оценок, секунды
+    STATIC_REFRESH_INTERVAL = 3600.0
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self.term_to_index: Dict[str, int] = {}
+        self.title_term_to_index: Dict[str, int] = {}
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.doc_id_to_row: Dict[int, int] = {}
+        self.term_counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.title_terms = sparse.csr_matrix((0, 0), dtype=np.int8)
+        self.token_counts = np.zeros(0, dtype=np.int32)
+        self.content_lengths = np.zeros(0, dtype=np.int64)
+        self.has_processed_content = np.zeros(0, dtype=bool)
+        self.created_timestamps = np.zeros(0, dtype=np.float64)
+        self.is_pdf = np.zeros(0, dtype=bool)
+        self.static_score_matrix = np.zeros((0, 3), dtype=np.float64)
+        self.static_scores_time = None  # время последнего пересчета статических оценок
+        self._term_columns = None  # CSC-копия счетчиков для поиска документов по терминам
+
+    def build(self, documents: List) -> None:
+        """Строит признаки коллекции заново"""
+        self.clear()
+        self.add_documents(documents)
+        print(f"Признаки документов построены: {len(self.doc_ids)} документов, "
+              f"{len(self.term_to_index)} токенов")
+
+    def add_documents(self, documents: List) -> None:
+        """Дописывает строки документов (уже известные doc_id заменяются)"""
+        documents = list(documents)
+        if not documents:
+            return
+        self.remove_documents([doc.doc_id for doc in documents if doc.doc_id in self.doc_id_to_row])
+
+        count_rows = self._rows(
+            (Counter(doc.processed_content.split()) if getattr(doc, 'processed_content', None) else {}
+             for doc in documents),
+            self.term_to_index, np.int32
+        )
+        title_rows = self._rows(
+            (dict.fromkeys(doc.title.lower().split(), 1) for doc in documents),
+            self.title_term_to_index, np.int8
+        )
+
+        self.term_counts = sparse.vstack(
+            [self._resized(self.term_counts, count_rows.shape[1]), count_rows], format='csr')
+        self.title_terms = sparse.vstack(
+            [self._resized(self.title_terms, title_rows.shape[1]), title_rows], format='csr')
+        self.token_counts = np.concatenate([self.token_counts, np.asarray(count_rows.sum(axis=1)).ravel()
+                                            .astype(np.int32)])
+        self.content_lengths = np.concatenate([self.content_lengths,
+                                               np.array([len(doc.content) for doc in documents], dtype=np.int64)])
+        self.has_processed_content = np.concatenate([
+            self.has_processed_content,
+            np.array([hasattr(doc, 'processed_content') for doc in documents], dtype=bool)
+        ])
+        self.created_timestamps = np.concatenate([
+            self.created_timestamps,
+            np.array([BaseDocumentSelector.parse_timestamp(doc.date_created) for doc in documents], dtype=np.float64)
+        ])
+        self.is_pdf = np.concatenate([self.is_pdf,
+                                      np.array([doc.file_type.upper() == 'PDF' for doc in documents], dtype=bool)])
+        self._set_doc_ids(np.concatenate([self.doc_ids,
+                                          np.array([doc.doc_id for doc in documents], dtype=np.int64)]))
+
+    def remove_documents(self, doc_ids: Iterable[int]) -> None:
+        """Удаляет строки документов"""
+        rows = [self.doc_id_to_row[doc_id] for doc_id in doc_ids if doc_id in self.doc_id_to_row]
+        if not rows:
+            return
+
+        keep = np.ones(len(self.doc_ids), dtype=bool)
+        keep[rows] = False
+        self.term_counts = self.term_counts[keep]
+        self.title_terms = self.title_terms[keep]
+        self.token_counts = self.token_counts[keep]
+        self.content_lengths = self.content_lengths[keep]
+        self.has_processed_content = self.has_processed_content[keep]
+        self.created_timestamps = self.created_timestamps[keep]
+        self.is_pdf = self.is_pdf[keep]
+        self._set_doc_ids(self.doc_ids[keep])
+
+    @staticmethod
+    def _rows(counters: Iterable[Dict[str, int]], term_to_index: Dict[str, int], dtype) -> sparse.csr_matrix:
+        """CSR-строки по счетчикам токенов; новые токены получают следующие номера столбцов"""
+        indptr = [0]
+        indices = []
+        data = []
+        for counter in counters:
+            for term, count in counter.items():
+                indices.append(term_to_index.setdefault(term, len(term_to_index)))
+                data.append(count)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=dtype), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(indptr) - 1, len(term_to_index))
+        )
+
+    @staticmethod
+    def _resized(matrix: sparse.csr_matrix, width: int) -> sparse.csr_matrix:
+        if matrix.shape[1] == width:
+            return matrix
+        matrix = sparse.csr_matrix(matrix)
+        matrix.resize((matrix.shape[0], width))
+        return matrix
+
+    def _set_doc_ids(self, doc_ids) -> None:
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.doc_id_to_row = {int(doc_id): row for row, doc_id in enumerate(self.doc_ids.tolist())}
+        self._term_columns = None
+        self.static_scores_time = None
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self.doc_id_to_row
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def rows(self, documents: List) -> np.ndarray:
+        """Номера строк документов (-1 для документов, которых нет в хранилище)"""
+        return np.array([self.doc_id_to_row.get(doc.doc_id, -1) for doc in documents], dtype=np.int64)
+
+    @staticmethod
+    def _columns(terms: Iterable[str], term_to_index: Dict[str, int]) -> List[int]:
+        return [term_to_index[term] for term in terms if term in term_to_index]
+
+    def query_term_counts(self, terms: Iterable[str], rows: np.ndarray) -> np.ndarray:
+        """Суммарное число вхождений терминов в обработанный текст документов"""
+        columns = self._columns(terms, self.term_to_index)
+        if not columns or not len(rows):
+            return np.zeros(len(rows), dtype=np.int64)
+        return np.asarray(self.term_counts[rows][:, columns].sum(axis=1)).ravel()
+
+    def query_term_coverage(self, terms: Iterable[str], rows: np.ndarray) -> np.ndarray:
+        """Количество различных терминов, встречающихся в обработанном тексте документов"""
+        columns = self._columns(terms, self.term_to_index)
+        if not columns or not len(rows):
+            return np.zeros(len(rows), dtype=np.int64)
+        return np.asarray(self.term_counts[rows][:, columns].getnnz(axis=1)).ravel()
+
+    def title_overlap(self, terms: Iterable[str], rows: np.ndarray) -> np.ndarray:
+        """Количество терминов, входящих в заголовок документов"""
+        columns = self._columns(terms, self.title_term_to_index)
+        if not columns or not len(rows):
+            return np.zeros(len(rows), dtype=np.int64)
+        return np.asarray(self.title_terms[rows][:, columns].getnnz(axis=1)).ravel()
+
+    def documents_containing_any(self, terms: Iterable[str]) -> Set[int]:
+        """doc_id документов, в обработанном тексте которых есть хотя бы один из терминов"""
+        columns = self._columns(terms, self.term_to_index)
+        if not columns:
+            return set()
+        if self._term_columns is None:
+            self._term_columns = sparse.csc_matrix(self.term_counts)
+        rows = np.unique(self._term_columns[:, columns].indices)
+        return set(self.doc_ids[rows].tolist())
+
+    def refresh_static_scores(self) -> None:
+        """Пересчитывает статические оценки всех документов по текущему времени"""
+        self.static_score_matrix = np.column_stack([
+            BaseDocumentSelector.freshness_scores(self.created_timestamps, BaseDocumentSelector.current_timestamp()),
+            BaseDocumentSelector.length_scores(self.content_lengths),
+            BaseDocumentSelector.file_type_scores(self.is_pdf)
+        ]) if len(self.doc_ids) else np.zeros((0, 3), dtype=np.float64)
+        self.static_scores_time = time.monotonic()
+
+    def static_scores(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Статические оценки документов: столбцы - свежесть, длина, тип файла
+        (пересчитываются, если устарели или коллекция изменилась)
+        """
+        if (self.static_scores_time is None
+                or time.monotonic() - self.static_scores_time > self.STATIC_REFRESH_INTERVAL):
+            self.refresh_static_scores()
+        return self.static_score_matrix[rows]
+
+    def save(self, filepath: str) -> None:
+        np.savez_compressed(
+            filepath,
+            terms=np.array(sorted(self.term_to_index, key=self.term_to_index.get), dtype=str),
+            title_terms=np.array(sorted(self.title_term_to_index, key=self.title_term_to_index.get), dtype=str),
+            doc_ids=self.doc_ids,
+            counts_data=self.term_counts.data, counts_indices=self.term_counts.indices,
+            counts_indptr=self.term_counts.indptr,
+            title_indices=self.title_terms.indices, title_indptr=self.title_terms.indptr,
+            token_counts=self.token_counts,
+            content_lengths=self.content_lengths,
+            has_processed_content=self.has_processed_content,
+            created_timestamps=self.created_timestamps,
+            is_pdf=self.is_pdf
+        )
+
+    @classmethod
+    def load(cls, filepath: str) -> 'DocumentFeatureStore':
+        store = cls()
+        with np.load(filepath) as data:
+            terms = data['terms'].tolist()
+            title_terms = data['title_terms'].tolist()
+            store.term_to_index = {term: index for index, term in enumerate(terms)}
+            store.title_term_to_index = {term: index for index, term in enumerate(title_terms)}
+            rows = len(data['doc_ids'])
+            store.term_counts = sparse.csr_matrix(
+                (data['counts_data'], data['counts_indices'], data['counts_indptr']), shape=(rows, len(terms)))
+            store.title_terms = sparse.csr_matrix(
+                (np.ones(len(data['title_indices']), dtype=np.int8), data['title_indices'], data['title_indptr']),
+                shape=(rows, len(title_terms)))
+            store.token_counts = data['token_counts']
+            store.content_lengths = data['content_lengths']
+            store.has_processed_content = data['has_processed_content']
+            store.created_timestamps = data['created_timestamps']
+            store.is_pdf = data['is_pdf']
+            store._set_doc_ids(data['doc_ids'])
+        return store
+
+    def get_statistics(self) -> Dict:
+        return {
+            'documents': len(self.doc_ids),
+            'terms': len(self.term_to_index),
+            'title_terms': len(self.title_term_to_index),
+            'term_count_entries': int(self.term_counts.nnz)
+        }
@@ -1,24 +1,68 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Tuple
 import json
+import os
+import numpy as np
+from scipy import sparse
 from .vocabulary import Vocabulary
 from .tfidf_calculator import TFIDFCalculator
+from .inverted_index import InvertedIndex
+from .query_cache import QueryResultCache
+from .dense_index import DenseDocumentIndex
+from .feature_store import DocumentFeatureStore
+from monitoring.metrics import track_stage, observe_items, QUERY_CACHE_REQUESTS, INDEX_SIZE, QUERY_CACHE_ENTRIES
 from vector_storage.chroma_storage import ChromaStorage
 from document_selector.hybrid_selector import HybridDocumentSelector
+from document_selector.term_embeddings import TermNeighborTable
+from document_selector.query_context import QueryContext
 
 class IndexBuilder:
     """
     Класс для построения и сохранения поискового индекса
     """
 
+    # Минимальная косинусная близость результата (как округление в ChromaStorage)
+    MIN_SIMILARITY = 0.05
+    # Длина фрагмента обработанного текста в результатах поиска
+    SNIPPET_LENGTH = 300
+    # Количество запросов в одном матричном умножении пакетного поиска
+    BATCH_QUERY_CHUNK = 256
+    # Файл таблицы семантических соседей в каталоге индекса
+    NEIGHBOR_TABLE_FILE = "term_neighbors.npz"
+    # Файл плотных векторов документов в каталоге индекса
+    DENSE_INDEX_FILE = "document_embeddings.npy"
+    # Файл признаков документов для селекторов
+    FEATURE_STORE_FILE = "document_features.npz"
+    # Вес близости плотных векторов в итоговой оценке (остальное - TF-IDF)
+    DENSE_WEIGHT = 0.3
+    # Минимальная близость плотных векторов для документа, не найденного по терминам
+    DENSE_MIN_SIMILARITY = 0.6
+
     def __init__(self, use_vector_db: bool = True, use_document_selector: bool = True,
-                 use_semantic_search: bool = True, word2vec_model_path: str = 'models/glove-wiki-gigaword-200.bin'):
+                 use_semantic_search: bool = True, word2vec_model_path: str = 'models/glove-wiki-gigaword-200.bin',
+                 idf_drift_threshold: float = 0.1, lazy_reweight: bool = True,
+                 query_cache_size: int = QueryResultCache.DEFAULT_MAX_SIZE,
+                 query_cache_ttl: float = QueryResultCache.DEFAULT_TTL):
+        # Версия индекса повышается при любом изменении и входит в ключ кэша запросов
+        self.index_version = 0
+        self.query_cache = QueryResultCache(query_cache_size, query_cache_ttl) if query_cache_size > 0 else None
         self.vocabulary = Vocabulary()
         self.tfidf_calculator = None
         self.tfidf_vectors = {}
+        self.inverted_index = None
+        self.dense_index = None
+        self.feature_store = DocumentFeatureStore()
         self.use_vector_db = use_vector_db
         self.vector_storage = None
         self.document_selector = None
         self.all_documents = []  # Добавляем хранение документов
+        self.document_metadata: Dict[int, Dict] = {}
+        self.document_snippets: Dict[int, str] = {}  # фрагменты для индексов без документов в памяти
+        self._document_map: Dict[int, object] = {}
+        self._document_map_source = None
+        self.idf_drift_threshold = idf_drift_threshold  # порог пересчета весов при инкрементальных изменениях
+        self.lazy_reweight = lazy_reweight
+        self.idf_drift = 0.0
+        self.last_query_context = None  # контекст последнего поиска (для анализа запроса)
 
         if use_vector_db:
             self.vector_storage = ChromaStorage()
@@ -32,9 +76,27 @@ class IndexBuilder:
                 use_semantic_search=use_semantic_search,
                 word2vec_model_path=word2vec_model_path
             )
+            self.document_selector.attach_feature_store(self.feature_store)
 
         print('Гибридный селектор документов создан!')
 
+    @property
+    def all_documents(self) -> List:
+        """Документы для гибридного селектора"""
+        return self._all_documents
+
+    @all_documents.setter
+    def all_documents(self, documents: List) -> None:
+        # Набор документов влияет на результаты гибридного поиска
+        self._all_documents = documents
+        self._bump_index_version()
+
+    def _bump_index_version(self) -> None:
+        """Отмечает изменение индекса: кэшированные результаты больше не действительны"""
+        self.index_version += 1
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+
     def semantic_query_analysis(self, query: str) -> Dict:
         """
         Анализ запроса с семантическим расширением
@@ -62,34 +124,138 @@ class IndexBuilder:
         # 2. Расчет TF-IDF весов
         self.tfidf_calculator = TFIDFCalculator(self.vocabulary)
         self.tfidf_vectors = self.tfidf_calculator.calculate_tfidf_weights(documents)
+        self.document_metadata = {doc.doc_id: self._document_metadata(doc) for doc in documents}
+
+        # 2.0 Признаки документов для селекторов (счетчики терминов, заголовки, длины)
+        self.feature_store.build(documents)
+
+        # 2.1 Инвертированный индекс для точного поиска top-k
+        self._build_inverted_index()
 
-        # 3. Сохранение в векторную БД
+        # 2.2 Таблица семантических соседей терминов словаря
+        self._build_neighbor_table()
+
+        # 2.3 Плотные векторы документов
+        self._build_dense_index()
+
+        self.idf_drift = 0.0
+
+        # 3. Сохранение в векторную БД (полная перестройка заменяет коллекцию)
         if self.use_vector_db and self.vector_storage:
+            self.vector_storage.clear_storage()
             self.vector_storage.store_documents(documents, self.tfidf_vectors)
 
+        self._bump_index_version()
+        print("=== ПОСТРОЕНИЕ ИНДЕКСА ЗАВЕРШЕНО ===")
+
+    def build_index_from_stream(self, document_batches: Iterable[List], store_batch_size: int = 256) -> None:
+        """
+        Построение индекса по потоку пачек предобработанных документов
+        (например, BatchTextPreprocessor.preprocess_stream).
+
+        Из каждой пачки сохраняются только строки частот, метаданные и короткие
+        фрагменты текста; сами документы не удерживаются, поэтому all_documents
+        остается пустым и гибридному селектору документы передаются отдельно.
+        IDF считается один раз после прохода по всей коллекции.
+        """
+        print("=== НАЧАЛО ПОТОКОВОГО ПОСТРОЕНИЯ ИНДЕКСА ===")
+
+        self.vocabulary.clear()
+        self.tfidf_calculator = TFIDFCalculator(self.vocabulary)
+        self.tfidf_vectors = {}
+        self.all_documents = []
+        self.document_metadata = {}
+        self.document_snippets = {}
+        self.feature_store.clear()
+
+        # 1. Словарь, строки частот и признаки документов пачка за пачкой
+        for batch in document_batches:
+            for doc in batch:
+                self.vocabulary.add_document(doc)
+                self.document_metadata[doc.doc_id] = self._document_metadata(doc)
+                self.document_snippets[doc.doc_id] = (doc.processed_content or "")[:self.SNIPPET_LENGTH]
+            self.tfidf_calculator.append_tf_rows(batch)
+            self.feature_store.add_documents(batch)
+
+        print(f"Словарь построен. Уникальных терминов: {self.vocabulary.get_vocabulary_size()}")
+
+        # 2. IDF и TF-IDF матрица по всей коллекции
+        self.tfidf_calculator.finish_tf_rows()
+        self._build_inverted_index()
+        self._build_neighbor_table()
+        self._build_dense_index()
+        self.idf_drift = 0.0
+        print(f"Расчет TF-IDF завершен. Обработано документов: {len(self.tfidf_calculator.doc_ids)}")
+
+        # 3. Векторная БД заполняется пачками по store_batch_size
+        if self.use_vector_db and self.vector_storage:
+            self.vector_storage.clear_storage()
+            doc_ids = self.tfidf_calculator.doc_ids.tolist()
+            for start in range(0, len(doc_ids), store_batch_size):
+                chunk = doc_ids[start:start + store_batch_size]
+                summaries = [
+                    type('Document', (), {'doc_id': doc_id, 'processed_content': self.document_snippets[doc_id]})()
+                    for doc_id in chunk
+                ]
+                self.vector_storage.store_documents(summaries, self._document_vectors(chunk),
+                                                    metadata=self.document_metadata)
+
+        self._bump_index_version()
         print("=== ПОСТРОЕНИЕ ИНДЕКСА ЗАВЕРШЕНО ===")
 
     def save_index(self, base_path: str) -> None:
         """
         Сохраняет индекс в файлы:
         - vocabulary.json - словарь
+        - tf_matrix.npz, doc_ids.npy - разреженная матрица частот терминов
+        - documents.json - метаданные документов
+        - term_neighbors.npz - таблица семантических соседей терминов
+        - document_embeddings.npy - плотные векторы документов
+        - document_features.npz - признаки документов для селекторов
         - index_metadata.json - метаданные индекса
         """
-        import os
         os.makedirs(base_path, exist_ok=True)
 
         # Сохраняем словарь (все еще нужен для обработки запросов)
         vocab_path = f"{base_path}/vocabulary.json"
         self.vocabulary.save_vocabulary(vocab_path)
 
+        # Сохраняем матрицу частот: TF-IDF веса пересчитываются при загрузке
+        if self.tfidf_calculator and self.tfidf_calculator.tf_matrix is not None:
+            sparse.save_npz(f"{base_path}/tf_matrix.npz", self.tfidf_calculator.tf_matrix)
+            np.save(f"{base_path}/doc_ids.npy", self.tfidf_calculator.doc_ids)
+
+        with open(f"{base_path}/documents.json", 'w', encoding='utf-8') as f:
+            json.dump(list(self.document_metadata.values()), f, ensure_ascii=False)
+
+        neighbor_table = self.document_selector.get_neighbor_table() if self.document_selector else None
+        neighbors_path = f"{base_path}/{self.NEIGHBOR_TABLE_FILE}"
+        if neighbor_table is not None:
+            neighbor_table.save(neighbors_path)
+        elif os.path.exists(neighbors_path):
+            # Таблица не обновлялась вместе со словарем - при загрузке она будет построена заново
+            os.remove(neighbors_path)
+
+        dense_path = f"{base_path}/{self.DENSE_INDEX_FILE}"
+        if self.dense_index is not None:
+            self.dense_index.save(dense_path)
+        else:
+            # Без модели векторы не обновлялись - старые файлы не должны остаться
+            for path in DenseDocumentIndex.files(dense_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if len(self.feature_store):
+            self.feature_store.save(f"{base_path}/{self.FEATURE_STORE_FILE}")
+
         # Сохраняем метаданные
         metadata = {
             'vocabulary_size': self.vocabulary.get_vocabulary_size(),
             'total_documents': self.vocabulary.total_documents,
             'use_vector_db': self.use_vector_db,
             'vector_db_documents': self.vector_storage.get_document_count() if self.vector_storage else 0,
-            'index_version': '2.0',
-            'description': 'Vector space model index with ChromaDB storage'
+            'index_version': '3.0',
+            'description': 'Vector space model index with sparse TF-IDF matrix and ChromaDB storage'
         }
 
         metadata_path = f"{base_path}/index_metadata.json"
@@ -98,35 +264,455 @@ class IndexBuilder:
 
         print(f"Индекс сохранен. Векторная БД: {metadata['vector_db_documents']} документов")
 
+    def load_index(self, base_path: str) -> None:
+        """
+        Загружает индекс, сохраненный методом save_index.
+        Если матрицы нет (индекс старой версии), поиск идет через векторную БД
+        """
+        self.vocabulary.load_vocabulary(f"{base_path}/vocabulary.json")
+        self.tfidf_calculator = TFIDFCalculator(self.vocabulary)
+
+        matrix_path = f"{base_path}/tf_matrix.npz"
+        if os.path.exists(matrix_path):
+            tf_matrix = sparse.load_npz(matrix_path)
+            doc_ids = np.load(f"{base_path}/doc_ids.npy")
+            self.tfidf_calculator.load_matrix(tf_matrix, doc_ids)
+            print(f"Загружена TF-IDF матрица: {tf_matrix.shape[0]} x {tf_matrix.shape[1]}")
+        else:
+            self.tfidf_calculator.reweight()
+            print("TF-IDF матрица не найдена, поиск будет выполняться через векторную БД")
+
+        documents_path = f"{base_path}/documents.json"
+        if os.path.exists(documents_path):
+            with open(documents_path, 'r', encoding='utf-8') as f:
+                self.document_metadata = {item['doc_id']: item for item in json.load(f)}
+
+        neighbors_path = f"{base_path}/{self.NEIGHBOR_TABLE_FILE}"
+        if self.document_selector and os.path.exists(neighbors_path):
+            self.document_selector.attach_neighbor_table(TermNeighborTable.load(neighbors_path))
+            print("Загружена таблица семантических соседей терминов")
+        # Таблицы нет или она построена для другого словаря (индекс обновлялся без модели)
+        if self.refresh_neighbor_table():
+            print("Таблица семантических соседей построена заново по словарю индекса")
+
+        features_path = f"{base_path}/{self.FEATURE_STORE_FILE}"
+        if os.path.exists(features_path):
+            self._set_feature_store(DocumentFeatureStore.load(features_path))
+            print(f"Загружены признаки документов: {len(self.feature_store)}")
+
+        self._build_inverted_index()
+        self._load_dense_index(f"{base_path}/{self.DENSE_INDEX_FILE}")
+        self._bump_index_version()
+
+    def add_documents(self, documents: List) -> Dict:
+        """
+        Инкрементально добавляет документы в индекс.
+        Документы с уже проиндексированным doc_id обновляются
+        """
+        if not documents:
+            return {'added': 0, 'updated': 0, 'idf_drift': self.idf_drift, 'reweighted': False}
+
+        existing = [doc for doc in documents if doc.doc_id in self.document_metadata]
+        if existing:
+            self._remove_from_index([doc.doc_id for doc in existing])
+
+        self._add_to_index(documents)
+        reweighted = self._after_incremental_update([doc.doc_id for doc in documents])
+
+        print(f"Инкрементальное добавление: новых {len(documents) - len(existing)}, "
+              f"обновлено {len(existing)}, дрейф IDF {self.idf_drift:.4f}")
+        return {
+            'added': len(documents) - len(existing),
+            'updated': len(existing),
+            'idf_drift': self.idf_drift,
+            'reweighted': reweighted
+        }
+
+    def align_documents(self, documents: List) -> List:
+        """
+        Сопоставляет заново собранные документы с индексом по file_path:
+        документы получают doc_id из document_metadata (сборщик нумерует
+        файлы по порядку, а после обновлений индекса номера расходятся),
+        файлы, которых нет в индексе, отбрасываются
+        """
+        path_to_doc_id = {meta['file_path']: doc_id for doc_id, meta in self.document_metadata.items()}
+        aligned = []
+        for doc in documents:
+            doc_id = path_to_doc_id.get(doc.file_path)
+            if doc_id is not None:
+                doc.doc_id = doc_id
+                aligned.append(doc)
+        return aligned
+
+    def update_documents(self, documents: List) -> Dict:
+        """
+        Переиндексирует измененные документы (по doc_id)
+        """
+        return self.add_documents(documents)
+
+    def remove_documents(self, doc_ids: List[int]) -> Dict:
+        """
+        Удаляет документы из индекса и векторной БД
+        """
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in self.document_metadata]
+        if not doc_ids:
+            return {'removed': 0, 'idf_drift': self.idf_drift, 'reweighted': False}
+
+        self._remove_from_index(doc_ids)
+        reweighted = self._after_incremental_update([])
+
+        print(f"Инкрементальное удаление: {len(doc_ids)} документов, дрейф IDF {self.idf_drift:.4f}")
+        return {'removed': len(doc_ids), 'idf_drift': self.idf_drift, 'reweighted': reweighted}
+
+    def reweight(self) -> None:
+        """
+        Пересчитывает TF-IDF веса всех документов по текущим IDF словаря.
+        Векторная БД не переписывается: она хранит веса на момент записи
+        и используется только как запасной путь поиска
+        """
+        print("Пересчет TF-IDF весов по текущим IDF...")
+        self.tfidf_calculator.reweight()
+        self.tfidf_vectors = self._document_vectors(self.tfidf_calculator.doc_ids.tolist())
+        self.idf_drift = 0.0
+        self._build_inverted_index()
+        # Таблица соседей заодно охватывает термины, добавленные после построения
+        self._build_neighbor_table()
+        self._build_dense_index()
+        self._bump_index_version()
+
+    def _add_to_index(self, documents: List) -> None:
+        """Учитывает документы в словаре, матрице и векторной БД"""
+        if not self.tfidf_calculator:
+            self.tfidf_calculator = TFIDFCalculator(self.vocabulary)
+
+        for doc in documents:
+            self.vocabulary.add_document(doc)
+
+        added_ids = self.tfidf_calculator.add_documents(documents)
+        vectors = self._document_vectors(added_ids)
+        self.tfidf_vectors.update(vectors)
+
+        for doc in documents:
+            self.document_metadata[doc.doc_id] = self._document_metadata(doc)
+            if doc.doc_id in vectors:
+                doc.tfidf_vector = vectors[doc.doc_id]
+        self.feature_store.add_documents(documents)
+        self.all_documents = self.all_documents + list(documents)
+
+        if self.use_vector_db and self.vector_storage:
+            self.vector_storage.store_documents(documents, vectors)
+
+    def _remove_from_index(self, doc_ids: List[int]) -> None:
+        """Исключает документы из словаря, матрицы и векторной БД"""
+        for doc_id in doc_ids:
+            term_indices = self.tfidf_calculator.get_document_term_indices(doc_id)
+            self.vocabulary.remove_document_terms(
+                self.vocabulary.get_term_by_index(term_idx) for term_idx in term_indices
+            )
+            self.document_metadata.pop(doc_id, None)
+            self.tfidf_vectors.pop(doc_id, None)
+
+        self.tfidf_calculator.remove_documents(doc_ids)
+        self.feature_store.remove_documents(doc_ids)
+
+        removed = set(doc_ids)
+        self.all_documents = [doc for doc in self.all_documents if doc.doc_id not in removed]
+
+        if self.use_vector_db and self.vector_storage:
+            self.vector_storage.delete_documents(doc_ids)
+
+    def _after_incremental_update(self, changed_ids: List[int]) -> bool:
+        """
+        Отслеживает дрейф IDF и при превышении порога пересчитывает веса
+        (changed_ids - добавленные и измененные документы).
+        Возвращает True, если веса были пересчитаны
+        """
+        self.idf_drift = self.tfidf_calculator.idf_drift()
+
+        if self.lazy_reweight and self.idf_drift > self.idf_drift_threshold:
+            print(f"Дрейф IDF {self.idf_drift:.4f} превысил порог {self.idf_drift_threshold}")
+            self.reweight()
+            return True
+
+        self._build_inverted_index()
+        self._update_dense_index(changed_ids)
+        self._bump_index_version()
+        return False
+
+    def _document_vectors(self, doc_ids: List[int]) -> Dict[int, sparse.csr_matrix]:
+        """Строки TF-IDF матрицы для заданных документов"""
+        doc_matrix = self.tfidf_calculator.doc_matrix
+        rows = self.tfidf_calculator.doc_id_to_row
+        return {doc_id: doc_matrix.getrow(rows[doc_id]) for doc_id in doc_ids if doc_id in rows}
+
+    def _build_inverted_index(self) -> None:
+        """Строит инвертированный индекс по TF-IDF матрице"""
+        if not self.tfidf_calculator or not self.tfidf_calculator.has_matrix():
+            self.inverted_index = None
+            return
+
+        self.inverted_index = InvertedIndex(self.vocabulary)
+        self.inverted_index.build(self.tfidf_calculator.doc_matrix, self.tfidf_calculator.doc_ids)
+
+    def _build_neighbor_table(self) -> None:
+        """
+        Таблица соседей для терминов, встречающихся в коллекции,
+        и строки терминов документов в матрице их векторов
+        """
+        if not self.document_selector:
+            return
+        self.document_selector.build_neighbor_table(self._collection_terms())
+        if self.all_documents:
+            self.document_selector.index_documents(self.all_documents)
+
+    def refresh_neighbor_table(self) -> bool:
+        """
+        Перестраивает таблицу соседей, если после инкрементальных изменений
+        термины коллекции (из модели) не совпадают с терминами таблицы.
+        Возвращает True, если таблица перестроена
+        """
+        word_vectors = self.document_selector.get_word_vectors() if self.document_selector else None
+        if word_vectors is None:
+            return False
+
+        neighbor_table = self.document_selector.get_neighbor_table()
+        terms = {term for term in self._collection_terms() if term in word_vectors.key_to_index}
+        if neighbor_table is not None and set(neighbor_table.terms) == terms:
+            return False
+
+        self._build_neighbor_table()
+        self._bump_index_version()
+        return True
+
+    def _collection_terms(self) -> List[str]:
+        """Термины словаря, которые встречаются хотя бы в одном документе"""
+        return [term for term, df in self.vocabulary.term_document_frequency.items() if df > 0]
+
+    def _set_feature_store(self, feature_store: DocumentFeatureStore) -> None:
+        """Заменяет признаки документов и подключает их к селектору"""
+        self.feature_store = feature_store
+        if self.document_selector:
+            self.document_selector.attach_feature_store(feature_store)
+
+    def _build_dense_index(self) -> None:
+        """Плотные векторы документов по TF-IDF матрице (нужна модель Word2Vec селектора)"""
+        word_vectors = self.document_selector.get_word_vectors() if self.document_selector else None
+        if word_vectors is None or not self.tfidf_calculator or not self.tfidf_calculator.has_matrix():
+            self.dense_index = None
+            return
+
+        self.dense_index = DenseDocumentIndex()
+        self.dense_index.build(self.tfidf_calculator.doc_matrix, self.tfidf_calculator.doc_ids,
+                               self.vocabulary, word_vectors)
+
+    def _update_dense_index(self, changed_ids: List[int]) -> None:
+        """
+        Векторы документов после инкрементального изменения: веса старых строк
+        матрицы не менялись, поэтому пересчитываются только changed_ids и новые строки
+        """
+        if self.dense_index is None or self.dense_index.embeddings is None:
+            self._build_dense_index()
+            return
+
+        word_vectors = self.document_selector.get_word_vectors() if self.document_selector else None
+        if word_vectors is None or not self.tfidf_calculator.has_matrix():
+            self.dense_index = None
+            return
+        self.dense_index.update(self.tfidf_calculator.doc_matrix, self.tfidf_calculator.doc_ids, changed_ids,
+                                self.vocabulary, word_vectors)
+
+    def _load_dense_index(self, filepath: str) -> None:
+        """Загружает плотные векторы документов или строит их, если файла нет"""
+        word_vectors = self.document_selector.get_word_vectors() if self.document_selector else None
+        if word_vectors is None or not self.tfidf_calculator.has_matrix() or not os.path.exists(filepath):
+            self._build_dense_index()
+            return
+
+        try:
+            self.dense_index = DenseDocumentIndex()
+            self.dense_index.load(filepath, self.tfidf_calculator.doc_ids)
+            print("Загружены плотные векторы документов")
+        except ValueError as e:
+            print(f"{e}, векторы будут построены заново")
+            self._build_dense_index()
+
     def search(self, query_text: str, preprocessor, top_k: int = 10) -> List[Dict]:
         """
-        Умный поиск с использованием гибридного селектора
+        Умный поиск с использованием гибридного селектора.
+        Результаты повторных запросов берутся из кэша, пока индекс не изменился
         """
-        if not self.vector_storage:
-            raise ValueError("Векторная БД не инициализирована")
+        with track_stage('search_total'):
+            results = self._search(query_text, preprocessor, top_k)
+        observe_items('search_total', len(results))
+        return results
 
+    def _search(self, query_text: str, preprocessor, top_k: int) -> List[Dict]:
         if not self.tfidf_calculator:
             raise ValueError("TF-IDF калькулятор не инициализирован")
 
+        if not self.tfidf_calculator.has_matrix() and not self.vector_storage:
+            raise ValueError("Векторная БД не инициализирована")
+
+        # Расширение, предобработка и векторизация запроса - один раз на поиск
+        context = self._create_query_context(query_text, preprocessor)
+        self.last_query_context = context
+
+        cache_key = None
+        if self.query_cache is not None:
+            cache_key = self._query_cache_key(context, top_k)
+            cached = self.query_cache.get(cache_key)
+            QUERY_CACHE_REQUESTS.inc(result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                print(f"Ранжирование запроса взято из кэша (версия индекса {self.index_version})")
+                return self._results_from_ranking(cached, context)
+
         # Если есть документы и включен селектор - используем гибридный поиск
-        if self.all_documents and self.document_selector:
+        if self._uses_selector():
             print("Используем гибридный селектор для поиска")
-            return self.search_with_selection(query_text, preprocessor, self.all_documents, top_k)
+            results = self.search_with_selection(query_text, preprocessor, self.all_documents, top_k, context)
         else:
             # Стандартный поиск как запасной вариант
             print("Используем стандартный поиск")
-            return self._standard_search(query_text, preprocessor, top_k)
+            results = self._standard_search(query_text, preprocessor, top_k, context)
+
+        if cache_key is not None:
+            self.query_cache.put(cache_key, [self._ranking_entry(result) for result in results])
+
+        return results
+
+    def search_many(self, query_texts: List[str], preprocessor, top_k: int = 10) -> List[List[Dict]]:
+        """
+        Пакетный поиск для офлайн-задач: все запросы предобрабатываются за
+        один проход, векторизуются в одну разреженную матрицу и оцениваются
+        одним умножением на матрицу документов (частями по BATCH_QUERY_CHUNK
+        запросов, чтобы ограничить память).
+
+        Это точный TF-IDF поиск, как _standard_search: гибридный селектор
+        (расширение запроса, правила, переранжирование) и кэш запросов
+        не используются. Возвращает список результатов для каждого запроса
+        """
+        if not self.tfidf_calculator:
+            raise ValueError("TF-IDF калькулятор не инициализирован")
+
+        with track_stage('batch_search_total'):
+            with track_stage('batch_query_preprocessing'):
+                if hasattr(preprocessor, 'preprocess_texts'):
+                    term_lists = preprocessor.preprocess_texts(query_texts, return_string=False)
+                else:
+                    term_lists = [preprocessor.preprocess_text(text, return_string=False, debug=False)
+                                  for text in query_texts]
+
+            if not self.tfidf_calculator.has_matrix():
+                # Индекс без матрицы: запросы по одному через векторную БД
+                if not self.vector_storage:
+                    raise ValueError("Векторная БД не инициализирована")
+                ranked_results = [
+                    self._search_vectors(self.tfidf_calculator.queries_to_tfidf_matrix([terms]), top_k)
+                    for terms in term_lists
+                ]
+            else:
+                ranked_results = []
+                for start in range(0, len(term_lists), self.BATCH_QUERY_CHUNK):
+                    chunk = term_lists[start:start + self.BATCH_QUERY_CHUNK]
+                    with track_stage('batch_query_vectorization'):
+                        query_matrix = self.tfidf_calculator.queries_to_tfidf_matrix(chunk)
+                    with track_stage('batch_matrix_search'):
+                        ranked = self.tfidf_calculator.top_documents_many(
+                            query_matrix, top_k, min_score=self.MIN_SIMILARITY
+                        )
+                    ranked_results.extend(
+                        [self._format_result(doc_id, score) for doc_id, score in query_ranked]
+                        for query_ranked in ranked
+                    )
+
+        for terms, results in zip(term_lists, ranked_results):
+            for result in results:
+                result['query_terms'] = terms
+            observe_items('batch_search_total', len(results))
+
+        print(f"Пакетный поиск: {len(query_texts)} запросов, "
+              f"найдено результатов: {sum(len(results) for results in ranked_results)}")
+        return ranked_results
+
+    def _create_query_context(self, query_text: str, preprocessor) -> QueryContext:
+        """Контекст запроса для всех этапов поиска"""
+        if self.document_selector:
+            return self.document_selector.create_context(query_text, preprocessor, self.tfidf_calculator)
+        return QueryContext(query_text, preprocessor, self.tfidf_calculator)
+
+    def _uses_selector(self) -> bool:
+        """Идет ли поиск через гибридный селектор"""
+        return bool(self.all_documents and self.document_selector)
+
+    def _query_cache_key(self, context: QueryContext, top_k: int) -> Tuple:
+        """
+        Ключ кэша: нормализованные термины запроса, top_k и версия индекса.
+        Для гибридного селектора также слова запроса (по ним расширяется запрос
+        и работают правила) и отметка настроек расширения - само расширение
+        для ключа не вычисляется
+        """
+        key = (tuple(sorted(context.processed_terms)),)
+        if self._uses_selector():
+            key += (tuple(sorted(context.query_text.lower().split())), self.document_selector.expansion_stamp())
+        return key + (top_k, self.index_version)
+
+    @staticmethod
+    def _ranking_entry(result: Dict) -> Dict:
+        """
+        Запись кэша для результата: doc_id и оценки без полей, зависящих
+        от текста запроса (сниппет, подсветка, расширение, термины запроса)
+        """
+        entry = {key: value for key, value in result.items() if key not in ('metadata', 'snippet', 'query_terms')}
+        entry['doc_id'] = result['metadata']['doc_id']
+        if 'semantic_info' in entry:
+            entry['semantic_info'] = {key: value for key, value in entry['semantic_info'].items()
+                                      if key not in ('expansion_result', 'highlighted_snippet')}
+        return entry
+
+    def _results_from_ranking(self, ranking: List[Dict], context: QueryContext) -> List[Dict]:
+        """
+        Результаты по ранжированию из кэша: метаданные, сниппеты, подсветка
+        и расширение собираются заново для текущего запроса
+        """
+        uses_selector = self._uses_selector()
+        expansion_result = None
+        if uses_selector:
+            # Этапы отбора не выполнялись - статистика прошлого запроса не относится к этому
+            self.document_selector.selection_stats = {'cached': True}
+            # Расширение нужно только для подсветки сниппетов
+            if any('semantic_info' in entry for entry in ranking):
+                expansion_result = context.expansion_result
+                self.document_selector.last_expansion_result = expansion_result
+
+        document_map = self._get_document_map()
+        results = []
+        for entry in ranking:
+            doc_id = entry['doc_id']
+            result = self._format_result(doc_id, entry['similarity_score'])
+            result.update({key: dict(value) if isinstance(value, dict) else value for key, value in entry.items()})
+            if uses_selector and doc_id in document_map:
+                result['snippet'] = document_map[doc_id].processed_content
+            if expansion_result is not None and 'semantic_info' in result:
+                result['snippet'] = self.document_selector.highlight_snippet(result['snippet'], expansion_result)
+                result['semantic_info']['expansion_result'] = expansion_result
+                result['semantic_info']['highlighted_snippet'] = result['snippet']
+            result['query_terms'] = context.processed_terms
+            results.append(result)
+        return results
 
-    def _standard_search(self, query_text: str, preprocessor, top_k: int = 10) -> List[Dict]:
+    def _standard_search(self, query_text: str, preprocessor, top_k: int = 10,
+                         context: QueryContext = None) -> List[Dict]:
         """
         Стандартный поиск без селектора (запасной вариант)
         """
-        processed_terms, query_vector = self.tfidf_calculator.process_query(query_text, preprocessor)
+        if context is None:
+            context = self._create_query_context(query_text, preprocessor)
+        processed_terms, query_vector = context.processed_terms, context.query_vector
 
         print(f"Обработанные термины запроса: {processed_terms}")
-        print(f"Размер вектора запроса: {len(query_vector)}")
+        print(f"Размер вектора запроса: {query_vector.shape[1]}")
 
-        results = self.vector_storage.search_similar(query_vector, top_k)
+        results = self._search_vectors(query_vector, top_k)
 
         for result in results:
             result['query_terms'] = processed_terms
@@ -134,69 +720,216 @@ class IndexBuilder:
         return results
 
     def search_with_selection(self, query_text: str, preprocessor,
-                              all_documents: List, top_k: int = 10) -> List[Dict]:
+                              all_documents: List, top_k: int = 10,
+                              context: QueryContext = None) -> List[Dict]:
         """
         Поиск с интеллектуальным отбором документов
         """
         if not self.document_selector:
             print("Селектор не инициализирован, используем стандартный поиск")
-            return self._standard_search(query_text, preprocessor, top_k)
+            return self._standard_search(query_text, preprocessor, top_k, context)
+
+        if context is None:
+            context = self._create_query_context(query_text, preprocessor)
 
         # Функция для точного поиска (будет использоваться селектором)
         def exact_search(query, documents, k):
             print(f"Точный поиск по {len(documents)} документам...")
-            
+
             # Создаем маппинг для быстрого доступа
             doc_map = {doc.doc_id: doc for doc in documents}
 
-
-            
-            # Выполняем стандартный поиск
-            processed_terms, query_vector = self.tfidf_calculator.process_query(query, preprocessor)
-            vector_results = self.vector_storage.search_similar(query_vector, k)
-            
-            for vec_res in vector_results: vec_res['snippet'] = doc_map[vec_res['doc_id']].processed_content
+            # Оцениваются только кандидаты; если кандидаты - вся коллекция,
+            # работает обычный поиск top-k (вектор запроса берется из контекста)
+            candidate_ids = list(doc_map) if len(doc_map) < self._indexed_document_count() else None
+            vector_results = self._search_vectors(context.vector(query), k, candidate_ids)
 
             filtered_results = []
 
             for result in vector_results:
                 doc_id = result['metadata']['doc_id']
                 if doc_id in doc_map:
+                    result['snippet'] = doc_map[doc_id].processed_content
                     filtered_results.append(result)
-            
-            print(f"Найдено релевантных документов: {len(filtered_results)}")
 
-            
+            print(f"Найдено релевантных документов: {len(filtered_results)}")
 
             return filtered_results
 
+        # Функция поиска по плотным векторам: дополняет и переоценивает результаты точного поиска
+        def dense_search(query_context, sparse_results, k):
+            if all_documents is self.all_documents:
+                doc_map = self._get_document_map()
+            else:
+                doc_map = {doc.doc_id: doc for doc in all_documents}
+            return self._fuse_dense_results(query_context, sparse_results, k, doc_map)
+
         # Используем гибридный селектор
         results = self.document_selector.process_search(
-            query_text, all_documents, exact_search, top_k
+            query_text, all_documents, exact_search, top_k, context,
+            dense_search if self.dense_index is not None else None
         )
 
         # Добавляем информацию о терминах запроса
-        processed_terms, _ = self.tfidf_calculator.process_query(query_text, preprocessor)
+        processed_terms = context.processed_terms
         for result in results:
             result['query_terms'] = processed_terms
 
         return results
 
-    def analyze_query(self, query_text: str, preprocessor) -> Dict:
+    def _fuse_dense_results(self, context: QueryContext, sparse_results: List[Dict], k: int,
+                            doc_map: Dict) -> List[Dict]:
+        """
+        Слияние результатов точного поиска с поиском по плотным векторам:
+        итоговая оценка - (1 - DENSE_WEIGHT) * TF-IDF + DENSE_WEIGHT * близость векторов.
+        Документы без общих с запросом терминов добавляются, если близость
+        их векторов не ниже DENSE_MIN_SIMILARITY
+        """
+        word_vectors = self.document_selector.get_word_vectors()
+        query_vector = context.query_vector
+        term_weights = {
+            self.vocabulary.get_term_by_index(int(term_idx)): float(weight)
+            for term_idx, weight in zip(query_vector.indices, query_vector.data)
+        }
+        # Термины вне словаря коллекции получают вес самого редкого термина запроса
+        default_weight = max(term_weights.values(), default=1.0)
+        for term in context.processed_terms:
+            if self.vocabulary.get_term_index(term) == -1:
+                term_weights[term] = default_weight
+
+        dense_query = DenseDocumentIndex.embed_query(term_weights, word_vectors)
+        if dense_query is None:
+            return sparse_results
+
+        sparse_ids = [result['metadata']['doc_id'] for result in sparse_results]
+        dense_scores = self.dense_index.scores(dense_query, sparse_ids)
+        fused = list(sparse_results)
+        found = set(sparse_ids)
+        for doc_id, score in self.dense_index.search(dense_query, k):
+            if doc_id in found or doc_id not in doc_map or score < self.DENSE_MIN_SIMILARITY:
+                continue
+            result = self._format_result(doc_id, 0.0)
+            result['snippet'] = doc_map[doc_id].processed_content
+            dense_scores[doc_id] = score
+            fused.append(result)
+
+        for result in fused:
+            doc_id = result['metadata']['doc_id']
+            sparse_score = result['similarity_score']
+            dense_score = dense_scores.get(doc_id, 0.0)
+            result['sparse_score'] = sparse_score
+            result['dense_score'] = dense_score
+            result['similarity_score'] = (1.0 - self.DENSE_WEIGHT) * sparse_score + self.DENSE_WEIGHT * dense_score
+            result['distance'] = 2.0 - 2.0 * result['similarity_score']
+
+        fused.sort(key=lambda result: result['similarity_score'], reverse=True)
+        print(f"Слияние с поиском по векторам документов: "
+              f"добавлено {len(fused) - len(sparse_results)}, всего {len(fused)}")
+        return fused[:k]
+
+    def _search_vectors(self, query_vector: sparse.csr_matrix, top_k: int,
+                        doc_ids: List[int] = None) -> List[Dict]:
+        """
+        Поиск top_k документов по вектору запроса.
+        Основной путь - инвертированный индекс с отсечением MaxScore,
+        затем произведение TF-IDF матрицы на вектор запроса;
+        векторная БД используется только для индексов без матрицы.
+        Если заданы doc_ids, оцениваются только строки этих документов
+        """
+        if not self.tfidf_calculator.has_matrix():
+            return self.vector_storage.search_similar(query_vector.toarray().ravel().tolist(), top_k, doc_ids)
+
+        if doc_ids is not None and self.inverted_index is not None:
+            rows = [self.tfidf_calculator.doc_id_to_row[doc_id] for doc_id in doc_ids
+                    if doc_id in self.tfidf_calculator.doc_id_to_row]
+            with track_stage('candidate_search'):
+                ranked = self.inverted_index.search_rows(query_vector, rows, top_k, min_score=self.MIN_SIMILARITY)
+            print(f"Статистика поиска среди кандидатов: {self.inverted_index.last_query_stats}")
+            observe_items('candidate_search', len(rows))
+        elif doc_ids is not None:
+            with track_stage('candidate_search'):
+                ranked = self.tfidf_calculator.top_documents_among(query_vector, doc_ids, top_k,
+                                                                   min_score=self.MIN_SIMILARITY)
+            observe_items('candidate_search', len(doc_ids))
+        elif self.inverted_index is not None:
+            with track_stage('inverted_index_search'):
+                ranked = self.inverted_index.search(query_vector, top_k, min_score=self.MIN_SIMILARITY)
+            print(f"Статистика инвертированного индекса: {self.inverted_index.last_query_stats}")
+            observe_items('inverted_index_postings', self.inverted_index.last_query_stats.get('postings_scanned', 0))
+        else:
+            with track_stage('matrix_search'):
+                ranked = self.tfidf_calculator.top_documents(query_vector, top_k, min_score=self.MIN_SIMILARITY)
+        results = [self._format_result(doc_id, score) for doc_id, score in ranked]
+        print(f"Найдено результатов: {len(results)}")
+        return results
+
+    def _indexed_document_count(self) -> int:
+        """Количество документов, по которым идет точный поиск"""
+        if self.tfidf_calculator and self.tfidf_calculator.has_matrix():
+            return len(self.tfidf_calculator.doc_ids)
+        return self.vector_storage.get_document_count() if self.vector_storage else 0
+
+    def _format_result(self, doc_id: int, score: float) -> Dict:
+        """
+        Формирует результат в том же формате, что и ChromaStorage.search_similar
+        """
+        metadata = self.document_metadata.get(doc_id, {'doc_id': doc_id})
+        document = self._get_document_map().get(doc_id)
+        if document is not None:
+            snippet = document.processed_content[:self.SNIPPET_LENGTH] if document.processed_content else ""
+        else:
+            snippet = self.document_snippets.get(doc_id, "")
+
+        return {
+            'doc_id': doc_id,
+            'metadata': dict(metadata),
+            'similarity_score': score,
+            'distance': 2.0 - 2.0 * score,
+            'snippet': snippet
+        }
+
+    def _get_document_map(self) -> Dict:
+        """Маппинг doc_id -> документ, перестраивается при замене all_documents"""
+        if self._document_map_source is not self.all_documents:
+            self._document_map = {doc.doc_id: doc for doc in self.all_documents}
+            self._document_map_source = self.all_documents
+        return self._document_map
+
+    @staticmethod
+    def _document_metadata(doc) -> Dict:
+        """Метаданные документа (те же поля, что сохраняются в ChromaStorage)"""
+        return {
+            "doc_id": doc.doc_id,
+            "title": doc.title,
+            "file_path": doc.file_path,
+            "file_type": doc.file_type,
+            "file_size": doc.file_size,
+            "mtime_ns": getattr(doc, 'mtime_ns', 0) or 0,
+            "date_created": doc.date_created,
+            "date_modified": doc.date_modified,
+            "date_added": doc.date_added,
+            "content_length": len(doc.content),
+            "processed_length": len(doc.processed_content) if hasattr(doc, 'processed_content') else 0
+        }
+
+    def analyze_query(self, query_text: str, preprocessor, context: QueryContext = None) -> Dict:
         """
         Анализ запроса: показывает какие термины были извлечены и их веса
+        (контекст уже выполненного поиска по тому же запросу переиспользуется)
         """
         if not self.tfidf_calculator:
             return {'error': 'TF-IDF калькулятор не инициализирован'}
 
-        processed_terms, query_vector = self.tfidf_calculator.process_query(query_text, preprocessor)
+        if context is None or context.query_text != query_text:
+            context = self._create_query_context(query_text, preprocessor)
+        processed_terms, query_vector = context.processed_terms, context.query_vector
 
         # Анализ терминов и их весов
         term_analysis = []
         for term in set(processed_terms):
             term_idx = self.vocabulary.get_term_index(term)
             if term_idx != -1:
-                weight = query_vector[term_idx]
+                weight = float(query_vector[0, term_idx])
                 df = self.vocabulary.get_document_frequency(term)
                 idf = self.tfidf_calculator._calculate_idf(term)
                 term_analysis.append({
@@ -219,10 +952,16 @@ class IndexBuilder:
             'original_query': query_text,
             'processed_terms': processed_terms,
             'term_analysis': term_analysis,
-            'query_vector_length': len(query_vector),
-            'non_zero_components': sum(1 for x in query_vector if x > 0)
+            'query_vector_length': query_vector.shape[1],
+            'non_zero_components': int((query_vector.data > 0).sum())
         }
 
+    def export_metrics(self) -> None:
+        """Обновляет метрики размера индекса и кэша перед выдачей /metrics"""
+        INDEX_SIZE.set(len(self.document_metadata), kind='documents')
+        INDEX_SIZE.set(self.vocabulary.get_vocabulary_size(), kind='terms')
+        QUERY_CACHE_ENTRIES.set(len(self.query_cache) if self.query_cache is not None else 0)
+
     def get_index_statistics(self) -> Dict:
         """Возвращает статистику индекса"""
         vocab_stats = self.vocabulary.get_statistics()
@@ -231,9 +970,35 @@ class IndexBuilder:
             **vocab_stats,
             'use_vector_db': self.use_vector_db,
             'vector_db_documents': self.vector_storage.get_document_count() if self.vector_storage else 0,
-            'tfidf_vectors_calculated': len(self.tfidf_vectors)
+            'tfidf_vectors_calculated': len(self.tfidf_vectors) or len(self.document_metadata),
+            'tfidf_matrix_documents': 0,
+            'tfidf_matrix_nnz': 0,
+            'idf_drift': self.idf_drift,
+            'idf_drift_threshold': self.idf_drift_threshold
         }
 
+        if self.tfidf_calculator and self.tfidf_calculator.has_matrix():
+            stats['tfidf_matrix_documents'] = self.tfidf_calculator.doc_matrix.shape[0]
+            stats['tfidf_matrix_nnz'] = int(self.tfidf_calculator.doc_matrix.nnz)
+
+        if self.query_cache is not None:
+            stats['index_version'] = self.index_version
+            stats['query_cache'] = self.query_cache.get_statistics()
+
+        if self.inverted_index is not None:
+            stats['inverted_index_terms'] = self.inverted_index.get_term_count()
+            stats['inverted_index_postings'] = self.inverted_index.get_postings_count()
+
+        neighbor_table = self.document_selector.get_neighbor_table() if self.document_selector else None
+        if neighbor_table is not None:
+            stats['neighbor_table'] = neighbor_table.get_statistics()
+
+        if self.dense_index is not None:
+            stats['dense_index'] = self.dense_index.get_statistics()
+
+        if len(self.feature_store):
+            stats['feature_store'] = self.feature_store.get_statistics()
+
         if self.vector_storage:
             stats.update(self.vector_storage.get_collection_info())
 
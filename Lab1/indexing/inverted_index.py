@@ -0,0 +1,202 @@
+# indexing/inverted_index.py
+from typing import List, Dict, Tuple
+from bisect import bisect_left
+import heapq
+import numpy as np
+from scipy import sparse
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс в памяти: для каждого термина хранится список
+    документов (posting list) с заранее вычисленными TF-IDF весами (impacts).
+
+    Поиск top-k выполняется алгоритмом MaxScore: термины с малой верхней
+    оценкой вклада становятся "неосновными" и проверяются только для
+    документов-кандидатов из основных списков, поэтому время запроса
+    зависит от числа просмотренных записей, а не от размера коллекции.
+    """
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self.postings_ptr = np.zeros(1, dtype=np.int64)
+        self.postings_rows = np.zeros(0, dtype=np.int32)
+        self.postings_impacts = np.zeros(0, dtype=np.float64)
+        self.max_impacts = np.zeros(0, dtype=np.float64)
+        self.min_impacts = np.zeros(0, dtype=np.float64)
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.last_query_stats: Dict = {}
+
+    def build(self, doc_matrix: sparse.csr_matrix, doc_ids) -> None:
+        """
+        Строит posting lists из TF-IDF матрицы документов (столбцы CSC-формы)
+        """
+        print("Построение инвертированного индекса...")
+
+        csc = sparse.csc_matrix(doc_matrix)
+        csc.sort_indices()
+
+        self.postings_ptr = csc.indptr.astype(np.int64)
+        self.postings_rows = csc.indices.astype(np.int32)
+        self.postings_impacts = csc.data.astype(np.float64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+
+        n_terms = csc.shape[1]
+        self.max_impacts = np.zeros(n_terms, dtype=np.float64)
+        self.min_impacts = np.zeros(n_terms, dtype=np.float64)
+        non_empty = np.flatnonzero(np.diff(self.postings_ptr) > 0)
+        if non_empty.size:
+            starts = self.postings_ptr[non_empty]
+            self.max_impacts[non_empty] = np.maximum.reduceat(self.postings_impacts, starts)
+            self.min_impacts[non_empty] = np.minimum.reduceat(self.postings_impacts, starts)
+
+        print(f"Инвертированный индекс построен: {n_terms} терминов, "
+              f"{len(self.postings_rows)} записей")
+
+    def get_term_count(self) -> int:
+        """Количество терминов в индексе"""
+        return len(self.postings_ptr) - 1
+
+    def get_postings_count(self) -> int:
+        """Общее количество записей во всех posting lists"""
+        return len(self.postings_rows)
+
+    def get_postings(self, term_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Возвращает строки документов и веса для термина"""
+        if not 0 <= term_idx < self.get_term_count():
+            return self.postings_rows[:0], self.postings_impacts[:0]
+        start, end = self.postings_ptr[term_idx], self.postings_ptr[term_idx + 1]
+        return self.postings_rows[start:end], self.postings_impacts[start:end]
+
+    def search(self, query_vector: sparse.csr_matrix, top_k: int = 10,
+               min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Поиск top_k документов по вектору запроса (MaxScore)
+        Возвращает пары (doc_id, score) по убыванию score
+        """
+        self.last_query_stats = {'query_terms': 0, 'postings_scanned': 0,
+                                 'postings_skipped': 0, 'documents_scored': 0}
+        if top_k <= 0:
+            return []
+
+        # Курсоры по posting lists: [верхняя оценка, вес в запросе, строки, веса, позиция]
+        cursors = []
+        for term_idx, weight in zip(query_vector.indices.tolist(), query_vector.data.tolist()):
+            if weight == 0 or term_idx >= self.get_term_count():
+                continue
+            rows, impacts = self.get_postings(term_idx)
+            if len(rows) == 0:
+                continue
+            # Знак веса запроса совпадает со знаком IDF, поэтому вклад неотрицателен
+            bound = max(weight * self.max_impacts[term_idx], weight * self.min_impacts[term_idx])
+            cursors.append([float(bound), weight, memoryview(rows), memoryview(impacts), 0])
+
+        if not cursors:
+            return []
+
+        cursors.sort(key=lambda cursor: cursor[0])
+        # cumulative_bounds[i] - максимальный суммарный вклад терминов 0..i
+        cumulative_bounds = np.cumsum([cursor[0] for cursor in cursors]).tolist()
+        total_postings = sum(len(cursor[2]) for cursor in cursors)
+
+        heap: List[Tuple[float, int]] = []  # (score, -row): в вершине худший результат
+        threshold = min_score
+        first_essential = 0
+        while first_essential < len(cursors) and cumulative_bounds[first_essential] < threshold:
+            first_essential += 1
+
+        scanned = 0
+        scored = 0
+        sentinel = len(self.doc_ids)
+
+        while first_essential < len(cursors):
+            # Следующий документ - минимальный среди основных списков
+            row = sentinel
+            for cursor in cursors[first_essential:]:
+                if cursor[4] < len(cursor[2]) and cursor[2][cursor[4]] < row:
+                    row = cursor[2][cursor[4]]
+            if row == sentinel:
+                break
+
+            score = 0.0
+            for cursor in cursors[first_essential:]:
+                position = cursor[4]
+                if position < len(cursor[2]) and cursor[2][position] == row:
+                    score += cursor[1] * cursor[3][position]
+                    cursor[4] = position + 1
+                    scanned += 1
+
+            # Неосновные списки проверяем от самого "тяжелого" и отсекаем по оценке
+            pruned = False
+            for i in range(first_essential - 1, -1, -1):
+                if score + cumulative_bounds[i] < threshold:
+                    pruned = True
+                    break
+                cursor = cursors[i]
+                position = bisect_left(cursor[2], row, cursor[4])
+                cursor[4] = position
+                if position < len(cursor[2]) and cursor[2][position] == row:
+                    score += cursor[1] * cursor[3][position]
+                    scanned += 1
+
+            if pruned or score < min_score:
+                continue
+
+            scored += 1
+            entry = (score, -row)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+
+            if len(heap) == top_k and heap[0][0] > threshold:
+                threshold = heap[0][0]
+                while first_essential < len(cursors) and cumulative_bounds[first_essential] < threshold:
+                    first_essential += 1
+
+        self.last_query_stats = {
+            'query_terms': len(cursors),
+            'postings_scanned': scanned,
+            'postings_skipped': total_postings - scanned,
+            'documents_scored': scored
+        }
+
+        ranked = sorted(heap, key=lambda entry: (-entry[0], -entry[1]))
+        return [(int(self.doc_ids[-neg_row]), float(score)) for score, neg_row in ranked]
+
+    def search_rows(self, query_vector: sparse.csr_matrix, rows, top_k: int = 10,
+                    min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Поиск top_k только среди заданных строк документов (кандидатов).
+        Строки кандидатов ищутся в posting list каждого термина запроса
+        бинарным поиском, поэтому стоимость растет с числом кандидатов,
+        а не с длиной posting lists
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int32))
+        self.last_query_stats = {'query_terms': 0, 'candidates': int(rows.size), 'documents_scored': 0}
+        if top_k <= 0 or rows.size == 0:
+            return []
+
+        scores = np.zeros(rows.size, dtype=np.float64)
+        query_terms = 0
+        for term_idx, weight in zip(query_vector.indices.tolist(), query_vector.data.tolist()):
+            if weight == 0 or term_idx >= self.get_term_count():
+                continue
+            term_rows, impacts = self.get_postings(term_idx)
+            if len(term_rows) == 0:
+                continue
+            query_terms += 1
+            positions = np.minimum(np.searchsorted(term_rows, rows), len(term_rows) - 1)
+            found = term_rows[positions] == rows
+            scores[found] += weight * impacts[positions[found]]
+
+        keep = np.flatnonzero(scores >= min_score) if min_score > 0 else np.flatnonzero(scores > 0)
+        self.last_query_stats.update(query_terms=query_terms, documents_scored=int(keep.size))
+        if keep.size > top_k:
+            keep = keep[np.argpartition(-scores[keep], top_k - 1)[:top_k]]
+
+        # Порядок как у search: по убыванию score, при равенстве - по строке
+        order = keep[np.lexsort((rows[keep], -scores[keep]))]
+        return [(int(self.doc_ids[rows[i]]), float(scores[i])) for i in order]
@@ -0,0 +1,82 @@
+# indexing/query_cache.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class QueryResultCache:
+    """
+    LRU-кэш результатов поиска с ограничением времени жизни записей.
+
+    Ключ собирает вызывающий код (IndexBuilder.search): нормализованные
+    термины запроса, top_k и версия индекса. Любое изменение индекса
+    повышает версию, поэтому старые записи становятся недостижимы;
+    invalidate дополнительно освобождает занятую ими память.
+    """
+
+    DEFAULT_MAX_SIZE = 1024
+    DEFAULT_TTL = 300.0  # секунд
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение по ключу или None (нет записи или она устарела)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые давние записи"""
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self) -> None:
+        """Удаляет все записи (счетчики попаданий сохраняются)"""
+        if self._entries:
+            self._entries.clear()
+        self.invalidations += 1
+
+    def get_statistics(self) -> Dict:
+        """Статистика попаданий"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
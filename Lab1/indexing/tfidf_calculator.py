@@ -1,100 +1,307 @@
 # indexing/tfidf_calculator.py
-from typing import List, Dict, Tuple
-import math
+from typing import List, Dict, Tuple, Iterable
 from collections import Counter
+import numpy as np
+from scipy import sparse
+from monitoring.metrics import track_stage
 
 
 class TFIDFCalculator:
     """
     Класс для расчета TF-IDF весов терминов в документах и запросах
+
+    Документы хранятся в виде разреженной CSR-матрицы "документ-термин"
+    (строки L2-нормализованы), запросы - в виде разреженных векторов-строк,
+    поэтому косинусная близость считается одним произведением матрицы на вектор.
+
+    Массив idf - это снимок IDF, которым взвешена матрица. При инкрементальных
+    изменениях он не пересчитывается (кроме новых терминов), а расхождение с
+    текущими IDF словаря возвращает idf_drift; reweight обновляет снимок.
     """
 
     def __init__(self, vocabulary):
         self.vocabulary = vocabulary
-
-    def calculate_tfidf_weights(self, documents: List) -> Dict[int, List[float]]:
+        self.idf = np.zeros(0, dtype=np.float64)
+        self.tf_matrix = None    # нормализованные частоты count / total_terms
+        self.doc_matrix = None   # L2-нормализованные TF-IDF веса
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self.doc_id_to_row: Dict[int, int] = {}
+        self._pending_rows: List[Tuple[sparse.csr_matrix, List[int]]] = []
+
+    def calculate_tfidf_weights(self, documents: List) -> Dict[int, sparse.csr_matrix]:
         """
         Вычисляет TF-IDF веса для всех документов
+        Возвращает словарь doc_id -> разреженная строка матрицы
         """
         print("Начинаем расчет TF-IDF весов...")
 
-        tfidf_vectors = {}
+        self.build_matrix(documents)
 
-        for doc in documents:
-            if hasattr(doc, 'processed_content') and doc.processed_content:
-                vector = self._document_to_tfidf_vector(doc)
-                tfidf_vectors[doc.doc_id] = vector
-                doc.tfidf_vector = vector
+        tfidf_vectors = {}
+        documents_by_id = {doc.doc_id: doc for doc in documents}
+        for row, doc_id in enumerate(self.doc_ids.tolist()):
+            vector = self.doc_matrix.getrow(row)
+            tfidf_vectors[doc_id] = vector
+            documents_by_id[doc_id].tfidf_vector = vector
 
         print(f"Расчет TF-IDF завершен. Обработано документов: {len(tfidf_vectors)}")
         return tfidf_vectors
 
-    def _document_to_tfidf_vector(self, document) -> List[float]:
+    def build_matrix(self, documents: List) -> sparse.csr_matrix:
         """
-        Преобразует документ в вектор TF-IDF
+        Строит CSR-матрицу частот терминов и матрицу TF-IDF весов
         """
-        if not hasattr(document, 'processed_content') or not document.processed_content:
-            return [0.0] * self.vocabulary.get_vocabulary_size()
+        self.tf_matrix, doc_ids = self._build_tf_rows(documents)
+        self._set_doc_ids(doc_ids)
+        self.reweight()
 
-        # Разбиваем на термины
-        terms = document.processed_content.split()
-        term_freq = Counter(terms)
+        return self.doc_matrix
 
-        vector = [0.0] * self.vocabulary.get_vocabulary_size()
-        total_terms = len(terms)
+    def append_tf_rows(self, documents: List) -> List[int]:
+        """
+        Накапливает строки частот пачки документов для потокового построения.
+        Словарь должен уже учитывать эти документы; IDF и веса считаются
+        один раз в finish_tf_rows, когда известна вся коллекция
+        """
+        tf_rows, doc_ids = self._build_tf_rows(documents)
+        if doc_ids:
+            self._pending_rows.append((tf_rows, doc_ids))
+        return doc_ids
+
+    def finish_tf_rows(self) -> sparse.csr_matrix:
+        """
+        Собирает накопленные пачки в матрицу частот и взвешивает ее
+        """
+        width = self.vocabulary.get_vocabulary_size()
+        chunks = [self._resized(rows, width) for rows, _ in self._pending_rows]
+        doc_ids = [doc_id for _, ids in self._pending_rows for doc_id in ids]
+        self._pending_rows = []
+
+        if chunks:
+            self.tf_matrix = sparse.vstack(chunks, format='csr')
+        else:
+            self.tf_matrix = sparse.csr_matrix((0, width), dtype=np.float64)
+        self._set_doc_ids(doc_ids)
+        self.reweight()
+
+        return self.doc_matrix
+
+    def add_documents(self, documents: List) -> List[int]:
+        """
+        Дописывает строки новых документов в конец матрицы.
+        Словарь должен уже учитывать эти документы (Vocabulary.add_document)
+        Возвращает doc_id добавленных строк
+        """
+        new_tf, new_ids = self._build_tf_rows(documents)
+        if not new_ids:
+            return []
+
+        if self.tf_matrix is None:
+            self.tf_matrix = new_tf
+            self._set_doc_ids(new_ids)
+            self.reweight()
+            return new_ids
+
+        # Старые веса не трогаем, новые термины получают текущий IDF
+        self.idf = self._extend_idf()
+        width = new_tf.shape[1]
+        new_weighted = self._normalize_rows(sparse.csr_matrix(new_tf @ sparse.diags(self.idf)))
+
+        self.tf_matrix = sparse.vstack([self._resized(self.tf_matrix, width), new_tf], format='csr')
+        self.doc_matrix = sparse.vstack([self._resized(self.doc_matrix, width), new_weighted], format='csr')
+        self._set_doc_ids(np.concatenate([self.doc_ids, np.asarray(new_ids, dtype=np.int64)]))
+        return new_ids
+
+    def remove_documents(self, doc_ids) -> List[int]:
+        """
+        Удаляет строки документов из матрицы
+        Возвращает doc_id фактически удаленных строк
+        """
+        rows = [self.doc_id_to_row[doc_id] for doc_id in doc_ids if doc_id in self.doc_id_to_row]
+        if not rows:
+            return []
+
+        keep = np.ones(len(self.doc_ids), dtype=bool)
+        keep[rows] = False
+        self.tf_matrix = self.tf_matrix[keep]
+        self.doc_matrix = self.doc_matrix[keep]
+        removed = self.doc_ids[~keep].tolist()
+        self._set_doc_ids(self.doc_ids[keep])
+        return removed
+
+    def get_document_term_indices(self, doc_id: int) -> List[int]:
+        """Индексы терминов, входящих в документ"""
+        row = self.doc_id_to_row.get(doc_id)
+        if row is None:
+            return []
+        start, end = self.tf_matrix.indptr[row], self.tf_matrix.indptr[row + 1]
+        return self.tf_matrix.indices[start:end].tolist()
+
+    def idf_drift(self) -> float:
+        """
+        Относительное расхождение снимка IDF матрицы с текущими IDF словаря:
+        sum|idf_current - idf_snapshot| / sum|idf_snapshot|
+        """
+        current = self.compute_idf()
+        snapshot = np.zeros_like(current)
+        size = min(len(current), len(self.idf))
+        snapshot[:size] = self.idf[:size]
+
+        scale = float(np.abs(snapshot).sum())
+        if scale == 0:
+            return 0.0 if not np.any(current) else float('inf')
+        return float(np.abs(current - snapshot).sum() / scale)
 
+    def _extend_idf(self) -> np.ndarray:
+        """
+        Снимок IDF, дополненный текущими значениями для терминов,
+        которых не было (или у которых был нулевой df) при взвешивании
+        """
+        current = self.compute_idf()
+        extended = current.copy()
+        size = min(len(current), len(self.idf))
+        snapshot = self.idf[:size]
+        extended[:size] = np.where(snapshot != 0, snapshot, current[:size])
+        return extended
+
+    def _build_tf_rows(self, documents: List) -> Tuple[sparse.csr_matrix, List[int]]:
+        """Строит CSR-строки нормализованных частот для документов"""
+        indptr = [0]
+        indices = []
+        data = []
+        doc_ids = []
+
+        for doc in documents:
+            if not hasattr(doc, 'processed_content') or not doc.processed_content:
+                continue
+
+            term_indices, term_weights = self._document_tf_entries(doc.processed_content)
+            indices.extend(term_indices)
+            data.extend(term_weights)
+            indptr.append(len(indices))
+            doc_ids.append(doc.doc_id)
+
+        tf_rows = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64),
+             np.asarray(indices, dtype=np.int32),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(len(doc_ids), self.vocabulary.get_vocabulary_size())
+        )
+        tf_rows.sort_indices()
+        return tf_rows, doc_ids
+
+    @staticmethod
+    def _resized(matrix: sparse.csr_matrix, width: int) -> sparse.csr_matrix:
+        """Расширяет матрицу до новой ширины словаря"""
+        if matrix.shape[1] == width:
+            return matrix
+        matrix = sparse.csr_matrix(matrix)
+        matrix.resize((matrix.shape[0], width))
+        return matrix
+
+    def load_matrix(self, tf_matrix: sparse.csr_matrix, doc_ids) -> None:
+        """
+        Восстанавливает движок из сохраненной матрицы частот
+        """
+        self.tf_matrix = sparse.csr_matrix(tf_matrix)
+        self._set_doc_ids(doc_ids)
+        self.reweight()
+
+    def reweight(self) -> None:
+        """
+        Пересчитывает IDF по текущему словарю и TF-IDF матрицу документов
+        """
+        self.idf = self.compute_idf()
+
+        if self.tf_matrix is None:
+            return
+
+        weighted = self.tf_matrix @ sparse.diags(self.idf[:self.tf_matrix.shape[1]])
+        self.doc_matrix = self._normalize_rows(sparse.csr_matrix(weighted))
+
+    def compute_idf(self) -> np.ndarray:
+        """
+        Вычисляет массив IDF для всех терминов словаря
+        IDF(t) = log(N / (df(t) + 1)), для df(t) = 0 вес равен нулю
+        """
+        df = self.vocabulary.get_document_frequency_array()
+
+        idf = np.zeros(len(df), dtype=np.float64)
+        N = self.vocabulary.total_documents
+        present = df > 0
+        if N > 0:
+            idf[present] = np.log(N / (df[present] + 1))
+        return idf
+
+    def has_matrix(self) -> bool:
+        """Проверяет, построена ли матрица документов"""
+        return self.doc_matrix is not None
+
+    def _set_doc_ids(self, doc_ids) -> None:
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        self.doc_id_to_row = {doc_id: row for row, doc_id in enumerate(self.doc_ids.tolist())}
+
+    def _document_tf_entries(self, processed_content: str) -> Tuple[List[int], List[float]]:
+        """
+        Возвращает индексы терминов документа и их нормализованные частоты
+        """
+        terms = processed_content.split()
+        total_terms = len(terms)
         if total_terms == 0:
-            return vector
+            return [], []
 
-        # Вычисляем TF-IDF для каждого термина в документе
-        for term, count in term_freq.items():
+        entries = []
+        for term, count in Counter(terms).items():
             term_idx = self.vocabulary.get_term_index(term)
             if term_idx != -1:
-                # TF (Term Frequency) - нормализованная частота
-                tf = count / total_terms
-                # IDF (Inverse Document Frequency)
-                idf = self._calculate_idf(term)
-                vector[term_idx] = tf * idf
+                entries.append((term_idx, count / total_terms))
 
-        # Нормализуем вектор (евклидова норма)
-        norm = self._calculate_euclidean_norm(vector)
-        if norm > 0:
-            vector = [v / norm for v in vector]
+        entries.sort()
+        return [idx for idx, _ in entries], [tf for _, tf in entries]
 
-        return vector
+    @staticmethod
+    def _normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Нормализует строки матрицы по евклидовой норме"""
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        inverse = np.zeros_like(norms)
+        np.divide(1.0, norms, out=inverse, where=norms > 0)
+        return sparse.csr_matrix(sparse.diags(inverse) @ matrix)
 
-    def process_query(self, query_text: str, preprocessor) -> Tuple[List[str], List[float]]:
+    def process_query(self, query_text: str, preprocessor) -> Tuple[List[str], sparse.csr_matrix]:
         """
         Полная предобработка запроса
         """
         print(f"Предобработка запроса: '{query_text}'")
 
         # 1. Предобработка текста запроса
-        processed_terms = preprocessor.preprocess_text(query_text, return_string=False)
+        with track_stage('query_preprocessing'):
+            processed_terms = preprocessor.preprocess_text(query_text, return_string=False)
         print(f"Термины после предобработки: {processed_terms}")
 
         # 2. Векторизация запроса
-        query_vector = self.query_to_tfidf_vector(processed_terms)
+        with track_stage('query_vectorization'):
+            query_vector = self.query_to_tfidf_vector(processed_terms)
 
         # Отладочная информация
-        non_zero_terms = []
-        for i, weight in enumerate(query_vector):
-            if weight > 0:
-                term = self.vocabulary.get_term_by_index(i)
-                non_zero_terms.append((term, weight))
+        non_zero_terms = [
+            (self.vocabulary.get_term_by_index(int(i)), float(weight))
+            for i, weight in zip(query_vector.indices, query_vector.data)
+            if weight > 0
+        ]
 
         print(f"Ненулевые термины в векторе запроса: {non_zero_terms}")
 
         return processed_terms, query_vector
 
-    def query_to_tfidf_vector(self, query_terms: List[str]) -> List[float]:
+    def query_to_tfidf_vector(self, query_terms: List[str]) -> sparse.csr_matrix:
         """
-        Преобразует предобработанные термины запроса в вектор TF-IDF
+        Преобразует предобработанные термины запроса в разреженный вектор TF-IDF
+        (матрица 1 x размер словаря)
         """
-        vector = [0.0] * self.vocabulary.get_vocabulary_size()
+        size = self.vocabulary.get_vocabulary_size()
 
         if not query_terms:
-            return vector
+            return sparse.csr_matrix((1, size), dtype=np.float64)
 
         # Подсчитываем TF в запросе
         term_freq = Counter(query_terms)
@@ -102,6 +309,7 @@ class TFIDFCalculator:
 
         print(f"Векторизация {len(query_terms)} терминов запроса:")
 
+        entries = {}
         for term, count in term_freq.items():
             term_idx = self.vocabulary.get_term_index(term)
             if term_idx != -1:
@@ -110,41 +318,180 @@ class TFIDFCalculator:
                 # IDF из словаря документов
                 idf = self._calculate_idf(term)
                 weight = tf * idf
-                vector[term_idx] = weight
+                entries[term_idx] = weight
 
                 print(f"   '{term}': TF={tf:.3f}, IDF={idf:.3f}, вес={weight:.4f}")
             else:
                 print(f"    '{term}': НЕТ В СЛОВАРЕ")
 
+        indices = np.array(sorted(entries), dtype=np.int32)
+        data = np.array([entries[i] for i in indices.tolist()], dtype=np.float64)
+
         # Нормализуем вектор запроса
-        norm = self._calculate_euclidean_norm(vector)
+        norm = float(np.sqrt(np.dot(data, data)))
         print(f"Норма вектора до нормализации: {norm:.4f}")
 
         if norm > 0:
-            vector = [v / norm for v in vector]
+            data = data / norm
             print(f"Вектор запроса нормализован")
         else:
             print(f"Вектор запроса нулевой - нет совпадающих терминов")
 
-        return vector
+        return sparse.csr_matrix(
+            (data, indices, np.array([0, len(indices)], dtype=np.int64)),
+            shape=(1, size)
+        )
+
+    def queries_to_tfidf_matrix(self, query_term_lists: List[List[str]]) -> sparse.csr_matrix:
+        """
+        Векторизует пачку запросов в одну CSR-матрицу (запросы x размер словаря)
+        с теми же весами, что и query_to_tfidf_vector, но без отладочного вывода
+        """
+        size = self.vocabulary.get_vocabulary_size()
+        data, indices, indptr = [], [], [0]
+
+        for query_terms in query_term_lists:
+            term_freq = Counter(query_terms)
+            total_terms = len(query_terms)
+            row = {}
+            for term, count in term_freq.items():
+                term_idx = self.vocabulary.get_term_index(term)
+                if term_idx != -1:
+                    row[term_idx] = count / total_terms * self._calculate_idf(term)
+            for term_idx in sorted(row):
+                indices.append(term_idx)
+                data.append(row[term_idx])
+            indptr.append(len(indices))
+
+        matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(query_term_lists), size)
+        )
+        return self._normalize_rows(matrix)
+
+    def top_documents_many(self, query_matrix: sparse.csr_matrix, top_k: int = 10,
+                           min_score: float = 0.0) -> List[List[Tuple[int, float]]]:
+        """
+        top_k пар (doc_id, score) для каждой строки матрицы запросов.
+        Близости всех запросов считаются одним произведением разреженных
+        матриц; результат тоже разреженный, так что память пропорциональна
+        числу совпавших пар запрос-документ, а не запросы x документы
+        """
+        if self.doc_matrix is None:
+            raise ValueError("Матрица документов не построена")
+
+        if top_k <= 0 or query_matrix.shape[0] == 0:
+            return [[] for _ in range(query_matrix.shape[0])]
+
+        query_matrix = self._fit_query_vector(query_matrix)
+        scores = sparse.csr_matrix(query_matrix @ self.doc_matrix.T)
+
+        ranked = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            row_scores = scores.data[start:end]
+            row_docs = scores.indices[start:end]
+
+            keep = row_scores >= min_score if min_score > 0 else row_scores > 0
+            row_scores, row_docs = row_scores[keep], row_docs[keep]
+
+            if row_scores.size > top_k:
+                partition = np.argpartition(-row_scores, top_k - 1)[:top_k]
+                row_scores, row_docs = row_scores[partition], row_docs[partition]
+
+            order = np.lexsort((row_docs, -row_scores))
+            ranked.append([(int(self.doc_ids[row_docs[i]]), float(row_scores[i])) for i in order])
+
+        return ranked
+
+    def score_documents(self, query_vector: sparse.csr_matrix) -> np.ndarray:
+        """
+        Косинусная близость запроса ко всем документам
+        (одно произведение разреженной матрицы на разреженный вектор)
+        """
+        if self.doc_matrix is None:
+            raise ValueError("Матрица документов не построена")
+
+        query_vector = self._fit_query_vector(query_vector)
+        return (self.doc_matrix @ query_vector.T).toarray().ravel()
+
+    def top_documents(self, query_vector: sparse.csr_matrix, top_k: int = 10,
+                      min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Возвращает top_k пар (doc_id, score) по убыванию близости
+        """
+        if top_k <= 0 or query_vector.nnz == 0:
+            return []
+
+        scores = self.score_documents(query_vector)
+        candidates = np.flatnonzero(scores >= min_score) if min_score > 0 else np.flatnonzero(scores > 0)
+        if candidates.size == 0:
+            return []
+
+        if candidates.size > top_k:
+            partition = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[partition]
+
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(self.doc_ids[row]), float(scores[row])) for row in order]
+
+    def top_documents_among(self, query_vector: sparse.csr_matrix, doc_ids: Iterable[int], top_k: int = 10,
+                            min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        top_k пар (doc_id, score) только среди заданных документов.
+        Считаются близости лишь строк кандидатов, поэтому стоимость
+        пропорциональна числу кандидатов, а не размеру коллекции
+        """
+        if self.doc_matrix is None:
+            raise ValueError("Матрица документов не построена")
+
+        if top_k <= 0 or query_vector.nnz == 0:
+            return []
+
+        rows = np.array(sorted({self.doc_id_to_row[doc_id] for doc_id in doc_ids if doc_id in self.doc_id_to_row}),
+                        dtype=np.int64)
+        if rows.size == 0:
+            return []
+
+        query_vector = self._fit_query_vector(query_vector)
+        scores = (self.doc_matrix[rows] @ query_vector.T).toarray().ravel()
+        keep = np.flatnonzero(scores >= min_score) if min_score > 0 else np.flatnonzero(scores > 0)
+        if keep.size > top_k:
+            keep = keep[np.argpartition(-scores[keep], top_k - 1)[:top_k]]
+
+        order = keep[np.argsort(-scores[keep], kind='stable')]
+        return [(int(self.doc_ids[rows[i]]), float(scores[i])) for i in order]
+
+    def _fit_query_vector(self, query_vector: sparse.csr_matrix) -> sparse.csr_matrix:
+        """
+        Приводит вектор запроса к ширине матрицы документов
+        (словарь мог вырасти после построения матрицы)
+        """
+        width = self.doc_matrix.shape[1]
+        if query_vector.shape[1] == width:
+            return query_vector
+        query_vector = sparse.csr_matrix(query_vector)
+        if query_vector.shape[1] > width:
+            return query_vector[:, :width]
+        query_vector.resize((query_vector.shape[0], width))
+        return query_vector
 
     def _calculate_idf(self, term: str) -> float:
         """
         Вычисляет обратную частоту документа (IDF)
         IDF(t) = log(N / (df(t) + 1))
         """
+        term_idx = self.vocabulary.get_term_index(term)
+        if 0 <= term_idx < len(self.idf):
+            return float(self.idf[term_idx])
+
         df = self.vocabulary.get_document_frequency(term)
         N = self.vocabulary.total_documents
 
         if df == 0:
             return 0.0
 
-        idf = math.log(N / (df + 1))
-        return idf
-
-    def _calculate_euclidean_norm(self, vector: List[float]) -> float:
-        """Вычисляет евклидову норму вектора"""
-        return sum(x ** 2 for x in vector) ** 0.5
+        return float(np.log(N / (df + 1)))
 
     def debug_query_processing(self, query_text: str, preprocessor):
         """
@@ -175,7 +522,7 @@ class TFIDFCalculator:
         # Векторизация
         query_vector = self.query_to_tfidf_vector(processed_terms)
 
-        print(f"\nИтоговый вектор: {len(query_vector)} размерность")
-        print(f"Ненулевых компонент: {sum(1 for x in query_vector if x > 0)}")
+        print(f"\nИтоговый вектор: {query_vector.shape[1]} размерность")
+        print(f"Ненулевых компонент: {int((query_vector.data > 0).sum())}")
 
-        return processed_terms, query_vector
\ No newline at end of file
+        return processed_terms, query_vector
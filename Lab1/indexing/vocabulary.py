@@ -1,12 +1,17 @@
 # indexing/vocabulary.py
-from typing import List, Dict, Set
+from typing import List, Dict, Set, Iterable
 import json
 from collections import Counter
+import numpy as np
 
 
 class Vocabulary:
     """
     Класс для построения и управления словарем терминов
+
+    Индексы терминов стабильны: новые термины получают следующий свободный
+    индекс, а термины удаленных документов остаются в словаре с df = 0,
+    поэтому ранее сохраненные векторы документов остаются корректными.
     """
 
     def __init__(self):
@@ -21,39 +26,79 @@ class Vocabulary:
         Построение словаря из коллекции документов
         """
         print("Начинаем построение словаря...")
+        self.clear()
 
-        # Собираем все уникальные термины из всех документов
-        all_terms: Set[str] = set()
-        doc_term_sets: List[Set[str]] = []
+        # Document frequency считается за один проход по документам
+        document_frequency: Counter = Counter()
 
         for doc in documents:
-            if hasattr(doc, 'processed_content') and doc.processed_content:
-                # Разбиваем обработанный контент на термины
-                terms = set(doc.processed_content.split())
-                all_terms.update(terms)
-                doc_term_sets.append(terms)
+            document_frequency.update(self._document_terms(doc))
 
         self.total_documents = len(documents)
 
         # Сортируем термины для воспроизводимости
-        sorted_terms = sorted(list(all_terms))
-
-        # Строим отображения
-        for term in sorted_terms:
-            self.term_to_index[term] = self.next_index
-            self.index_to_term[self.next_index] = term
-            self.next_index += 1
-
-        # Вычисляем document frequency для каждого термина
-        self._calculate_document_frequency(doc_term_sets)
+        for term in sorted(document_frequency):
+            self._add_term(term)
+            self.term_document_frequency[term] = document_frequency[term]
 
         print(f"Словарь построен. Уникальных терминов: {len(self.term_to_index)}")
 
-    def _calculate_document_frequency(self, doc_term_sets: List[Set[str]]) -> None:
-        """Вычисляет частоту документов для каждого термина"""
-        for term in self.term_to_index.keys():
-            count = sum(1 for doc_terms in doc_term_sets if term in doc_terms)
-            self.term_document_frequency[term] = count
+    def add_document(self, document) -> List[str]:
+        """
+        Добавляет документ без перестроения словаря
+        Возвращает список новых терминов (они получают индексы в конце словаря)
+        """
+        return self.add_document_terms(self._document_terms(document))
+
+    def remove_document(self, document) -> None:
+        """
+        Удаляет документ из статистики словаря (индексы терминов не меняются)
+        """
+        self.remove_document_terms(self._document_terms(document))
+
+    def add_document_terms(self, terms: Iterable[str]) -> List[str]:
+        """Учитывает документ с заданным множеством терминов"""
+        new_terms = []
+        for term in sorted(set(terms)):
+            if term not in self.term_to_index:
+                self._add_term(term)
+                new_terms.append(term)
+            self.term_document_frequency[term] = self.term_document_frequency.get(term, 0) + 1
+
+        self.total_documents += 1
+        return new_terms
+
+    def remove_document_terms(self, terms: Iterable[str]) -> None:
+        """Исключает документ с заданным множеством терминов"""
+        for term in set(terms):
+            if self.term_document_frequency.get(term, 0) > 0:
+                self.term_document_frequency[term] -= 1
+
+        self.total_documents = max(self.total_documents - 1, 0)
+
+    def clear(self) -> None:
+        """Очищает словарь"""
+        self.term_to_index = {}
+        self.index_to_term = {}
+        self.term_document_frequency = {}
+        self.total_documents = 0
+        self.next_index = 0
+
+    def _add_term(self, term: str) -> int:
+        """Назначает термину следующий свободный индекс"""
+        index = self.next_index
+        self.term_to_index[term] = index
+        self.index_to_term[index] = term
+        self.term_document_frequency.setdefault(term, 0)
+        self.next_index += 1
+        return index
+
+    @staticmethod
+    def _document_terms(document) -> Set[str]:
+        """Множество терминов обработанного документа"""
+        if hasattr(document, 'processed_content') and document.processed_content:
+            return set(document.processed_content.split())
+        return set()
 
     def get_term_index(self, term: str) -> int:
         """Возвращает индекс термина в словаре"""
@@ -67,10 +112,21 @@ class Vocabulary:
         """Возвращает частоту документов для термина"""
         return self.term_document_frequency.get(term, 0)
 
+    def get_document_frequency_array(self) -> np.ndarray:
+        """Возвращает массив df, упорядоченный по индексам терминов"""
+        df = np.zeros(self.get_vocabulary_size(), dtype=np.float64)
+        for term, index in self.term_to_index.items():
+            df[index] = self.term_document_frequency.get(term, 0)
+        return df
+
     def get_vocabulary_size(self) -> int:
         """Возвращает размер словаря"""
         return len(self.term_to_index)
 
+    def get_active_term_count(self) -> int:
+        """Возвращает количество терминов, встречающихся хотя бы в одном документе"""
+        return sum(1 for freq in self.term_document_frequency.values() if freq > 0)
+
     def get_most_frequent_terms(self, top_n: int = 20) -> List[tuple]:
         """Возвращает самые частые термины"""
         sorted_terms = sorted(
@@ -83,7 +139,7 @@ class Vocabulary:
     def get_rare_terms(self, threshold: int = 2) -> List[tuple]:
         """Возвращает редкие термины (встречаются <= threshold документов)"""
         return [(term, freq) for term, freq in self.term_document_frequency.items()
-                if freq <= threshold]
+                if 0 < freq <= threshold]
 
     def save_vocabulary(self, filepath: str) -> None:
         """Сохраняет словарь в файл"""
@@ -113,6 +169,7 @@ class Vocabulary:
         """Возвращает статистику словаря"""
         return {
             'vocabulary_size': self.get_vocabulary_size(),
+            'active_terms': self.get_active_term_count(),
             'total_documents': self.total_documents,
             'average_terms_per_document': self.get_vocabulary_size() / self.total_documents if self.total_documents > 0 else 0,
             'most_frequent_terms': self.get_most_frequent_terms(10),
@@ -1,18 +1,25 @@
 import argparse
 from documents_processing.collector import DocumentCollector
+from documents_processing.language_filter import LanguageCache
+from documents_processing.fingerprint import FileFingerprint
 from text_preprocessing.preprocessor_factory import PreprocessorFactory
 from text_preprocessing.batching import BatchTextPreprocessor
+from text_preprocessing.corpus_cache import ProcessedCorpusCache
+from text_preprocessing.lemma_cache import LemmaCache
 from indexing.index_builder import IndexBuilder
 from web_interface.app import SearchApp
 
 
-def build_search_index(docs_directory: str = "docs"):
+def build_search_index(docs_directory: str = "docs", workers: int = 1, stream: bool = False):
     """Построение поискового индекса"""
+    if stream:
+        return build_search_index_streaming(docs_directory, workers)
+
     print("=== ПОСТРОЕНИЕ ПОИСКОВОГО ИНДЕКСА ===")
 
     # 1. Сбор документов
     print("\n1. СБОР ДОКУМЕНТОВ")
-    collector = DocumentCollector()
+    collector = DocumentCollector(workers=workers, use_processes=workers > 1, language_cache=LanguageCache())
     documents = collector.collect_documents(docs_directory)
 
     if not documents:
@@ -21,10 +28,14 @@ def build_search_index(docs_directory: str = "docs"):
 
     # 2. Предобработка текстов
     print("\n2. ПРЕДОБРАБОТКА ТЕКСТОВ")
-    preprocessor = PreprocessorFactory.create_lemmatization_preprocessor()
-    batch_processor = BatchTextPreprocessor(preprocessor)
-    batch_processor.preprocess_collection(documents)
+    preprocessor = PreprocessorFactory.create_lemmatization_preprocessor(lemma_cache_path=LemmaCache.DEFAULT_PATH)
+    cache = ProcessedCorpusCache(signature=preprocessor.get_signature())
+    cache.retain(doc.file_path for doc in documents)
+    batch_processor = BatchTextPreprocessor(preprocessor, workers=workers)
+    batch_processor.preprocess_collection(documents, cache=cache)
     batch_processor.print_statistics()
+    preprocessor.lemma_cache.save()
+    print(f"Кэш лемм: {preprocessor.lemma_cache.get_statistics()}")
 
     # 3. Построение индекса с векторной БД
     print("\n3. ПОСТРОЕНИЕ ИНДЕКСА")
@@ -42,6 +53,112 @@ def build_search_index(docs_directory: str = "docs"):
     return index_builder
 
 
+def build_search_index_streaming(docs_directory: str = "docs", workers: int = 1, batch_size: int = 256):
+    """
+    Потоковое построение индекса: сбор, предобработка и индексация идут
+    конвейером, в памяти одновременно находится одна пачка документов
+    """
+    print("=== ПОТОКОВОЕ ПОСТРОЕНИЕ ПОИСКОВОГО ИНДЕКСА ===")
+
+    collector = DocumentCollector(workers=workers, use_processes=workers > 1, language_cache=LanguageCache())
+    preprocessor = PreprocessorFactory.create_lemmatization_preprocessor(lemma_cache_path=LemmaCache.DEFAULT_PATH)
+    cache = ProcessedCorpusCache(signature=preprocessor.get_signature())
+    batch_processor = BatchTextPreprocessor(preprocessor, workers=workers)
+
+    # 1-3. Сбор документов -> предобработка -> индекс
+    documents = collector.iter_documents(docs_directory)
+    batches = batch_processor.preprocess_stream(documents, batch_size=batch_size, cache=cache)
+    index_builder = IndexBuilder(use_vector_db=True, use_semantic_search=True)
+    index_builder.build_index_from_stream(batches)
+
+    if not index_builder.document_metadata:
+        print("Не найдено документов для обработки!")
+        return None
+
+    cache.retain(meta['file_path'] for meta in index_builder.document_metadata.values())
+    cache.save()
+    batch_processor.print_statistics()
+    preprocessor.lemma_cache.save()
+
+    # 4. Сохранение индекса
+    print("\n4. СОХРАНЕНИЕ ИНДЕКСА")
+    index_builder.save_index("search_index")
+
+    # 5. Статистика
+    print("\n5. СТАТИСТИКА")
+    index_builder.print_detailed_statistics()
+
+    return index_builder
+
+
+def update_search_index(docs_directory: str = "docs", index_path: str = "search_index", workers: int = 1):
+    """Инкрементальное обновление индекса: только новые, измененные и удаленные файлы"""
+    print("=== ОБНОВЛЕНИЕ ПОИСКОВОГО ИНДЕКСА ===")
+
+    # С селектором: таблица соседей и векторы документов обновляются вместе со словарем
+    index_builder = IndexBuilder(use_vector_db=True)
+    index_builder.load_index(index_path)
+
+    # 1. Сравнение папки с проиндексированными файлами: сначала только os.stat
+    # (размер и время изменения), читаются лишь новые и измененные файлы
+    print("\n1. ПОИСК ИЗМЕНЕНИЙ")
+    collector = DocumentCollector(workers=workers, use_processes=workers > 1, language_cache=LanguageCache())
+
+    indexed = {meta['file_path']: meta for meta in index_builder.document_metadata.values()}
+    seen_paths = set()
+    changed_paths = []
+
+    for file_path in collector.iter_file_paths(docs_directory):
+        try:
+            signature = FileFingerprint.stat_signature(file_path)
+        except OSError as e:
+            print(f"Ошибка доступа к {file_path}: {e}")
+            continue
+        seen_paths.add(file_path)
+        meta = indexed.get(file_path)
+        if (meta is None
+                or meta.get('file_size') != signature['size']
+                or meta.get('mtime_ns') != signature['mtime_ns']):
+            changed_paths.append(file_path)
+
+    next_id = max(index_builder.document_metadata, default=0) + 1
+    changed_documents = []
+    for doc in collector.iter_path_documents(changed_paths):
+        meta = indexed.get(doc.file_path)
+        if meta is None:
+            doc.doc_id = next_id
+            next_id += 1
+        else:
+            doc.doc_id = meta['doc_id']
+        changed_documents.append(doc)
+
+    # Удалены из папки или после изменения больше не проходят фильтры (пустые, не на английском)
+    skipped_paths = set(changed_paths) - {doc.file_path for doc in changed_documents}
+    removed_ids = [meta['doc_id'] for path, meta in indexed.items()
+                   if path not in seen_paths or path in skipped_paths]
+    print(f"Проверено файлов: {len(seen_paths)}, новых и измененных: {len(changed_documents)}, "
+          f"удаленных: {len(removed_ids)}")
+
+    # 2. Предобработка только измененных документов
+    if changed_documents:
+        print("\n2. ПРЕДОБРАБОТКА ИЗМЕНЕНИЙ")
+        preprocessor = PreprocessorFactory.create_lemmatization_preprocessor(lemma_cache_path=LemmaCache.DEFAULT_PATH)
+        cache = ProcessedCorpusCache(signature=preprocessor.get_signature())
+        cache.retain(seen_paths)
+        batch_processor = BatchTextPreprocessor(preprocessor, workers=workers)
+        batch_processor.preprocess_collection(changed_documents, cache=cache)
+        preprocessor.lemma_cache.save()
+
+    # 3. Обновление индекса
+    print("\n3. ОБНОВЛЕНИЕ ИНДЕКСА")
+    index_builder.add_documents(changed_documents)
+    index_builder.remove_documents(removed_ids)
+    index_builder.refresh_neighbor_table()
+    index_builder.save_index(index_path)
+
+    return index_builder
+
+
 def run_web_interface(host='127.0.0.1', port=5000, debug=True):
     """Запуск веб-интерфейса"""
     print("=== ЗАПУСК ВЕБ-ИНТЕРФЕЙСА ===")
@@ -55,6 +172,10 @@ def main():
     parser = argparse.ArgumentParser(description='Информационно-поисковая система')
     parser.add_argument('--build-index', action='store_true',
                         help='Построить поисковый индекс')
+    parser.add_argument('--update-index', action='store_true',
+                        help='Обновить индекс по изменениям в папке документов')
+    parser.add_argument('--stream', action='store_true',
+                        help='Строить индекс потоково, не загружая всю коллекцию в память')
     parser.add_argument('--web', action='store_true',
                         help='Запустить веб-интерфейс')
     parser.add_argument('--host', default='127.0.0.1',
@@ -63,6 +184,8 @@ def main():
                         help='Порт для веб-интерфейса (по умолчанию: 5000)')
     parser.add_argument('--docs', default='docs',
                         help='Папка с документами (по умолчанию: docs)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Количество процессов чтения и предобработки (по умолчанию: 1)')
 
     args = parser.parse_args()
 
@@ -72,13 +195,16 @@ def main():
     print()
 
     # Если не указаны аргументы, показываем справку
-    if not any([args.build_index, args.web]):
+    if not any([args.build_index, args.update_index, args.web]):
         parser.print_help()
         return
 
     # Построение индекса
     if args.build_index:
-        build_search_index(args.docs)
+        build_search_index(args.docs, workers=args.workers, stream=args.stream)
+        print("\n" + "=" * 50)
+    elif args.update_index:
+        update_search_index(args.docs, workers=args.workers)
         print("\n" + "=" * 50)
 
     # Запуск веб-интерфейса
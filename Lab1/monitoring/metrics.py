@@ -0,0 +1,221 @@
+# monitoring/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+
+class _Metric:
+    """Базовый класс метрики с метками (значения хранятся по кортежу меток)"""
+
+    metric_type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получено {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.extend(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> List[str]:
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}"]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """Значение, которое может как расти, так и уменьшаться"""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин (как в клиенте Prometheus)"""
+
+    metric_type = 'histogram'
+
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def get_count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state['count'] if state else 0
+
+    def _render_value(self, key, state) -> List[str]:
+        lines = []
+        for bound, count in zip(self.buckets, state['counts']):
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': _format_number(bound)})} {count}")
+        lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {state['count']}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(state['sum'])}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Реестр метрик приложения с выводом в текстовом формате Prometheus"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: _Metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Повторная регистрация (например, при перезагрузке модуля) возвращает ту же метрику
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+SEARCH_STAGE_SECONDS = REGISTRY.histogram(
+    'search_stage_duration_seconds',
+    'Длительность этапов поискового конвейера',
+    ['stage']
+)
+SEARCH_STAGE_ITEMS = REGISTRY.histogram(
+    'search_stage_items',
+    'Количество документов-кандидатов (или результатов) на выходе этапа',
+    ['stage'],
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+)
+SEARCH_STAGE_ERRORS = REGISTRY.counter(
+    'search_stage_errors_total',
+    'Количество ошибок на этапах поискового конвейера',
+    ['stage']
+)
+QUERY_CACHE_REQUESTS = REGISTRY.counter(
+    'query_cache_requests_total',
+    'Обращения к кэшу результатов поиска',
+    ['result']
+)
+
+INDEX_SIZE = REGISTRY.gauge(
+    'search_index_size',
+    'Размер поискового индекса: документы и термины словаря',
+    ['kind']
+)
+QUERY_CACHE_ENTRIES = REGISTRY.gauge(
+    'query_cache_entries',
+    'Количество результатов в кэше поиска'
+)
+
+
+@contextmanager
+def track_stage(stage: str, count_errors: bool = True):
+    """
+    Замеряет длительность этапа; исключение учитывается в счетчике ошибок
+    (если его не учитывает сам вызывающий код) и передается дальше
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if count_errors:
+            SEARCH_STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        SEARCH_STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def observe_items(stage: str, count: int) -> None:
+    """Учитывает количество кандидатов на выходе этапа"""
+    SEARCH_STAGE_ITEMS.observe(count, stage=stage)
+
+
+def record_error(stage: str) -> None:
+    """Учитывает ошибку, обработанную внутри этапа"""
+    SEARCH_STAGE_ERRORS.inc(stage=stage)
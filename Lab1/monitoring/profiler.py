@@ -0,0 +1,193 @@
+# monitoring/profiler.py
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class RequestProfiler:
+    """
+    Профилировщик одного запроса: сэмплирование стека профилируемого потока
+    и учет выделений памяти через tracemalloc.
+
+    Стек потока снимается из отдельного потока каждые interval секунд
+    (sys._current_frames), поэтому сам запрос не замедляется трассировкой
+    каждого вызова. Результат - стеки в свернутом формате (collapsed stacks,
+    вход для flamegraph.pl и speedscope) и итоги по памяти.
+
+    Одновременно профилируется не больше одного запроса: tracemalloc
+    глобален для процесса. Пока профилировщик не запущен, он ничего не стоит.
+    """
+
+    DEFAULT_INTERVAL = 0.001
+    DEFAULT_OUTPUT_DIR = "profiles"
+    MAX_PROFILE_FILES = 100  # в output_dir хранятся только самые новые профили
+    TOP_STACKS = 20
+    TOP_ALLOCATIONS = 10
+    MAX_STACK_DEPTH = 128
+
+    _active_lock = threading.Lock()
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, output_dir: Optional[str] = DEFAULT_OUTPUT_DIR,
+                 trace_allocations: bool = True):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.trace_allocations = trace_allocations
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration = 0.0
+        self.allocations: Dict = {}
+        self.active = False
+        self.skipped = False  # профиль не снимался: профилировщик был занят
+
+        self._target_thread_id = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._started = 0.0
+        self._started_tracemalloc = False
+        self._snapshot_before = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self) -> bool:
+        """
+        Запускает профилирование текущего потока.
+        Возвращает False, если уже профилируется другой запрос
+        """
+        if not RequestProfiler._active_lock.acquire(blocking=False):
+            print("Профилировщик занят другим запросом, профиль не снимается")
+            self.skipped = True
+            return False
+
+        self.active = True
+        self._target_thread_id = threading.get_ident()
+
+        if self.trace_allocations:
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._snapshot_before = tracemalloc.take_snapshot()
+
+        self._stop_event.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return True
+
+    def stop(self) -> None:
+        """Останавливает профилирование и подводит итоги"""
+        if not self.active:
+            return
+
+        self.duration = time.perf_counter() - self._started
+        self._stop_event.set()
+        self._sampler.join()
+
+        try:
+            if self.trace_allocations:
+                self.allocations = self._collect_allocations()
+                if self._started_tracemalloc:
+                    tracemalloc.stop()
+        finally:
+            self.active = False
+            self._snapshot_before = None
+            RequestProfiler._active_lock.release()
+
+    def _sample_loop(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+            self.stacks[self._collapse(frame)] += 1
+            self.samples += 1
+
+    def _collapse(self, frame) -> str:
+        """Стек от корня к вершине в формате 'модуль:функция;...'"""
+        names = []
+        while frame is not None and len(names) < self.MAX_STACK_DEPTH:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            names.append(f"{module}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _collect_allocations(self) -> Dict:
+        """Итоги по памяти: текущий и пиковый объем и основные места выделений"""
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        differences = snapshot.compare_to(self._snapshot_before, 'lineno')
+
+        allocated = sum(diff.size_diff for diff in differences if diff.size_diff > 0)
+        top = [
+            {
+                'location': f"{diff.traceback[0].filename}:{diff.traceback[0].lineno}",
+                'size_diff_bytes': diff.size_diff,
+                'count_diff': diff.count_diff
+            }
+            for diff in sorted(differences, key=lambda diff: diff.size_diff, reverse=True)[:self.TOP_ALLOCATIONS]
+            if diff.size_diff > 0
+        ]
+        return {
+            'allocated_bytes': allocated,
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'top_allocations': top
+        }
+
+    def collapsed_stacks(self) -> str:
+        """Профиль в свернутом формате: 'стек количество' на строку"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + '\n'
+
+    def save(self, label: str = "request") -> Optional[str]:
+        """Сохраняет свернутые стеки в output_dir, возвращает путь к файлу"""
+        if not self.output_dir or not self.samples:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.output_dir, f"{label}-{timestamp}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed_stacks())
+        self._remove_old_profiles()
+        return path
+
+    def _remove_old_profiles(self) -> None:
+        """Удаляет самые старые профили сверх MAX_PROFILE_FILES"""
+        try:
+            paths = [entry.path for entry in os.scandir(self.output_dir)
+                     if entry.is_file() and entry.name.endswith('.folded')]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:max(0, len(paths) - self.MAX_PROFILE_FILES)]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Ошибка очистки профилей в {self.output_dir}: {e}")
+
+    def summary(self, label: str = "request") -> Dict:
+        """Краткий итог профиля для ответа API (полный профиль сохраняется в файл)"""
+        top_stacks: List[Dict] = [
+            {'stack': stack, 'samples': count, 'share': count / self.samples}
+            for stack, count in self.stacks.most_common(self.TOP_STACKS)
+        ]
+        return {
+            'skipped': self.skipped,
+            'duration_seconds': self.duration,
+            'interval_seconds': self.interval,
+            'samples': self.samples,
+            'profile_file': self.save(label),
+            'top_stacks': top_stacks,
+            'allocations': self.allocations
+        }
@@ -0,0 +1,97 @@
+# scripts/convert_word2vec.py
+"""
+Однократная конвертация модели word2vec (бинарный формат) в собственный
+формат gensim KeyedVectors.
+
+Результат - файл .kv и массив векторов .kv.vectors.npy рядом с исходной
+моделью. SemanticEnhancer находит его автоматически и открывает через
+mmap только для чтения: загрузка занимает миллисекунды, а несколько
+процессов веб-сервера разделяют одни и те же страницы памяти.
+
+Заодно строится приближенный индекс соседей (.ann.npz), которым
+SemanticEnhancer ищет похожие слова вне словаря коллекции.
+
+Запуск из каталога Lab1:
+    python scripts/convert_word2vec.py models/glove-wiki-gigaword-200.bin
+"""
+import os
+import sys
+import time
+import argparse
+from gensim.models import KeyedVectors
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_selector.ann_index import RandomProjectionIndex
+from document_selector.semantic_enhancer import SemanticEnhancer
+
+
+def convert_word2vec_model(model_path: str, force: bool = False) -> str:
+    """
+    Конвертирует бинарную модель word2vec в формат KeyedVectors
+    (по пути, где ее ищет SemanticEnhancer)
+    """
+    output_path = SemanticEnhancer.native_model_path(model_path)
+
+    if os.path.exists(output_path) and not force:
+        print(f"Модель уже сконвертирована: {output_path}")
+        return output_path
+
+    print(f"Чтение модели word2vec из {model_path}...")
+    started = time.perf_counter()
+    word_vectors = KeyedVectors.load_word2vec_format(model_path, binary=True)
+    print(f"Прочитано за {time.perf_counter() - started:.1f} с, слов: {len(word_vectors.index_to_key)}")
+
+    # Векторы всегда пишутся отдельным .npy, чтобы их можно было открыть через mmap;
+    # нормы векторов пересчитываются при первом поиске похожих слов
+    word_vectors.norms = None
+    word_vectors.save(output_path, separately=['vectors'])
+    print(f"Модель сохранена: {output_path}")
+
+    started = time.perf_counter()
+    KeyedVectors.load(output_path, mmap='r')
+    print(f"Проверка: загрузка через mmap заняла {(time.perf_counter() - started) * 1000:.1f} мс")
+    return output_path
+
+
+def build_ann_index(model_path: str, num_tables: int = RandomProjectionIndex.DEFAULT_TABLES,
+                    num_bits: int = RandomProjectionIndex.DEFAULT_BITS, force: bool = False) -> str:
+    """
+    Строит приближенный индекс соседей по векторам сконвертированной модели
+    """
+    index_path = RandomProjectionIndex.index_path(model_path)
+    if os.path.exists(index_path) and not force:
+        print(f"Приближенный индекс уже построен: {index_path}")
+        return index_path
+
+    word_vectors = KeyedVectors.load(SemanticEnhancer.native_model_path(model_path), mmap='r')
+    print(f"Построение приближенного индекса: {num_tables} таблиц по {num_bits} бит...")
+    started = time.perf_counter()
+    index = RandomProjectionIndex(num_tables, num_bits).build(word_vectors.vectors)
+    index.save(index_path)
+    print(f"Индекс построен за {time.perf_counter() - started:.1f} с: {index_path}")
+    return index_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Конвертация модели word2vec в формат KeyedVectors для mmap')
+    parser.add_argument('model_path', help='Путь к бинарной модели word2vec (.bin)')
+    parser.add_argument('--force', action='store_true', help='Перезаписать существующий результат')
+    parser.add_argument('--no-ann', action='store_true', help='Не строить приближенный индекс соседей')
+    parser.add_argument('--ann-tables', type=int, default=RandomProjectionIndex.DEFAULT_TABLES,
+                        help='Количество хэш-таблиц (больше - выше полнота)')
+    parser.add_argument('--ann-bits', type=int, default=RandomProjectionIndex.DEFAULT_BITS,
+                        help='Битов в коде таблицы (больше - меньше кандидатов)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model_path):
+        print(f"Файл не найден: {args.model_path}")
+        sys.exit(1)
+
+    output_path = convert_word2vec_model(args.model_path, args.force)
+    if not args.no_ann:
+        build_ann_index(output_path, args.ann_tables, args.ann_bits, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 import gensim.downloader as api
 from gensim.models import KeyedVectors
+from convert_word2vec import convert_word2vec_model, build_ann_index
 
 def download_word2vec_model(model_name='glove-wiki-gigaword-200', save_path='models/'):
     """
@@ -35,4 +36,6 @@ if __name__ == "__main__":
     # Загружаем легкую модель для начала
     model_path = download_word2vec_model('glove-wiki-gigaword-200')
     if model_path:
+        # Копия для загрузки через mmap и приближенный индекс соседей
+        build_ann_index(convert_word2vec_model(model_path))
         print(f"Модель готова к использованию: {model_path}")
\ No newline at end of file
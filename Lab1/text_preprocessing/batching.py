@@ -1,36 +1,145 @@
 # text_preprocessing/batching.py
-from typing import List, Dict
+from typing import List, Dict, Tuple, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import time
+
+
+# Препроцессор рабочего процесса (передается один раз через initializer)
+_worker_preprocessor = None
+
+
+def _init_worker(preprocessor) -> None:
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+
+def _preprocess_chunk(chunk: List[Tuple[int, str]]) -> List[Tuple[int, List[str]]]:
+    """Предобработка пачки текстов в рабочем процессе (POS-разметка одним вызовом)"""
+    indices = [index for index, _ in chunk]
+    contents = [content for _, content in chunk]
+    if hasattr(_worker_preprocessor, 'preprocess_texts'):
+        token_lists = _worker_preprocessor.preprocess_texts(contents)
+    else:
+        token_lists = [
+            _worker_preprocessor.preprocess_text(content, return_string=False, debug=False) if content else []
+            for content in contents
+        ]
+    return list(zip(indices, token_lists))
 
 
 class BatchTextPreprocessor:
     """
     Класс для пакетной предобработки коллекции документов
+
+    Документы обрабатываются пачками по chunk_size: для каждой пачки части
+    речи определяются одним вызовом pos_tag_sents (TextPreprocessor.preprocess_texts).
+    При workers > 1 пачки распределяются по пулу процессов; статистика
+    собирается в исходном порядке документов, поэтому результат совпадает
+    с последовательным режимом.
+
+    preprocess_stream обрабатывает итератор документов пачками, не собирая
+    коллекцию целиком.
     """
 
-    def __init__(self, preprocessor):
+    def __init__(self, preprocessor, workers: int = 1, chunk_size: int = 16,
+                 progress_interval: float = 5.0):
         self.preprocessor = preprocessor
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.progress_interval = progress_interval  # секунд между сообщениями о прогрессе
         self.stats = {}
 
-    def preprocess_collection(self, documents: List) -> Dict:
-        """Предобработка всей коллекции документов"""
+    def preprocess_collection(self, documents: List, cache=None) -> Dict:
+        """
+        Предобработка всей коллекции документов
+        cache - ProcessedCorpusCache: неизмененные файлы берутся из него
+        """
         if not documents:
             return {}
 
-        total_stats = {
-            'total_documents': len(documents),
+        total_stats = self._empty_stats()
+
+        print(f"Начинаем предобработку {len(documents)} документов...")
+
+        if self.workers > 1 and len(documents) > 1:
+            with self._create_executor() as executor:
+                results = self._preprocess_batch(documents, cache, executor)
+        else:
+            results = self._preprocess_batch(documents, cache)
+
+        self._accumulate_stats(total_stats, documents, results)
+        self._finish_stats(total_stats, cache)
+        return total_stats
+
+    def preprocess_stream(self, documents: Iterable, batch_size: int = None, cache=None) -> Iterator[List]:
+        """
+        Потоковая предобработка: документы читаются из итератора пачками
+        по batch_size и выдаются пачками по мере обработки. В памяти
+        одновременно находится одна пачка; статистика копится в self.stats
+        """
+        batch_size = max(1, batch_size or self.chunk_size * self.workers)
+        total_stats = self._empty_stats()
+        print(f"Начинаем потоковую предобработку пачками по {batch_size} документов...")
+
+        executor = self._create_executor() if self.workers > 1 else None
+        try:
+            iterator = iter(documents)
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+
+                results = self._preprocess_batch(batch, cache, executor)
+                self._accumulate_stats(total_stats, batch, results)
+                yield batch
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self._finish_stats(total_stats, cache)
+
+    def _preprocess_batch(self, documents: List, cache=None, executor=None) -> List[Dict]:
+        """Предобработка пачки документов с учетом кэша; результаты в порядке documents"""
+        # 1. Документы из кэша
+        results: List[Dict] = [None] * len(documents)
+        pending = []
+        for i, doc in enumerate(documents):
+            cached = cache.lookup(doc) if cache is not None else None
+            if cached is not None:
+                doc.processed_content = cached['processed_content']
+                results[i] = self._token_stats(doc.processed_content.split())
+            else:
+                pending.append(i)
+
+        # 2. Предобработка остальных (последовательно или в пуле процессов)
+        if executor is not None and len(pending) > 1:
+            self._preprocess_parallel(documents, pending, results, executor)
+        else:
+            self._preprocess_serial(documents, pending, results)
+
+        if cache is not None:
+            for i in pending:
+                cache.store(documents[i], results[i].get('token_count', 0))
+
+        return results
+
+    @staticmethod
+    def _empty_stats() -> Dict:
+        return {
+            'total_documents': 0,
             'total_tokens': 0,
             'total_unique_tokens': set(),
             'avg_tokens_per_doc': 0,
             'document_stats': []
         }
 
-        print(f"Начинаем предобработку {len(documents)} документов...")
-
-        for i, doc in enumerate(documents, 1):
-            print(f"Обработка документа {i}/{len(documents)}: {doc.title}")
-
-            doc_stats = self.preprocessor.preprocess_document(doc)
+    @staticmethod
+    def _accumulate_stats(total_stats: Dict, documents: List, results: List[Dict]) -> None:
+        """Объединение статистики в исходном порядке документов"""
+        total_stats['total_documents'] += len(documents)
 
+        for doc, doc_stats in zip(documents, results):
             # Обновляем статистику с учетом новой структуры данных
             token_count = doc_stats.get('token_count', 0)
             total_stats['total_tokens'] += token_count
@@ -55,11 +164,61 @@ class BatchTextPreprocessor:
             }
             total_stats['document_stats'].append(doc_stat)
 
-        total_stats['avg_tokens_per_doc'] = total_stats['total_tokens'] / len(documents) if documents else 0
+    def _finish_stats(self, total_stats: Dict, cache=None) -> None:
+        total_documents = total_stats['total_documents']
+        total_stats['avg_tokens_per_doc'] = total_stats['total_tokens'] / total_documents if total_documents else 0
         total_stats['total_vocabulary_size'] = len(total_stats['total_unique_tokens'])
 
+        if cache is not None:
+            total_stats['cache'] = cache.get_statistics()
+            cache.save()
+            print(f"Кэш предобработки: {total_stats['cache']['hits']} из {total_documents} документов")
+
         self.stats = total_stats
-        return total_stats
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        print(f"Параллельная предобработка: {self.workers} процессов, пачки по {self.chunk_size}")
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.preprocessor,))
+
+    def _preprocess_serial(self, documents: List, pending: List[int], results: List[Dict]) -> None:
+        """Последовательная предобработка в текущем процессе"""
+        progress = _ProgressReporter(len(pending), self.progress_interval)
+        batched = hasattr(self.preprocessor, 'preprocess_documents')
+        for start in range(0, len(pending), self.chunk_size):
+            batch = pending[start:start + self.chunk_size]
+            if batched:
+                batch_results = self.preprocessor.preprocess_documents([documents[i] for i in batch])
+            else:
+                batch_results = [self.preprocessor.preprocess_document(documents[i]) for i in batch]
+            for i, doc_stats in zip(batch, batch_results):
+                results[i] = doc_stats
+            progress.advance(len(batch))
+        progress.finish()
+
+    def _preprocess_parallel(self, documents: List, pending: List[int], results: List[Dict],
+                             executor: ProcessPoolExecutor) -> None:
+        """Предобработка в пуле процессов пачками по chunk_size документов"""
+        chunks = [
+            [(i, documents[i].content) for i in pending[start:start + self.chunk_size]]
+            for start in range(0, len(pending), self.chunk_size)
+        ]
+
+        progress = _ProgressReporter(len(pending), self.progress_interval)
+        for chunk_result in executor.map(_preprocess_chunk, chunks):
+            for i, tokens in chunk_result:
+                documents[i].processed_content = ' '.join(tokens)
+                results[i] = self._token_stats(tokens)
+            progress.advance(len(chunk_result))
+        progress.finish()
+
+    @staticmethod
+    def _token_stats(tokens: List[str]) -> Dict:
+        return {
+            'tokens': tokens,
+            'token_count': len(tokens),
+            'unique_tokens': set(tokens)
+        }
 
     def print_statistics(self):
         """Вывод статистики предобработки"""
@@ -86,4 +245,31 @@ class BatchTextPreprocessor:
                 compression = (1 - first_doc['processed_length'] / first_doc['original_length']) * 100
                 print(f"Сжатие: {compression:.1f}%")
             else:
-                print(f"Сжатие: 0%")
\ No newline at end of file
+                print(f"Сжатие: 0%")
+
+
+class _ProgressReporter:
+    """Сообщения о прогрессе не чаще одного раза в interval секунд"""
+
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def advance(self, count: int) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self._report(now)
+
+    def finish(self) -> None:
+        if self.total:
+            self._report(time.perf_counter())
+
+    def _report(self, now: float) -> None:
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        print(f"Предобработано {self.done}/{self.total} документов ({rate:.1f} док/с)")
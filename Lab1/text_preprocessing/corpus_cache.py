@@ -0,0 +1,104 @@
+# text_preprocessing/corpus_cache.py
+import os
+from typing import Dict, Optional, Iterable
+from documents_processing.fingerprint import FileFingerprint
+from .utils import PreprocessingUtils
+
+
+class ProcessedCorpusCache:
+    """
+    Дисковый кэш результатов предобработки документов.
+
+    Записи хранятся в сжатом JSON Lines файле (одна строка на файл) и
+    привязаны к отпечатку файла: путь, размер, время изменения и SHA-1
+    содержимого. Повторно предобрабатываются только новые и измененные файлы.
+    Подпись препроцессора (signature) защищает от использования результатов,
+    полученных с другими настройками предобработки.
+    """
+
+    DEFAULT_PATH = "search_index/processed_corpus.jsonl.gz"
+
+    def __init__(self, cache_path: str = DEFAULT_PATH, signature: str = ""):
+        self.cache_path = cache_path
+        self.signature = signature
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """Загружает кэш с диска (отсутствующий файл - пустой кэш)"""
+        self.entries = {}
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            for entry in PreprocessingUtils.iter_jsonl(self.cache_path):
+                self.entries[entry['path']] = entry
+            print(f"Загружен кэш предобработки: {len(self.entries)} файлов")
+        except Exception as e:
+            print(f"Ошибка чтения кэша предобработки {self.cache_path}: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Сохраняет кэш на диск, если он изменился"""
+        if not self._dirty:
+            return
+        PreprocessingUtils.write_jsonl(self.entries.values(), self.cache_path)
+        self._dirty = False
+        print(f"Кэш предобработки сохранен: {len(self.entries)} файлов")
+
+    def lookup(self, document) -> Optional[Dict]:
+        """
+        Возвращает запись кэша для документа, если файл не изменился
+        """
+        entry = self.entries.get(self._key(document))
+        if entry is not None and entry.get('signature', '') == self.signature:
+            mtime_before = entry.get('mtime_ns')
+            if FileFingerprint.matches(entry, document.file_path):
+                # Совпал по хэшу, но с новым mtime - обновим запись на диске
+                self._dirty = self._dirty or entry.get('mtime_ns') != mtime_before
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def store(self, document, token_count: int) -> None:
+        """Сохраняет результат предобработки документа"""
+        try:
+            entry = FileFingerprint.compute(document.file_path)
+        except OSError as e:
+            print(f"Не удалось вычислить отпечаток файла {document.file_path}: {e}")
+            return
+
+        entry['signature'] = self.signature
+        entry['processed_content'] = document.processed_content
+        entry['token_count'] = token_count
+        self.entries[entry['path']] = entry
+        self._dirty = True
+
+    def retain(self, file_paths: Iterable[str]) -> None:
+        """Удаляет записи для файлов, которых больше нет в коллекции"""
+        keep = {os.path.abspath(path) for path in file_paths}
+        stale = [path for path in self.entries if path not in keep]
+        for path in stale:
+            del self.entries[path]
+        if stale:
+            self._dirty = True
+
+    def get_statistics(self) -> Dict:
+        """Статистика использования кэша"""
+        total = self.hits + self.misses
+        return {
+            'cache_path': self.cache_path,
+            'cached_files': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    @staticmethod
+    def _key(document) -> str:
+        return os.path.abspath(document.file_path)
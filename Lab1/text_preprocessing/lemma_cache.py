@@ -0,0 +1,91 @@
+# text_preprocessing/lemma_cache.py
+import os
+from collections import OrderedDict
+from typing import Dict, Callable, Optional
+from .utils import PreprocessingUtils
+
+
+class LemmaCache:
+    """
+    Ограниченная LRU-таблица (токен, часть речи WordNet) -> лемма.
+
+    Распределение слов в тексте Ципфовское, поэтому почти все обращения
+    к WordNetLemmatizer повторяются; таблица общая для документов и запросов
+    одного препроцессора и при указании persist_path сохраняется между запусками.
+    """
+
+    DEFAULT_MAX_SIZE = 100_000
+    DEFAULT_PATH = "search_index/lemma_cache.jsonl.gz"
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, persist_path: Optional[str] = None):
+        self.max_size = max_size
+        self.persist_path = persist_path
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self.load(persist_path)
+
+    def lemmatize(self, token: str, wordnet_pos: str, compute: Callable) -> str:
+        """
+        Возвращает лемму из таблицы или вычисляет ее через compute(token, pos=...)
+        """
+        key = (token, wordnet_pos)
+        lemma = self._entries.get(key)
+        if lemma is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return lemma
+
+        self.misses += 1
+        lemma = compute(token, pos=wordnet_pos)
+        self._entries[key] = lemma
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return lemma
+
+    def load(self, filepath: str) -> None:
+        """Загружает таблицу из файла (отсутствующий файл - пустая таблица)"""
+        if not os.path.exists(filepath):
+            return
+
+        try:
+            for token, wordnet_pos, lemma in PreprocessingUtils.iter_jsonl(filepath):
+                self._entries[(token, wordnet_pos)] = lemma
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            print(f"Загружен кэш лемм: {len(self._entries)} словоформ")
+        except Exception as e:
+            print(f"Ошибка чтения кэша лемм {filepath}: {e}")
+            self._entries.clear()
+
+    def save(self, filepath: Optional[str] = None) -> None:
+        """Сохраняет таблицу (по умолчанию в persist_path)"""
+        filepath = filepath or self.persist_path
+        if not filepath:
+            return
+        PreprocessingUtils.write_jsonl(
+            ([token, wordnet_pos, lemma] for (token, wordnet_pos), lemma in self._entries.items()),
+            filepath
+        )
+
+    def clear(self) -> None:
+        """Очищает таблицу и счетчики"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_statistics(self) -> Dict:
+        """Статистика попаданий"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,12 +1,15 @@
 # text_preprocessing/preprocessor.py
 import re
 import string
+import hashlib
 from .nltk_setup import download_nltk_resources
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
 from nltk import pos_tag as nltk_pos_tag  
+from nltk import pos_tag_sents as nltk_pos_tag_sents
 from typing import List, Dict
+from .lemma_cache import LemmaCache
 
 
 class TextPreprocessor:
@@ -14,7 +17,7 @@ class TextPreprocessor:
     Класс для предобработки текстовых документов на английском языке
     """
 
-    def __init__(self, use_lemmatization=True, custom_stopwords=None):
+    def __init__(self, use_lemmatization=True, custom_stopwords=None, lemma_cache=None):
         self.use_lemmatization = use_lemmatization
         self.stop_words = set(stopwords.words('english'))
 
@@ -23,8 +26,16 @@ class TextPreprocessor:
 
         if self.use_lemmatization:
             self.lemmatizer = WordNetLemmatizer()
+            # Общая для документов и запросов таблица (токен, POS) -> лемма
+            self.lemma_cache = lemma_cache if lemma_cache is not None else LemmaCache()
         else:
             self.lemmatizer = None
+            self.lemma_cache = None
+
+    def get_signature(self) -> str:
+        """Подпись настроек предобработки (для кэшей результатов)"""
+        stopwords_hash = hashlib.sha1(' '.join(sorted(self.stop_words)).encode('utf-8')).hexdigest()[:12]
+        return f"lemmatization={self.use_lemmatization};stopwords={stopwords_hash}"
 
     def clean_text(self, text: str) -> str:
         """Очистка текста"""
@@ -50,22 +61,37 @@ class TextPreprocessor:
         else:
             return 'n'  # по умолчанию noun
 
-    def smart_lemmatize(self, tokens):
+    def smart_lemmatize(self, tokens, debug: bool = False):
         """Умная лемматизация с определением части речи"""
         if not self.lemmatizer:
             return tokens
 
         # Получаем части речи для каждого токена
         pos_tags = nltk_pos_tag(tokens)  # Используем переименованный импорт
+        return self._lemmatize_tagged(pos_tags, debug=debug)
+
+    def smart_lemmatize_batch(self, token_lists: List[List[str]]) -> List[List[str]]:
+        """
+        Лемматизация многих последовательностей токенов:
+        части речи определяются одним вызовом pos_tag_sents
+        """
+        if not self.lemmatizer:
+            return token_lists
+
+        tagged_lists = nltk_pos_tag_sents(token_lists)
+        return [self._lemmatize_tagged(pos_tags) for pos_tags in tagged_lists]
+
+    def _lemmatize_tagged(self, pos_tags, debug: bool = False) -> List[str]:
+        """Лемматизация размеченных токенов (через кэш лемм)"""
         lemmatized_tokens = []
 
         for token, tag in pos_tags: 
             wordnet_pos = self.get_wordnet_pos(tag)
-            lemma = self.lemmatizer.lemmatize(token, pos=wordnet_pos)
+            lemma = self.lemma_cache.lemmatize(token, wordnet_pos, self.lemmatizer.lemmatize)
             lemmatized_tokens.append(lemma)
 
             # Отладочная информация для глаголов
-            if tag.startswith('V') and token != lemma:
+            if debug and tag.startswith('V') and token != lemma:
                 print(f"Лемматизация глагола: '{token}' -> '{lemma}' (POS: {tag})")
 
         return lemmatized_tokens
@@ -89,7 +115,7 @@ class TextPreprocessor:
             print(f"Токены: {tokens}")
 
         # Удаление стоп-слов и коротких токенов
-        tokens = [token for token in tokens if token not in self.stop_words and len(token) > 2]
+        tokens = self._filter_tokens(tokens)
         if debug:
             print(f"После удаления стоп-слов: {tokens}")
 
@@ -97,7 +123,7 @@ class TextPreprocessor:
         if self.use_lemmatization and self.lemmatizer:
             if debug:
                 print("Применяем умную лемматизацию...")
-            tokens = self.smart_lemmatize(tokens)
+            tokens = self.smart_lemmatize(tokens, debug=debug)
             if debug:
                 print(f"После лемматизации: {tokens}")
 
@@ -111,6 +137,47 @@ class TextPreprocessor:
                 print(f"Финальные токены: {tokens}")
             return tokens
 
+    def preprocess_texts(self, texts: List[str], return_string: bool = False) -> List:
+        """
+        Пакетная предобработка: тот же пайплайн, что и preprocess_text,
+        но части речи для всех текстов определяются одним вызовом
+        """
+        token_lists = [
+            self._filter_tokens(word_tokenize(self.clean_text(text))) if text else []
+            for text in texts
+        ]
+
+        if self.use_lemmatization and self.lemmatizer:
+            token_lists = self.smart_lemmatize_batch(token_lists)
+
+        if return_string:
+            return [' '.join(tokens) for tokens in token_lists]
+        return token_lists
+
+    def _filter_tokens(self, tokens: List[str]) -> List[str]:
+        """Удаление стоп-слов и коротких токенов"""
+        return [token for token in tokens if token not in self.stop_words and len(token) > 2]
+
+    def preprocess_documents(self, documents: List) -> List[Dict]:
+        """Пакетная предобработка документов (результаты как у preprocess_document)"""
+        token_lists = self.preprocess_texts([document.content if document else '' for document in documents])
+
+        results = []
+        for document, tokens in zip(documents, token_lists):
+            if not document or not document.content:
+                results.append(self.preprocess_document(document))
+                continue
+
+            document.processed_content = ' '.join(tokens)
+            results.append({
+                'original_content': document.content,
+                'processed_content': document.processed_content,
+                'tokens': tokens,
+                'token_count': len(tokens),
+                'unique_tokens': set(tokens)
+            })
+        return results
+
     def preprocess_document(self, document) -> Dict:
         """Предобработка документа"""
         if not document or not document.content:
@@ -124,10 +191,9 @@ class TextPreprocessor:
 
         original_content = document.content
 
-
-
-        processed_content = self.preprocess_text(original_content, return_string=True, debug=False)
+        # Пайплайн выполняется один раз, строка собирается из тех же токенов
         tokens = self.preprocess_text(original_content, return_string=False, debug=False)
+        processed_content = ' '.join(tokens)
 
         document.processed_content = processed_content
 
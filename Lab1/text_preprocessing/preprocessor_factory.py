@@ -1,5 +1,6 @@
 # text_preprocessing/preprocessor_factory.py
 from .preprocessor import TextPreprocessor
+from .lemma_cache import LemmaCache
 
 
 class PreprocessorFactory:
@@ -11,9 +12,13 @@ class PreprocessorFactory:
         return TextPreprocessor(use_lemmatization=False)
 
     @staticmethod
-    def create_lemmatization_preprocessor():
-        """Препроцессор с лемматизацией"""
-        return TextPreprocessor(use_lemmatization=True)
+    def create_lemmatization_preprocessor(lemma_cache_path: str = None):
+        """
+        Препроцессор с лемматизацией
+        lemma_cache_path - файл, в котором кэш лемм сохраняется между запусками
+        """
+        lemma_cache = LemmaCache(persist_path=lemma_cache_path) if lemma_cache_path else None
+        return TextPreprocessor(use_lemmatization=True, lemma_cache=lemma_cache)
 
     @staticmethod
     def create_custom_preprocessor(custom_stopwords=None, use_lemmatization=True):
@@ -1,15 +1,54 @@
+import gzip
 import json
-from typing import List
+import os
+from typing import List, Dict, Iterable, Iterator
+
 
 class PreprocessingUtils:
     """Утилиты для работы с предобработанными данными"""
-    
+
+    @staticmethod
+    def open_jsonl(filepath: str, mode: str, compressed: bool = None):
+        """Открывает JSON Lines файл (сжатый gzip, если имя оканчивается на .gz)"""
+        if compressed is None:
+            compressed = filepath.endswith('.gz')
+        if compressed:
+            return gzip.open(filepath, mode + 't', encoding='utf-8')
+        return open(filepath, mode, encoding='utf-8')
+
+    @staticmethod
+    def write_jsonl(records: Iterable[Dict], filepath: str) -> int:
+        """
+        Потоково записывает записи по одной на строку.
+        Запись идет во временный файл, который затем атомарно заменяет старый
+        """
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = filepath + '.tmp'
+        count = 0
+        with PreprocessingUtils.open_jsonl(tmp_path, 'w', compressed=filepath.endswith('.gz')) as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                f.write('\n')
+                count += 1
+        os.replace(tmp_path, filepath)
+        return count
+
+    @staticmethod
+    def iter_jsonl(filepath: str) -> Iterator[Dict]:
+        """Потоково читает записи JSON Lines файла"""
+        with PreprocessingUtils.open_jsonl(filepath, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
     @staticmethod
     def save_processed_documents(documents: List, filepath: str):
-        """Сохраняет предобработанные документы в файл"""
-        data = []
-        for doc in documents:
-            doc_data = {
+        """Сохраняет предобработанные документы в файл (JSON Lines)"""
+        PreprocessingUtils.write_jsonl(
+            ({
                 'doc_id': doc.doc_id,
                 'title': doc.title,
                 'original_content': doc.content,
@@ -17,20 +56,15 @@ class PreprocessingUtils:
                 'file_path': doc.file_path,
                 'file_type': doc.file_type,
                 'date_created': doc.date_created
-            }
-            data.append(doc_data)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    
+            } for doc in documents),
+            filepath
+        )
+
     @staticmethod
     def load_processed_documents(filepath: str):
         """Загружает предобработанные документы из файла"""
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         documents = []
-        for item in data:
+        for item in PreprocessingUtils.iter_jsonl(filepath):
             doc = type('Document', (), {
                 'doc_id': item['doc_id'],
                 'title': item['title'],
@@ -41,5 +75,5 @@ class PreprocessingUtils:
                 'date_created': item['date_created']
             })()
             documents.append(doc)
-        
-        return documents
\ No newline at end of file
+
+        return documents
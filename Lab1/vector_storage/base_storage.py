@@ -1,19 +1,29 @@
 # vector_storage/base_storage.py
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 class VectorStorage(ABC):
     """Абстрактный класс для векторного хранилища"""
 
     @abstractmethod
-    def store_documents(self, documents: List, tfidf_vectors: Dict[int, List[float]]) -> None:
+    def store_documents(self, documents: List, tfidf_vectors: Dict[int, Any],
+                        metadata: Optional[Dict[int, Dict]] = None) -> None:
         """Сохраняет документы и их векторы в хранилище"""
         pass
 
     @abstractmethod
-    def search_similar(self, query_vector: List[float], top_k: int = 10) -> List[Dict]:
-        """Поиск похожих документов по вектору запроса"""
+    def delete_documents(self, doc_ids: List[int]) -> None:
+        """Удаляет документы из хранилища"""
+        pass
+
+    @abstractmethod
+    def search_similar(self, query_vector: List[float], top_k: int = 10,
+                       doc_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Поиск похожих документов по вектору запроса
+        (если заданы doc_ids - только среди этих документов)
+        """
         pass
 
     @abstractmethod
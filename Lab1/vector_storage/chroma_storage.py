@@ -1,8 +1,10 @@
 # vector_storage/chroma_storage.py
 import chromadb
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
+from scipy import sparse
 from .base_storage import VectorStorage
+from monitoring.metrics import track_stage, observe_items, record_error
 
 
 class ChromaStorage(VectorStorage):
@@ -15,10 +17,17 @@ class ChromaStorage(VectorStorage):
             metadata={"description": "Document search system with TF-IDF vectors"}
         )
         self.persist_directory = persist_directory
-
-    def store_documents(self, documents: List, tfidf_vectors: Dict[int, List[float]]) -> None:
-        """Сохраняет документы и их векторы в ChromaDB"""
+        self._dimension = None
+
+    def store_documents(self, documents: List, tfidf_vectors: Dict[int, Any],
+                        metadata: Optional[Dict[int, Dict]] = None) -> None:
+        """
+        Сохраняет документы и их векторы в ChromaDB.
+        Используется upsert, поэтому повторная запись тех же doc_id их обновляет
+        metadata - готовые метаданные по doc_id (для документов без полного текста)
+        """
         print("Сохраняем документы в векторную БД...")
+        dimension = self.get_embedding_dimension()
 
         ids = []
         embeddings = []
@@ -32,8 +41,15 @@ class ChromaStorage(VectorStorage):
             if vector is None:
                 continue
 
+            # Разреженные строки TF-IDF матрицы разворачиваем только при записи
+            if sparse.issparse(vector):
+                vector = vector.toarray().ravel()
+
             # Преобразуем в numpy array и нормализуем для косинусного сходства
             vector_np = np.array(vector, dtype=np.float32)
+            if dimension is None:
+                dimension = len(vector_np)
+            vector_np = self._fit_dimension(vector_np, dimension)
             norm = np.linalg.norm(vector_np)
             if norm > 0:
                 vector_np = vector_np / norm
@@ -41,40 +57,85 @@ class ChromaStorage(VectorStorage):
             ids.append(doc_id)
             embeddings.append(vector_np.tolist())
 
-            metadata = {
+            if metadata is not None and doc.doc_id in metadata:
+                metadatas.append(dict(metadata[doc.doc_id]))
+                documents_text.append(doc.processed_content)
+                continue
+
+            doc_metadata = {
                 "doc_id": doc.doc_id,
                 "title": doc.title,
                 "file_path": doc.file_path,
                 "file_type": doc.file_type,
                 "date_created": doc.date_created,
+                "date_modified": doc.date_modified,
                 "date_added": doc.date_added,
                 "content_length": len(doc.content),
                 "processed_length": len(doc.processed_content) if hasattr(doc, 'processed_content') else 0
             }
-            metadatas.append(metadata)
+            metadatas.append(doc_metadata)
 
             documents_text.append(doc.processed_content if hasattr(doc, 'processed_content') else doc.content[:500])
 
-        # Добавляем в коллекцию
+        # Добавляем или обновляем записи коллекции
         if ids:
-            self.collection.add(
+            self.collection.upsert(
                 ids=ids,
                 embeddings=embeddings,
                 metadatas=metadatas,
                 documents=documents_text
             )
+            self._dimension = dimension
             print(f"Сохранено документов в векторную БД: {len(ids)}")
         else:
             print("Нет документов для сохранения")
 
-    def search_similar(self, query_vector: List[float], top_k: int = 10) -> List[Dict]:
-        """Поиск похожих документов по вектору запроса"""
+    def delete_documents(self, doc_ids: List[int]) -> None:
+        """Удаляет документы из коллекции по doc_id"""
+        if not doc_ids:
+            return
+        self.collection.delete(ids=[str(doc_id) for doc_id in doc_ids])
+        print(f"Удалено документов из векторной БД: {len(doc_ids)}")
+
+    def get_embedding_dimension(self):
+        """
+        Размерность векторов коллекции (None для пустой коллекции).
+        Размерность фиксируется первой записью и не меняется до очистки
+        """
+        if self._dimension is None and self.collection.count() > 0:
+            sample = self.collection.get(limit=1, include=["embeddings"])
+            embeddings = sample.get('embeddings')
+            if embeddings is not None and len(embeddings) > 0:
+                self._dimension = len(embeddings[0])
+        return self._dimension
+
+    @staticmethod
+    def _fit_dimension(vector: np.ndarray, dimension: int) -> np.ndarray:
+        """
+        Приводит вектор к размерности коллекции: термины, добавленные в словарь
+        после полной перестройки, в векторной БД не хранятся
+        """
+        if len(vector) == dimension:
+            return vector
+        if len(vector) > dimension:
+            return vector[:dimension]
+        return np.pad(vector, (0, dimension - len(vector)))
+
+    def search_similar(self, query_vector: List[float], top_k: int = 10,
+                       doc_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Поиск похожих документов по вектору запроса
+        (если заданы doc_ids - только среди этих документов)
+        """
         if not query_vector or all(x == 0 for x in query_vector):
             print("Запросный вектор нулевой - нет совпадающих терминов")
             return []
 
         # Нормализуем query vector для косинусного сходства
         query_np = np.array(query_vector, dtype=np.float32)
+        dimension = self.get_embedding_dimension()
+        if dimension is not None:
+            query_np = self._fit_dimension(query_np, dimension)
         query_norm = np.linalg.norm(query_np)
         if query_norm > 0:
             query_np = query_np / query_norm
@@ -86,11 +147,21 @@ class ChromaStorage(VectorStorage):
         print(f"Нормализованный query vector: {query_norm:.4f}")
 
         try:
-            results = self.collection.query(
-                query_embeddings=[query_np.tolist()],
-                n_results=min(top_k, self.collection.count()),
-                include=["metadatas", "distances", "documents"]
-            )
+            n_results = min(top_k, self.collection.count())
+            where = None
+            if doc_ids is not None:
+                if not doc_ids:
+                    return []
+                n_results = min(n_results, len(doc_ids))
+                where = {"doc_id": {"$in": [int(doc_id) for doc_id in doc_ids]}}
+
+            with track_stage('chroma_query', count_errors=False):
+                results = self.collection.query(
+                    query_embeddings=[query_np.tolist()],
+                    n_results=n_results,
+                    where=where,
+                    include=["metadatas", "distances", "documents"]
+                )
 
             formatted_results = []
             if results['ids'] and results['ids'][0]:
@@ -115,9 +186,11 @@ class ChromaStorage(VectorStorage):
             else:
                 print("Chroma не вернула результатов")
 
+            observe_items('chroma_query', len(formatted_results))
             return formatted_results
 
         except Exception as e:
+            record_error('chroma_query')
             print(f"Ошибка поиска в Chroma: {e}")
             return []
 
@@ -128,6 +201,7 @@ class ChromaStorage(VectorStorage):
     def clear_storage(self) -> None:
         """Очищает хранилище"""
         self.client.delete_collection(self.collection.name)
+        self._dimension = None
         self.collection = self.client.get_or_create_collection(
             name=self.collection.name,
             metadata={"description": "Document search system with TF-IDF vectors"}
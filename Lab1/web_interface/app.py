@@ -1,7 +1,8 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
 import sys
 import os
 import json
+import hmac
 import numpy as np
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -10,18 +11,30 @@ from indexing.index_builder import IndexBuilder
 from text_preprocessing.preprocessor_factory import PreprocessorFactory
 from vector_storage.chroma_storage import ChromaStorage
 from documents_processing.collector import DocumentCollector  # Добавляем импорт
+from documents_processing.language_filter import LanguageCache
 from text_preprocessing.batching import BatchTextPreprocessor  # Добавляем импорт
+from text_preprocessing.corpus_cache import ProcessedCorpusCache
+from text_preprocessing.lemma_cache import LemmaCache
+from monitoring.metrics import REGISTRY, record_error
+from monitoring.profiler import RequestProfiler
 from .json_utils import safe_json_response, CustomJSONEncoder
 
 
 class SearchApp:
     """Класс для управления поисковым приложением"""
 
+    # Максимум запросов в одном обращении к /search/batch
+    MAX_BATCH_QUERIES = 10000
+    # Максимум результатов на запрос в /search/batch (больше top_k урезается)
+    MAX_BATCH_TOP_K = 100
+
     def __init__(self):
         self.app = Flask(__name__, 
                         template_folder='templates',
                         static_folder='static')
         self.app.config['SECRET_KEY'] = 'search-system-secret-key'
+        # Профилирование запросов доступно только с этим токеном (не задан - выключено)
+        self.app.config['PROFILING_TOKEN'] = os.environ.get('SEARCH_PROFILING_TOKEN')
         self.app.json_encoder = CustomJSONEncoder
         self.index_builder = None
         self.preprocessor = None
@@ -37,7 +50,9 @@ class SearchApp:
             print("Загрузка поисковой системы с гибридным селектором...")
 
             # Создаем препроцессор
-            self.preprocessor = PreprocessorFactory.create_lemmatization_preprocessor()
+            self.preprocessor = PreprocessorFactory.create_lemmatization_preprocessor(
+                lemma_cache_path=LemmaCache.DEFAULT_PATH
+            )
 
 
             # Пытаемся загрузить существующий индекс
@@ -50,13 +65,10 @@ class SearchApp:
                 )
                 
                 
-                self.index_builder.vocabulary.load_vocabulary("search_index/vocabulary.json")
+                # Загружаем словарь и TF-IDF матрицу
+                self.index_builder.load_index("search_index")
                 self.index_builder.vector_storage = ChromaStorage()
                 
-                # Инициализируем TF-IDF калькулятор
-                from indexing.tfidf_calculator import TFIDFCalculator
-                self.index_builder.tfidf_calculator = TFIDFCalculator(self.index_builder.vocabulary)
-                
                 # Загружаем документы для селектора
                 self._load_documents_for_selector()
                 
@@ -76,14 +88,22 @@ class SearchApp:
         """Загружает документы для работы селектора"""
         try:
             # Собираем документы из папки docs
-            collector = DocumentCollector()
-            self.all_documents = collector.collect_documents("docs", recursive=True)
+            collector = DocumentCollector(language_cache=LanguageCache())
+            documents = collector.collect_documents("docs", recursive=True)
+
+            # doc_id берутся из индекса по пути файла, а не из порядка обхода папки
+            self.all_documents = self.index_builder.align_documents(documents)
+            if len(self.all_documents) != len(documents):
+                print(f"Не проиндексировано файлов: {len(documents) - len(self.all_documents)} "
+                      f"(обновите индекс: --update-index)")
             
             if self.all_documents:
-                # Предобрабатываем документы
+                # Предобрабатываем документы (неизмененные файлы берутся из кэша)
                 batch_processor = BatchTextPreprocessor(self.preprocessor)
-                batch_processor.preprocess_collection(self.all_documents)
+                batch_processor.preprocess_collection(self.all_documents, cache=self._create_corpus_cache())
                 
+                self.preprocessor.lemma_cache.save()
+
                 # Сохраняем в index_builder для селектора
                 self.index_builder.all_documents = self.all_documents
                 print(f"Загружено {len(self.all_documents)} документов для селектора")
@@ -93,11 +113,15 @@ class SearchApp:
         except Exception as e:
             print(f"Ошибка загрузки документов для селектора: {e}")
 
+    def _create_corpus_cache(self) -> ProcessedCorpusCache:
+        """Кэш предобработанного корпуса для текущих настроек препроцессора"""
+        return ProcessedCorpusCache(signature=self.preprocessor.get_signature())
+
     def _build_index_from_scratch(self):
         """Строит индекс с нуля"""
         try:
             # Собираем документы
-            collector = DocumentCollector()
+            collector = DocumentCollector(language_cache=LanguageCache())
             documents = collector.collect_documents("docs", recursive=True)
             
             if not documents:
@@ -106,7 +130,8 @@ class SearchApp:
                 
             # Предобрабатываем
             batch_processor = BatchTextPreprocessor(self.preprocessor)
-            batch_processor.preprocess_collection(documents)
+            batch_processor.preprocess_collection(documents, cache=self._create_corpus_cache())
+            self.preprocessor.lemma_cache.save()
             
             # Строим индекс с селектором
             self.index_builder = IndexBuilder(
@@ -159,54 +184,79 @@ class SearchApp:
                 if not query:
                     return jsonify({'error': 'Пустой запрос'}), 400
 
-                print(f"Поиск запроса с гибридным селектором: '{query}'")
-
-                # Выполняем поиск (теперь автоматически использует селектор)
-                results = self.index_builder.search(query, self.preprocessor, top_k=top_k)
-
-                # Получаем статистику селектора и расширение запроса
-                selection_stats = {}
-                expansion_result = {}
-                
-                if self.index_builder.document_selector:
-                    selection_stats = self._safe_serialize_stats(
-                        self.index_builder.document_selector.get_selection_statistics()
-                    )
-                    expansion_result = self._safe_serialize_expansion(
-                        self.index_builder.document_selector.get_last_expansion_result()
-                    )
-
-                # Форматируем результаты для отображения
-                formatted_results = []
-                for result in results:
-                    # Безопасно сериализуем каждый результат
-                    safe_result = self._safe_serialize_result(result)
-                    formatted_results.append(safe_result)
-
-                print(f'Результат поиска: {formatted_results}')
-
-                response_data = {
-                    'query': query,
-                    'total_found': len(results),
-                    'results': formatted_results,
-                    'selection_stats': selection_stats,
-                    'expansion_result': expansion_result
-                }
-
-                # Анализ запроса (если нужно)
-                if show_analysis:
-                    query_analysis = self.index_builder.analyze_query(query, self.preprocessor)
-                    response_data['query_analysis'] = self._safe_serialize_analysis(query_analysis)
+                # Профилирование по запросу: заголовок X-Profile: 1 (или параметр profile=1)
+                # и заголовок X-Profile-Token с токеном из конфигурации
+                if self._profiling_requested():
+                    with RequestProfiler() as profiler:
+                        response_data = self._execute_search(query, top_k, show_analysis)
+                    response_data['profile'] = self._safe_serialize_stats(profiler.summary("search"))
+                else:
+                    response_data = self._execute_search(query, top_k, show_analysis)
 
                 # Используем безопасную сериализацию
                 return safe_json_response(response_data)
 
             except Exception as e:
+                record_error('request')
                 print(f"Ошибка поиска: {e}")
                 import traceback
                 traceback.print_exc()
                 return jsonify({'error': f'Ошибка поиска: {str(e)}'}), 500
 
+        @self.app.route('/search/batch', methods=['POST'])
+        def search_batch():
+            """
+            Пакетный поиск: JSON {"queries": [...], "top_k": 10}
+            или поле формы queries (по запросу на строку)
+            """
+            if not self.is_loaded:
+                return jsonify({'error': 'Поисковая система не загружена'}), 500
+
+            try:
+                payload = request.get_json(silent=True)
+                if payload is not None and not isinstance(payload, dict):
+                    return jsonify({'error': 'Тело запроса должно быть JSON-объектом'}), 400
+                if payload:
+                    queries = payload.get('queries', [])
+                    top_k = payload.get('top_k', 10)
+                else:
+                    queries = request.form.get('queries', '').splitlines()
+                    top_k = request.form.get('top_k', 10)
+
+                try:
+                    top_k = min(int(top_k), self.MAX_BATCH_TOP_K)
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Поле top_k должно быть целым числом'}), 400
+                if top_k < 1:
+                    return jsonify({'error': 'Поле top_k должно быть положительным'}), 400
+
+                if not isinstance(queries, list):
+                    return jsonify({'error': 'Поле queries должно быть списком'}), 400
+                queries = [str(query).strip() for query in queries if str(query).strip()]
+                if not queries:
+                    return jsonify({'error': 'Пустой список запросов'}), 400
+                if len(queries) > self.MAX_BATCH_QUERIES:
+                    return jsonify({'error': f'Слишком много запросов (максимум {self.MAX_BATCH_QUERIES})'}), 400
+
+                batch_results = self.index_builder.search_many(queries, self.preprocessor, top_k=top_k)
+
+                return safe_json_response({
+                    'total_queries': len(queries),
+                    'results': [
+                        {
+                            'query': query,
+                            'total_found': len(results),
+                            'results': [self._safe_serialize_result(result) for result in results]
+                        }
+                        for query, results in zip(queries, batch_results)
+                    ]
+                })
+
+            except Exception as e:
+                record_error('request')
+                print(f"Ошибка пакетного поиска: {e}")
+                return jsonify({'error': f'Ошибка пакетного поиска: {str(e)}'}), 500
+
         @self.app.route('/selection-stats')
         def selection_stats():
             """Статистика работы селектора"""
@@ -242,6 +292,13 @@ class SearchApp:
             stats = self.index_builder.get_index_statistics()
             return safe_json_response(self._safe_serialize_stats(stats))
 
+        @self.app.route('/metrics')
+        def metrics():
+            """Метрики поискового конвейера в текстовом формате Prometheus"""
+            if self.index_builder:
+                self.index_builder.export_metrics()
+            return Response(REGISTRY.render(), content_type=REGISTRY.CONTENT_TYPE)
+
         @self.app.route('/health')
         def health():
             """Проверка состояния системы"""
@@ -295,6 +352,66 @@ class SearchApp:
                 'most_frequent_terms': stats['most_frequent_terms'][:20]
             })
         
+    def _execute_search(self, query: str, top_k: int, show_analysis: bool) -> dict:
+        """Выполняет поиск и формирует данные ответа /search"""
+        print(f"Поиск запроса с гибридным селектором: '{query}'")
+
+        # Выполняем поиск (теперь автоматически использует селектор)
+        results = self.index_builder.search(query, self.preprocessor, top_k=top_k)
+
+        # Получаем статистику селектора и расширение запроса
+        selection_stats = {}
+        expansion_result = {}
+        
+        if self.index_builder.document_selector:
+            selection_stats = self._safe_serialize_stats(
+                self.index_builder.document_selector.get_selection_statistics()
+            )
+            expansion_result = self._safe_serialize_expansion(
+                self.index_builder.document_selector.get_last_expansion_result()
+            )
+
+        # Форматируем результаты для отображения
+        formatted_results = []
+        for result in results:
+            # Безопасно сериализуем каждый результат
+            safe_result = self._safe_serialize_result(result)
+            formatted_results.append(safe_result)
+
+        print(f'Результат поиска: {formatted_results}')
+
+        response_data = {
+            'query': query,
+            'total_found': len(results),
+            'results': formatted_results,
+            'selection_stats': selection_stats,
+            'expansion_result': expansion_result
+        }
+
+        # Анализ запроса (если нужно)
+        if show_analysis:
+            query_analysis = self.index_builder.analyze_query(
+                query, self.preprocessor, self.index_builder.last_query_context
+            )
+            response_data['query_analysis'] = self._safe_serialize_analysis(query_analysis)
+
+        return response_data
+
+    def _profiling_requested(self) -> bool:
+        """Запрошено ли профилирование текущего запроса (и разрешено ли оно клиенту)"""
+        flags = ('1', 'true')
+        requested = (request.headers.get('X-Profile', '').lower() in flags
+                     or request.args.get('profile', '').lower() in flags
+                     or request.form.get('profile', '').lower() in flags)
+        if not requested:
+            return False
+
+        token = self.app.config.get('PROFILING_TOKEN')
+        if not token or not hmac.compare_digest(request.headers.get('X-Profile-Token', ''), token):
+            print("Профилирование запрошено без действующего токена, профиль не снимается")
+            return False
+        return True
+
     def _safe_serialize_stats(self, stats):
         """Безопасная сериализация статистики"""
         if not stats:
@@ -215,6 +215,15 @@ document.addEventListener('DOMContentLoaded', function() {
         
         let statsHTML = '<div class="stats-grid">';
         
+        if (stats.cached) {
+            statsHTML += `
+                <div class="stat-item">
+                    <strong>Кэш запросов</strong><br>
+                    <small>Ранжирование взято из кэша, этапы отбора не выполнялись</small>
+                </div>
+            `;
+        }
+        
         if (stats.pre_selection && !stats.pre_selection.skipped) {
             const efficiency = stats.pre_selection.initial_documents > 0 
                 ? ((stats.pre_selection.after_filtering / stats.pre_selection.initial_documents) * 100).toFixed(1)